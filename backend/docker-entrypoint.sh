@@ -134,6 +134,35 @@ python manage.py collectstatic --noinput --clear 2>/dev/null || {
 echo "✅ Static files ready!"
 echo ""
 
+# ============================================
+# 4b. GeoIP Database
+# ============================================
+# Session locations are resolved from a local MaxMind database. Download
+# GeoLite2-City when a license key is configured and the file is missing.
+GEOIP_DATABASE_PATH="${GEOIP_DATABASE_PATH:-/app/geoip/GeoLite2-City.mmdb}"
+export GEOIP_DATABASE_PATH
+if [ ! -f "$GEOIP_DATABASE_PATH" ]; then
+    if [ -n "$MAXMIND_LICENSE_KEY" ]; then
+        echo "🌍 Downloading GeoLite2-City database..."
+        mkdir -p "$(dirname "$GEOIP_DATABASE_PATH")"
+        GEOIP_TMP="$(mktemp -d)"
+        if curl -fsSL -o "$GEOIP_TMP/geoip.tar.gz" \
+            "https://download.maxmind.com/app/geoip_download?edition_id=GeoLite2-City&license_key=${MAXMIND_LICENSE_KEY}&suffix=tar.gz" \
+            && tar -xzf "$GEOIP_TMP/geoip.tar.gz" -C "$GEOIP_TMP" \
+            && find "$GEOIP_TMP" -name "GeoLite2-City.mmdb" -exec mv {} "$GEOIP_DATABASE_PATH" \; \
+            && [ -f "$GEOIP_DATABASE_PATH" ]; then
+            echo "✅ GeoIP database ready!"
+        else
+            echo "❌ GeoIP download failed - session locations will be empty"
+        fi
+        rm -rf "$GEOIP_TMP"
+    else
+        echo "❌ GeoIP database missing at $GEOIP_DATABASE_PATH and MAXMIND_LICENSE_KEY is not set"
+        echo "   Session locations will be empty until the database is provisioned."
+    fi
+    echo ""
+fi
+
 # ============================================
 # 5. Print Configuration Summary
 # ============================================
@@ -144,6 +173,7 @@ echo "Debug Mode: ${DEBUG}"
 echo "Database Host: ${DB_HOST}:${DB_PORT}"
 echo "Database Name: ${DB_NAME}"
 echo "Redis URL: ${REDIS_URL}"
+echo "GeoIP Database: ${GEOIP_DATABASE_PATH}"
 echo "Frontend URL: ${FRONTEND_URL}"
 echo "CORS Origins: ${CORS_ALLOWED_ORIGINS}"
 echo "Allowed Hosts: ${ALLOWED_HOSTS}"
@@ -1,8 +1,21 @@
+import hashlib
+import logging
+import time
 from urllib.parse import parse_qs
 
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.core.cache import cache
+from liberty_social.ws_admission import get_admission
+from rest_framework_simplejwt.settings import api_settings
+from users.authentication import DenylistJWTAuthentication
+from users.token_denylist import is_denied
+
+logger = logging.getLogger(__name__)
+
+# Close code sent when a worker is saturated with handshakes ("Try Again Later").
+WS_CLOSE_TRY_AGAIN_LATER = 1013
 
 
 class JWTAuthMiddleware:
@@ -10,16 +23,47 @@ class JWTAuthMiddleware:
 
     def __init__(self, inner):
         self.inner = inner
-        self.jwt_auth = JWTAuthentication()
+        self.jwt_auth = DenylistJWTAuthentication()
 
     async def __call__(self, scope, receive, send):
+        admission = get_admission()
+        started_at = time.monotonic()
+        if not await admission.acquire():
+            logger.warning(
+                "WebSocket handshake rejected - worker at %d concurrent handshakes",
+                admission.limit,
+            )
+            return await self._reject(receive, send)
+
+        released = False
+
+        def release_slot():
+            nonlocal released
+            if not released:
+                released = True
+                admission.release(started_at)
+
+        async def admission_send(message):
+            # The handshake ends once the consumer accepts or rejects the socket.
+            if message.get("type") in ("websocket.accept", "websocket.close"):
+                release_slot()
+            await send(message)
+
+        try:
+            scope = await self._authenticate_scope(scope)
+            return await self.inner(scope, receive, admission_send)
+        finally:
+            release_slot()
+
+    async def _reject(self, receive, send):
+        message = await receive()
+        if message.get("type") == "websocket.connect":
+            await send({"type": "websocket.close", "code": WS_CLOSE_TRY_AGAIN_LATER})
+
+    async def _authenticate_scope(self, scope):
         scope = dict(scope)
         token = self._get_token_from_scope(scope)
 
-        # Debug logging
-        import logging
-        logger = logging.getLogger(__name__)
-        
         # Get origin from headers
         headers = dict(scope.get("headers", []))
         origin = headers.get(b"origin")
@@ -39,7 +83,7 @@ class JWTAuthMiddleware:
             scope.setdefault("user", AnonymousUser())
             logger.warning("WebSocket connection without token")
 
-        return await self.inner(scope, receive, send)
+        return scope
 
     def _get_token_from_scope(self, scope):
         # Authorization header (Bearer <token>)
@@ -63,9 +107,32 @@ class JWTAuthMiddleware:
         return None
 
     async def _get_user(self, raw_token):
+        # Only the claims the user lookup needs are cached, never the user, so
+        # every connect still checks the revocation denylist and is_active.
+        cache_key = f"ws:auth:{hashlib.sha256(raw_token.encode()).hexdigest()}"
+        claims = await cache.aget(cache_key)
         try:
-            validated = await sync_to_async(self.jwt_auth.get_validated_token)(raw_token)
-            return await sync_to_async(self.jwt_auth.get_user)(validated)
+            if claims is None:
+                # Validation includes the denylist lookup, a Redis round trip.
+                validated = await sync_to_async(self.jwt_auth.get_validated_token)(raw_token)
+                claims = {
+                    name: validated[name]
+                    for name in (
+                        api_settings.USER_ID_CLAIM,
+                        api_settings.JTI_CLAIM,
+                        api_settings.REVOKE_TOKEN_CLAIM,
+                    )
+                    if name in validated
+                }
+                ttl = getattr(settings, "WS_AUTH_CACHE_TTL", 60)
+                expires_at = validated.get("exp")
+                if expires_at:
+                    ttl = min(ttl, int(expires_at - time.time()))
+                if ttl > 0:
+                    await cache.aset(cache_key, claims, timeout=ttl)
+            elif await sync_to_async(is_denied)(claims.get(api_settings.JTI_CLAIM)):
+                return None
+            return await sync_to_async(self.jwt_auth.get_user)(claims)
         except Exception:
             return None
 
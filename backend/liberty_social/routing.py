@@ -1,9 +1,15 @@
 from django.urls import path
 
-from main.consumers import ChatConsumer, NotificationConsumer, UserStatusConsumer
+from main.consumers import (
+    ChatConsumer,
+    MultiplexConsumer,
+    NotificationConsumer,
+    UserStatusConsumer,
+)
 
 websocket_urlpatterns = [
     path("ws/chat/<int:conversation_id>/", ChatConsumer.as_asgi()),
     path("ws/notifications/", NotificationConsumer.as_asgi()),
     path("ws/user-status/", UserStatusConsumer.as_asgi()),
+    path("ws/stream/", MultiplexConsumer.as_asgi()),
 ]
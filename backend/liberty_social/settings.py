@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 import os
+import sys
 from decouple import config, Csv
 from urllib.parse import urlparse, parse_qsl
 
@@ -71,6 +72,21 @@ ALLOWED_HOSTS = config(
     default="api.mylibertysocial.com,liberty-backend-alb-343841641.us-east-1.elb.amazonaws.com",
     cast=Csv(),
 )
+# Render WebP/AVIF sizes and BlurHash placeholders for uploaded images, reading
+# originals up to the given size from the bucket.
+IMAGE_DERIVATIVES_ENABLED = config("IMAGE_DERIVATIVES_ENABLED", default=True, cast=bool)
+IMAGE_DERIVATIVE_MAX_SOURCE_BYTES = config(
+    "IMAGE_DERIVATIVE_MAX_SOURCE_BYTES", default=30 * 1024 * 1024, cast=int
+)
+# Listing photo analysis (stock-photo signals, perceptual hashes): largest image
+# downloaded, and how long a URL -> content hash mapping is remembered.
+MEDIA_ANALYSIS_MAX_BYTES = config("MEDIA_ANALYSIS_MAX_BYTES", default=20 * 1024 * 1024, cast=int)
+MEDIA_ANALYSIS_URL_CACHE_TTL = config(
+    "MEDIA_ANALYSIS_URL_CACHE_TTL", default=7 * 24 * 3600, cast=int
+)
+# Largest pHash Hamming distance at which two listing photos count as the
+# same picture (main.duplicate_images).
+DUPLICATE_IMAGE_MAX_DISTANCE = config("DUPLICATE_IMAGE_MAX_DISTANCE", default=6, cast=int)
 
 
 # Application definition
@@ -140,6 +156,27 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Chat broadcasts are queued on a per-process outbox and flushed to the channel
+# layer in one batch per group after this many milliseconds (0 = send inline).
+CHAT_OUTBOX_WINDOW_MS = config("CHAT_OUTBOX_WINDOW_MS", default=5, cast=int)
+
+# Websocket handshakes: JWT claims and conversation-membership lookups are cached
+# (seconds), and each worker admits a bounded number of concurrent handshakes,
+# closing the rest with 1013 after WS_HANDSHAKE_TIMEOUT seconds.
+WS_AUTH_CACHE_TTL = config("WS_AUTH_CACHE_TTL", default=60, cast=int)
+WS_MEMBERSHIP_CACHE_TTL = config("WS_MEMBERSHIP_CACHE_TTL", default=300, cast=int)
+WS_HANDSHAKE_CONCURRENCY = config("WS_HANDSHAKE_CONCURRENCY", default=100, cast=int)
+WS_HANDSHAKE_TIMEOUT = config("WS_HANDSHAKE_TIMEOUT", default=5, cast=float)
+# Maximum topics a single multiplexed socket (ws/stream/) may subscribe to.
+WS_MAX_TOPICS = config("WS_MAX_TOPICS", default=50, cast=int)
+
+# Typing indicators: at most one broadcast per user per interval (seconds),
+# typing state expires after the TTL, and conversations with at least the
+# threshold of participants receive aggregated typing.summary frames instead.
+TYPING_EVENT_INTERVAL = config("TYPING_EVENT_INTERVAL", default=3.0, cast=float)
+TYPING_STATE_TTL = config("TYPING_STATE_TTL", default=6.0, cast=float)
+TYPING_AGGREGATE_THRESHOLD = config("TYPING_AGGREGATE_THRESHOLD", default=10, cast=int)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -225,7 +262,8 @@ ADMIN_EMAIL = config("ADMIN_EMAIL", "jamesezekiel039@gmail.com")
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # simplejwt's JWTAuthentication plus the revoked-session JTI denylist.
+        "users.authentication.DenylistJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -376,6 +414,150 @@ if CELERY_BROKER_URL.startswith("rediss://"):
     # For Upstash, this works fine. For stricter security, use 'required'
     CELERY_BROKER_TRANSPORT_OPTIONS["ssl_cert_reqs"] = "none"
 
+CELERY_BEAT_SCHEDULE = {
+    "run-retention-policies": {
+        "task": "main.tasks.run_retention_policies",
+        "schedule": timedelta(hours=24),
+    },
+    "rebuild-friend-suggestions": {
+        "task": "main.tasks.rebuild_friend_suggestions",
+        "schedule": timedelta(hours=24),
+    },
+    "reconcile-user-rollups": {
+        "task": "main.tasks.reconcile_user_rollups",
+        "schedule": timedelta(hours=24),
+    },
+    "recompute-risk-scores": {
+        "task": "main.tasks.recompute_risk_scores",
+        "schedule": timedelta(hours=24),
+    },
+    "rebuild-trending-listings": {
+        "task": "main.tasks.rebuild_trending_listings",
+        "schedule": timedelta(minutes=config("TRENDING_REBUILD_MINUTES", default=15, cast=int)),
+    },
+    "flush-listing-views": {
+        "task": "main.tasks.flush_listing_views",
+        "schedule": timedelta(seconds=config("LISTING_VIEW_FLUSH_INTERVAL", default=30, cast=int)),
+    },
+}
+
+
+# ============================================
+# Cache
+# ============================================
+# Shared Redis cache (CACHE_URL, defaulting to REDIS_URL) so signal-driven
+# invalidation (social graph, profile headers, websocket auth/membership) is
+# seen by every web, websocket and worker process. The test runner uses
+# per-process memory; set CACHE_URL to an empty string to do the same in
+# development without Redis.
+TESTING = sys.argv[1:2] == ["test"]
+CACHE_URL = "" if TESTING else config("CACHE_URL", default=REDIS_URL)
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": "liberty",
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+# Seconds a user's packed friend/block/dismissed id sets stay cached.
+SOCIAL_GRAPH_CACHE_TTL = config("SOCIAL_GRAPH_CACHE_TTL", default=3600, cast=int)
+
+# Friends-of-friends candidates stored per user by the nightly rebuild.
+FRIEND_SUGGESTION_TOP_K = config("FRIEND_SUGGESTION_TOP_K", default=50, cast=int)
+
+# Seconds a profile header is cached per (target, viewer relationship class).
+PROFILE_HEADER_CACHE_TTL = config("PROFILE_HEADER_CACHE_TTL", default=300, cast=int)
+
+# Seconds before a worker rebuilds its in-memory micro-segmentation snapshot.
+ANALYTICS_SNAPSHOT_TTL = config("ANALYTICS_SNAPSHOT_TTL", default=300, cast=int)
+
+# Seconds during which repeat views of a listing by the same viewer are not counted.
+LISTING_VIEW_DEDUPE_WINDOW = config("LISTING_VIEW_DEDUPE_WINDOW", default=1800, cast=int)
+
+# Trending marketplace listings: engagement older than the window is ignored and
+# the rest decays with the given half-life; ranked pages are cached per rebuild.
+TRENDING_WINDOW_DAYS = config("TRENDING_WINDOW_DAYS", default=7, cast=int)
+TRENDING_HALF_LIFE_HOURS = config("TRENDING_HALF_LIFE_HOURS", default=24, cast=float)
+TRENDING_PAGE_CACHE_TTL = config("TRENDING_PAGE_CACHE_TTL", default=300, cast=int)
+
+
+# ============================================
+# GeoIP
+# ============================================
+# Local MaxMind-format city database, memory-mapped once per process.
+GEOIP_DATABASE_PATH = config(
+    "GEOIP_DATABASE_PATH", default=str(BASE_DIR / "geoip" / "GeoLite2-City.mmdb")
+)
+# Addresses whose parsed lookups are kept in each process's LRU cache.
+GEOIP_CACHE_SIZE = config("GEOIP_CACHE_SIZE", default=4096, cast=int)
+
+
+# ============================================
+# Direct uploads
+# ============================================
+# Presigned S3 POSTs: lifetime of the signed policy, largest accepted object,
+# and the content types a client may request a grant for.
+UPLOAD_PRESIGN_EXPIRES = config("UPLOAD_PRESIGN_EXPIRES", default=900, cast=int)
+UPLOAD_MAX_BYTES = config("UPLOAD_MAX_BYTES", default=25 * 1024 * 1024, cast=int)
+UPLOAD_ALLOWED_CONTENT_TYPES = config(
+    "UPLOAD_ALLOWED_CONTENT_TYPES",
+    default="image/jpeg,image/png,image/webp,image/gif,image/heic,image/avif,video/mp4,video/quicktime",
+    cast=Csv(),
+)
+
+
+# ============================================
+# Login side-effects
+# ============================================
+# Queue session/history/security-event writes for a batch worker instead of
+# doing them inside the login request. Falls back to inline writes when off
+# or when Redis is unreachable.
+LOGIN_EVENTS_ASYNC = config("LOGIN_EVENTS_ASYNC", default=True, cast=bool)
+# Seconds the first login in a window waits so concurrent logins share a batch.
+LOGIN_EVENTS_BATCH_DELAY = config("LOGIN_EVENTS_BATCH_DELAY", default=1.0, cast=float)
+LOGIN_EVENTS_BATCH_SIZE = config("LOGIN_EVENTS_BATCH_SIZE", default=500, cast=int)
+
+
+# ============================================
+# Data Retention
+# ============================================
+# Rows older than ``days`` are moved to gzip NDJSON archives and removed from
+# the live table, policy by policy in the order listed. ``filters`` narrows
+# which aged rows are eligible (e.g. only read notifications). Archives are
+# uploaded to the media bucket under RETENTION_ARCHIVE_S3_PREFIX; set
+# RETENTION_ARCHIVE_ROOT only to a mounted volume, never container disk.
+RETENTION_ARCHIVE_ROOT = config("RETENTION_ARCHIVE_ROOT", default="")
+RETENTION_ARCHIVE_S3_PREFIX = config("RETENTION_ARCHIVE_S3_PREFIX", default="retention/")
+RETENTION_POLICIES = {
+    "main.Notification": {
+        "days": config("RETENTION_NOTIFICATION_DAYS", default=90, cast=int),
+        "filters": {"unread": False},
+    },
+    "users.SessionHistory": {
+        "days": config("RETENTION_SESSION_HISTORY_DAYS", default=365, cast=int),
+    },
+    "users.SecurityEvent": {
+        "days": config("RETENTION_SECURITY_EVENT_DAYS", default=365, cast=int),
+    },
+    # Compliance logs go first: their action link is SET_NULL, so archiving
+    # the action before the log would strip the link from the archived log.
+    "main.ComplianceLog": {
+        "days": config("RETENTION_COMPLIANCE_LOG_DAYS", default=730, cast=int),
+    },
+    "main.ModerationAction": {
+        "days": config("RETENTION_MODERATION_ACTION_DAYS", default=730, cast=int),
+        # Appeals cascade from their action, so keep appealed actions live,
+        # and keep actions a live compliance log still points at.
+        "filters": {"appeals__isnull": True, "compliancelog__isnull": True},
+    },
+}
+
 
 # ============================================
 # Animal Marketplace Configuration
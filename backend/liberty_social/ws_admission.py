@@ -0,0 +1,89 @@
+"""
+Admission control and handshake metrics for websocket connections.
+
+Each worker admits at most ``WS_HANDSHAKE_CONCURRENCY`` handshakes at once.
+A handshake holds its slot from the moment the socket reaches the ASGI app
+until the consumer accepts or closes it; sockets that cannot get a slot
+within ``WS_HANDSHAKE_TIMEOUT`` seconds are rejected so clients back off and
+retry instead of piling onto Postgres after a deploy.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from django.conf import settings
+
+LATENCY_SAMPLE_SIZE = 1000
+
+
+class HandshakeAdmission:
+    def __init__(self, limit: int, timeout: float):
+        self.limit = limit
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        try:
+            await asyncio.wait_for(self._get_semaphore().acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self, started_at: float) -> None:
+        self.in_flight -= 1
+        self._latencies.append(time.monotonic() - started_at)
+        self._get_semaphore().release()
+
+    def metrics(self) -> Dict[str, object]:
+        samples = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return round(samples[index] * 1000, 2)
+
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "latency_ms": {
+                "samples": len(samples),
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": percentile(1.0),
+            },
+        }
+
+
+_admission: Optional[HandshakeAdmission] = None
+
+
+def get_admission() -> HandshakeAdmission:
+    global _admission
+    if _admission is None:
+        _admission = HandshakeAdmission(
+            limit=getattr(settings, "WS_HANDSHAKE_CONCURRENCY", 100),
+            timeout=getattr(settings, "WS_HANDSHAKE_TIMEOUT", 5),
+        )
+    return _admission
+
+
+def get_handshake_metrics() -> Dict[str, object]:
+    return get_admission().metrics()
@@ -376,6 +376,11 @@ class AnimalListing(models.Model):
         help_text="Array of triggered scam detection flags",
     )
     review_note = models.TextField(blank=True, help_text="Admin notes for review")
+    # Materialized by main.risk_score; see get_risk_score for the live value.
+    risk_score = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Scam risk score (0-100), recomputed when its inputs change",
+    )
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -397,6 +402,7 @@ class AnimalListing(models.Model):
             models.Index(fields=["state_code", "status"]),
             models.Index(fields=["is_legal_in_state", "status"]),
             models.Index(fields=["suspicious_activity"]),
+            models.Index(fields=["status", "risk_score"]),
         ]
 
     def __str__(self):
@@ -445,39 +451,25 @@ class AnimalListing(models.Model):
         self.legal_check_date = timezone.now()
 
     def get_risk_score(self):
-        """Calculate scam risk score (0-100)."""
-        score = 0
-
-        # Photo/media missing
-        if not self.media_count:
-            score += 15
-
-        # Suspicious flags
-        score += len(self.scam_flags) * 10
-
-        # Unverified seller
-        if not self.seller_verification or not self.seller_verification.is_verified:
-            score += 20
-
-        # No vet documentation for paid listings
-        if self.price > 0 and not hasattr(self, "vet_documentation"):
-            score += 10
-
-        # New seller with activity
-        from django.utils import timezone
-        from datetime import timedelta
-
-        if (timezone.now() - self.seller.date_joined) < timedelta(days=7):
-            score += 10
-
-        # Many listings flagged as sold but relisted
-        resale_count = AnimalListing.objects.filter(
-            seller=self.seller, status="sold"
-        ).count()
-        if resale_count > 10:
-            score += 15
-
-        return min(score, 100)
+        """Calculate scam risk score (0-100) from live data.
+
+        Reads are served from the stored ``risk_score``; this is the same
+        rule evaluated for a single listing.
+        """
+        from .risk_score import score
+        from .seller_stats import stats_of
+
+        verification = self.seller_verification
+        stats = stats_of(self.seller)
+        return score(
+            media_count=self.media_count,
+            scam_flags=self.scam_flags,
+            seller_verified=bool(verification and verification.is_verified),
+            price=self.price,
+            has_vet_documentation=hasattr(self, "vet_documentation"),
+            seller_joined=self.seller.date_joined,
+            seller_sold_count=stats.sold_count if stats else 0,
+        )
 
     @property
     def media_count(self):
@@ -498,6 +490,41 @@ class AnimalListing(models.Model):
         return round(avg_rating, 1) if avg_rating else None
 
 
+class ImageFingerprint(models.Model):
+    """Analysis of one distinct image, keyed by the SHA-256 of its bytes.
+
+    Written by ``main.media_analysis``; media rows point here, so listings
+    sharing a photo share a row and an indexed lookup finds them.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    # Signed 64-bit perceptual hashes; see main.utils.perceptual_hash.
+    phash = models.BigIntegerField(db_index=True)
+    dhash = models.BigIntegerField()
+    # 16-bit segments of phash for the near-duplicate index; see
+    # main.duplicate_images.
+    phash_0 = models.PositiveIntegerField(default=0, db_index=True)
+    phash_1 = models.PositiveIntegerField(default=0, db_index=True)
+    phash_2 = models.PositiveIntegerField(default=0, db_index=True)
+    phash_3 = models.PositiveIntegerField(default=0, db_index=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    byte_size = models.PositiveIntegerField(default=0)
+    is_stock = models.BooleanField(default=False)
+    stock_confidence = models.FloatField(default=0.0)
+    stock_reasons = models.JSONField(default=list, blank=True)
+    analyzed_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        from .utils.perceptual_hash import segments
+
+        self.phash_0, self.phash_1, self.phash_2, self.phash_3 = segments(self.phash)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Image {self.content_hash[:12]}"
+
+
 class AnimalListingMedia(models.Model):
     """Media (photos/videos) for animal listings."""
 
@@ -527,9 +554,20 @@ class AnimalListingMedia(models.Model):
         validators=[MinValueValidator(0.0)],
         help_text="Confidence score 0-1.0 for stock photo detection",
     )
+    fingerprint = models.ForeignKey(
+        ImageFingerprint,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="animal_media",
+    )
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
     order = models.PositiveSmallIntegerField(default=0)
+    # Sized WebP/AVIF renditions and a BlurHash placeholder, filled in by
+    # main.image_derivatives after upload.
+    variants = models.JSONField(default=dict, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
         ordering = ["order", "uploaded_at"]
@@ -598,6 +636,43 @@ class SellerReview(models.Model):
         return f"Review by {self.buyer.username} for {self.seller.username}"
 
 
+class SellerStats(models.Model):
+    """Per-seller reputation aggregates maintained by ``main.seller_stats``."""
+
+    seller = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="seller_stats",
+    )
+    sold_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    # Rating histogram, one counter per star so increments stay atomic F() updates.
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Seller Stats"
+
+    def __str__(self):
+        return f"Stats for seller {self.seller_id}"
+
+    @property
+    def average_rating(self):
+        """Mean rating rounded to one decimal, or None without reviews."""
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f"rating_{star}") for star in range(1, 6)}
+
+
 class SuspiciousActivityLog(models.Model):
     """Log of suspicious activities for fraud detection."""
 
@@ -19,6 +19,7 @@ from .animal_models import (
     AdminActionLog,
 )
 from users.serializers import UserSerializer
+from .seller_stats import stats_of
 
 User = get_user_model()
 
@@ -124,8 +125,16 @@ class AnimalListingMediaSerializer(serializers.ModelSerializer):
             "is_stock_photo",
             "stock_photo_confidence",
             "order",
+            "variants",
+            "blurhash",
+        ]
+        read_only_fields = [
+            "id",
+            "is_stock_photo",
+            "stock_photo_confidence",
+            "variants",
+            "blurhash",
         ]
-        read_only_fields = ["id", "is_stock_photo", "stock_photo_confidence"]
 
 
 class SellerReviewSerializer(serializers.ModelSerializer):
@@ -181,7 +190,7 @@ class AnimalListingDetailSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False,
     )
-    risk_score = serializers.SerializerMethodField()
+    risk_score = serializers.IntegerField(read_only=True)
     seller_rating = serializers.SerializerMethodField()
 
     def get_category_name(self, obj):
@@ -244,13 +253,10 @@ class AnimalListingDetailSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
 
-    def get_risk_score(self, obj):
-        """Calculate and return risk score."""
-        return obj.get_risk_score()
-
     def get_seller_rating(self, obj):
-        """Get seller's average rating from reviews."""
-        return obj.seller_review_score
+        """Get seller's average rating from the SellerStats aggregate."""
+        stats = stats_of(obj.seller)
+        return stats.average_rating if stats else None
 
     def create(self, validated_data):
         """Create listing with media and perform legal checks."""
@@ -311,7 +317,7 @@ class AnimalListingListSerializer(serializers.ModelSerializer):
     category = AnimalCategorySerializer(read_only=True)
     primary_image = serializers.SerializerMethodField()
     animal_listing_media = serializers.SerializerMethodField()
-    risk_score = serializers.SerializerMethodField()
+    risk_score = serializers.IntegerField(read_only=True)
     seller_verified = serializers.SerializerMethodField()
     has_vet_documentation = serializers.SerializerMethodField()
 
@@ -353,10 +359,6 @@ class AnimalListingListSerializer(serializers.ModelSerializer):
             {"id": m.id, "url": m.url, "media_type": m.media_type} for m in media_items
         ]
 
-    def get_risk_score(self, obj):
-        """Get risk score for listing."""
-        return obj.get_risk_score()
-
     def get_seller_verified(self, obj):
         """Check if seller is verified."""
         if obj.seller_verification:
@@ -9,12 +9,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.utils import timezone
-from django.db.models import Q, Avg
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from datetime import timedelta
 from django.contrib.contenttypes.models import ContentType
 from .models import Notification
 from .emails import send_templated_email
+from .media_analysis import schedule_analysis
+from .seller_stats import stats_of
+from .view_counter import record_view
 
 from .animal_models import (
     AnimalCategory,
@@ -23,6 +26,7 @@ from .animal_models import (
     AnimalListing,
     AnimalListingMedia,
     SellerReview,
+    SellerStats,
     SuspiciousActivityLog,
     BreederDirectory,
     AdminActionLog,
@@ -359,7 +363,7 @@ class AnimalListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
         """Get filtered listings based on user permissions."""
         queryset = (
             AnimalListing.objects.select_related(
-                "seller", "category", "seller_verification"
+                "seller", "seller__seller_stats", "category", "seller_verification"
             )
             .prefetch_related("media", "seller_reviews")
             .filter(status__in=["active", "held", "sold"])
@@ -389,20 +393,13 @@ class AnimalListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
 
         queryset = queryset.order_by("-created_at")
 
-        # Filter by risk score (requires post-filtering since it's calculated)
+        # Filter by the materialized risk score (indexed with status)
         risk_score_min = self.request.query_params.get("risk_score_min")
         risk_score_max = self.request.query_params.get("risk_score_max")
-        if risk_score_min is not None or risk_score_max is not None:
-            listings = list(queryset)
-            filtered_listings = []
-            for listing in listings:
-                risk_score = listing.get_risk_score()
-                if risk_score_min is not None and risk_score < float(risk_score_min):
-                    continue
-                if risk_score_max is not None and risk_score > float(risk_score_max):
-                    continue
-                filtered_listings.append(listing.pk)
-            queryset = AnimalListing.objects.filter(pk__in=filtered_listings).order_by("-created_at")
+        if risk_score_min is not None:
+            queryset = queryset.filter(risk_score__gte=float(risk_score_min))
+        if risk_score_max is not None:
+            queryset = queryset.filter(risk_score__lte=float(risk_score_max))
 
         return queryset
 
@@ -503,11 +500,10 @@ class AnimalListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"])
     def increment_view(self, request, pk=None):
-        """Increment view count for listing."""
+        """Increment view count for listing (buffered, once per viewer per window)."""
         listing = self.get_object()
-        listing.views_count += 1
-        listing.save(update_fields=["views_count"])
-        return Response({"views_count": listing.views_count})
+        views_count = record_view("animal", listing, str(request.user.pk))
+        return Response({"views_count": views_count})
 
     @action(detail=True, methods=["post"])
     def report_suspicious(self, request, pk=None):
@@ -560,12 +556,7 @@ class AnimalListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
         """Get seller profile with reviews and ratings."""
         listing = self.get_object()
         seller = listing.seller
-
-        all_listings = AnimalListing.objects.filter(
-            seller=seller, status="sold"
-        ).count()
-        all_reviews = SellerReview.objects.filter(seller=seller)
-        avg_rating = all_reviews.aggregate(Avg("rating"))["rating__avg"]
+        stats = stats_of(seller)
 
         return Response(
             {
@@ -580,11 +571,15 @@ class AnimalListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
                     if hasattr(seller, "animal_seller_verification")
                     else None
                 ),
-                "listings_sold": all_listings,
-                "average_rating": round(avg_rating, 1) if avg_rating else 0,
-                "review_count": all_reviews.count(),
+                "listings_sold": stats.sold_count if stats else 0,
+                "average_rating": (stats.average_rating if stats else None) or 0,
+                "review_count": stats.review_count if stats else 0,
+                "rating_histogram": (
+                    stats.rating_histogram if stats else {star: 0 for star in range(1, 6)}
+                ),
                 "recent_reviews": SellerReviewSerializer(
-                    all_reviews.order_by("-created_at")[:5], many=True
+                    SellerReview.objects.filter(seller=seller).order_by("-created_at")[:5],
+                    many=True,
                 ).data,
             }
         )
@@ -607,9 +602,7 @@ class AnimalListingMediaViewSet(viewsets.ModelViewSet):
         return AnimalListingMedia.objects.none()
 
     def perform_create(self, serializer):
-        """Create media for listing with stock photo detection."""
-        from .utils.stock_photo_detector import StockPhotoDetector
-        
+        """Create media for listing; stock/reused photo detection runs in the background."""
         listing_id = self.request.data.get("listing_id")
         listing = get_object_or_404(AnimalListing, id=listing_id)
 
@@ -617,19 +610,10 @@ class AnimalListingMediaViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Cannot add media to this listing.")
 
         media = serializer.save(listing=listing)
-        
-        # Check for stock photos
+
+        # Fingerprinting downloads the image; flags are added once it is done.
         if media.url:
-            is_stock, confidence = StockPhotoDetector.detect(media.url)
-            media.is_stock_photo = is_stock
-            media.stock_photo_confidence = confidence
-            media.save()
-            
-            # Add to listing's scam flags if high confidence stock photo
-            if is_stock and confidence > 0.7:
-                if "stock_photo_detected" not in listing.scam_flags:
-                    listing.scam_flags.append("stock_photo_detected")
-                    listing.save()
+            schedule_analysis("animal", media.pk)
 
 
 class SellerReviewViewSet(viewsets.ModelViewSet):
@@ -660,16 +644,16 @@ class SellerReviewViewSet(viewsets.ModelViewSet):
         ).exists():
             raise ValidationError("You already reviewed this transaction.")
 
+        # SellerStats is adjusted by the SellerReview post_save signal.
         serializer.save(buyer=self.request.user, seller=listing.seller)
 
-        # Update seller's average rating
-        avg_rating = SellerReview.objects.filter(seller=listing.seller).aggregate(
-            Avg("rating")
-        )["rating__avg"]
-
-        if listing.seller_verification:
-            listing.seller_verification.average_rating = avg_rating or 0
-            listing.seller_verification.save(update_fields=["average_rating"])
+        # Mirror the aggregate onto the seller's breeder directory entry, if any.
+        stats = SellerStats.objects.filter(seller=listing.seller).first()
+        if stats:
+            BreederDirectory.objects.filter(seller__user=listing.seller).update(
+                average_rating=stats.average_rating or 0,
+                total_reviews=stats.review_count,
+            )
 
 
 class BreederDirectoryViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
@@ -0,0 +1,65 @@
+"""
+Cached conversation membership checks for websocket consumers.
+
+Reconnect storms used to run one ``ConversationParticipant`` query per socket.
+Positive membership results are cached for ``WS_MEMBERSHIP_CACHE_TTL``
+seconds; negatives are never cached, so newly added participants (including
+``bulk_create`` paths that skip signals) can connect immediately. Removing a
+participant clears its entry via the ``post_delete`` signal in
+``main.signals``.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ConversationParticipant
+
+
+def membership_cache_key(conversation_id, user_id) -> str:
+    return f"ws:member:{conversation_id}:{user_id}"
+
+
+def conversation_size_cache_key(conversation_id) -> str:
+    return f"ws:size:{conversation_id}"
+
+
+def _membership_ttl() -> int:
+    return getattr(settings, "WS_MEMBERSHIP_CACHE_TTL", 300)
+
+
+def _lookup_membership(conversation_id, user_id) -> bool:
+    return ConversationParticipant.objects.filter(
+        conversation_id=conversation_id, user_id=user_id
+    ).exists()
+
+
+async def user_in_conversation(user_id, conversation_id) -> bool:
+    key = membership_cache_key(conversation_id, user_id)
+    if await cache.aget(key):
+        return True
+    is_member = await sync_to_async(_lookup_membership)(conversation_id, user_id)
+    if is_member:
+        await cache.aset(key, True, timeout=_membership_ttl())
+    return is_member
+
+
+async def conversation_size(conversation_id) -> int:
+    """Participant count, cached alongside membership."""
+    key = conversation_size_cache_key(conversation_id)
+    size = await cache.aget(key)
+    if size is None:
+        size = await ConversationParticipant.objects.filter(
+            conversation_id=conversation_id
+        ).acount()
+        await cache.aset(key, size, timeout=_membership_ttl())
+    return size
+
+
+def invalidate_membership(conversation_id, user_id) -> None:
+    cache.delete_many(
+        [
+            membership_cache_key(conversation_id, user_id),
+            conversation_size_cache_key(conversation_id),
+        ]
+    )
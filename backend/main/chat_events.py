@@ -0,0 +1,179 @@
+"""
+Compact wire format for chat broadcasts.
+
+Channel-layer events carry a message as a flat dict of ids and scalar fields;
+users (the sender and reactors) are referenced by id only. Clients that
+connect with ``?format=compact`` receive msgpack frames containing just the
+fields that changed and resolve user ids from their own cache. Legacy
+clients keep receiving the full ``MessageSerializer`` shape, which the
+consumer rebuilds from the compact event plus a per-process user cache.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+
+from .realtime import conversation_group_name
+from .realtime_outbox import publish
+
+EVENT_TYPE = "chat.compact"
+
+MESSAGE_CREATED = "created"
+MESSAGE_UPDATED = "updated"
+MESSAGE_DELETED = "deleted"
+
+CLIENT_EVENT_TYPES = {
+    MESSAGE_CREATED: "message.created",
+    MESSAGE_UPDATED: "message.updated",
+    MESSAGE_DELETED: "message.deleted",
+}
+
+# Compact keys always sent to compact clients, even for deltas.
+IDENTITY_FIELDS = ("id", "c")
+
+EDIT_FIELDS = ("t", "e", "ua")
+DELETE_FIELDS = ("d", "ua")
+REACTION_FIELDS = ("rx",)
+
+USER_CACHE_TTL = 60
+USER_CACHE_MAX = 5000
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _ts(value):
+    return _datetime_field.to_representation(value) if value else None
+
+
+def compact_message(message, reactions: Optional[Iterable] = None) -> dict:
+    """Flatten a Message into ids and scalars (see module docstring)."""
+    if reactions is None:
+        reactions = message.reactions.all()
+    return {
+        "id": message.id,
+        "c": message.conversation_id,
+        "s": str(message.sender_id),
+        "t": message.content,
+        "m": message.media_url,
+        "r": message.reply_to_id,
+        "d": message.is_deleted,
+        "e": _ts(message.edited_at),
+        "ca": _ts(message.created_at),
+        "ua": _ts(message.updated_at),
+        "rx": [
+            [r.id, str(r.user_id), r.reaction_type, _ts(r.created_at)]
+            for r in reactions
+        ],
+    }
+
+
+def build_message_event(
+    kind: str,
+    message,
+    fields: Optional[Sequence[str]] = None,
+    reactions: Optional[Iterable] = None,
+) -> dict:
+    return {
+        "type": EVENT_TYPE,
+        "k": kind,
+        "f": list(fields) if fields else None,
+        "m": compact_message(message, reactions=reactions),
+    }
+
+
+def publish_message_event(
+    kind: str,
+    message,
+    fields: Optional[Sequence[str]] = None,
+    reactions: Optional[Iterable] = None,
+) -> None:
+    """Queue a compact message event on the conversation group's outbox."""
+    publish(
+        conversation_group_name(str(message.conversation_id)),
+        build_message_event(kind, message, fields=fields, reactions=reactions),
+    )
+
+
+def delta_payload(event: dict) -> dict:
+    """Payload for compact clients: identity plus the changed fields only."""
+    message = event["m"]
+    fields = event.get("f")
+    if not fields:
+        return message
+    return {key: message[key] for key in (*IDENTITY_FIELDS, *fields) if key in message}
+
+
+def _load_user_summaries(user_ids: List[str]) -> Dict[str, dict]:
+    from users.models import User
+    from users.serializers import UserSerializer
+
+    return {
+        str(user.id): UserSerializer(user).data
+        for user in User.objects.filter(id__in=user_ids)
+    }
+
+
+_user_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+async def get_user_summaries(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Resolve user ids to ``UserSerializer`` data, cached per process."""
+    now = time.monotonic()
+    found: Dict[str, dict] = {}
+    missing: List[str] = []
+    for user_id in set(user_ids):
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > now:
+            found[user_id] = cached[1]
+            _user_cache.move_to_end(user_id)
+        else:
+            missing.append(user_id)
+
+    if missing:
+        loaded = await sync_to_async(_load_user_summaries)(missing)
+        for user_id, data in loaded.items():
+            _user_cache[user_id] = (now + USER_CACHE_TTL, data)
+            found[user_id] = data
+        while len(_user_cache) > USER_CACHE_MAX:
+            _user_cache.popitem(last=False)
+    return found
+
+
+async def expand_message(message: dict) -> dict:
+    """Rebuild the legacy ``MessageSerializer`` payload from a compact message."""
+    from .models import Reaction
+
+    user_ids = [message["s"], *(rx[1] for rx in message["rx"])]
+    users = await get_user_summaries(user_ids)
+
+    by_type = {choice[0]: 0 for choice in Reaction.TYPE_CHOICES}
+    reactions = []
+    for reaction_id, user_id, reaction_type, created_at in message["rx"]:
+        reactions.append(
+            {
+                "id": reaction_id,
+                "user": users.get(user_id),
+                "reaction_type": reaction_type,
+                "created_at": created_at,
+            }
+        )
+        if reaction_type in by_type:
+            by_type[reaction_type] += 1
+
+    return {
+        "id": message["id"],
+        "conversation": message["c"],
+        "sender": users.get(message["s"]),
+        "content": message["t"],
+        "media_url": message["m"],
+        "reply_to": message["r"],
+        "is_deleted": message["d"],
+        "edited_at": message["e"],
+        "reactions": reactions,
+        "reaction_summary": {"total": sum(by_type.values()), "by_type": by_type},
+        "created_at": message["ca"],
+        "updated_at": message["ua"],
+    }
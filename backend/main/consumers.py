@@ -1,14 +1,24 @@
 import json
+import logging
+from urllib.parse import parse_qs
 
+import msgpack
 from asgiref.sync import sync_to_async
+from channels.consumer import get_handler_name
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.utils import timezone
 
-from .models import ConversationParticipant
+from .chat_access import conversation_size, user_in_conversation
+from .chat_events import CLIENT_EVENT_TYPES, delta_payload, expand_message
 from .realtime import conversation_group_name, notification_group_name
+from .realtime_outbox import decode_batch
+from .typing_state import TypingAggregator, TypingTracker, typing_aggregate_threshold
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
 
 class ChatConsumer(AsyncJsonWebsocketConsumer):
     """Streams real-time chat events for a conversation."""
@@ -45,7 +55,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             return
 
         try:
-            has_access = await self._user_in_conversation(user.id, conversation_id)
+            has_access = await user_in_conversation(user.id, conversation_id)
             print(
                 f"[CHATWS] user {user.id} has access to conversation {conversation_id}: {has_access}",
                 flush=True,
@@ -69,6 +79,8 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
         self.conversation_id = str(conversation_id)
         self.group_name = conversation_group_name(self.conversation_id)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.compact_format = "compact" in query.get("format", [])
 
         try:
             print(f"[CHATWS] Adding to group: {self.group_name}", flush=True)
@@ -88,6 +100,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
     async def disconnect(self, code):
         print(f"[CHATWS] Disconnect called with code: {code}", flush=True)
+        await self._close_typing_state()
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
             print(f"[CHATWS] Removed from group: {self.group_name}", flush=True)
@@ -110,35 +123,72 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self._handle_call_end(content)
 
     async def _handle_typing_start(self):
-        """Handle user starting to type - broadcast to other participants."""
-        user = self.scope.get("user")
-        if not user:
+        """Handle user starting to type - broadcast (debounced) to other participants."""
+        if not self.scope.get("user"):
             return
-
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "typing.started",
-                "user_id": str(user.id),
-                "username": user.username,
-            },
-        )
+        await self._get_typing_tracker().start()
 
     async def _handle_typing_stop(self):
-        """Handle user stopping to type - broadcast to other participants."""
-        user = self.scope.get("user")
-        if not user:
+        """Handle user stopping to type - broadcast (debounced) to other participants."""
+        if not self.scope.get("user"):
             return
+        await self._get_typing_tracker().stop()
+
+    def _get_typing_tracker(self):
+        tracker = getattr(self, "typing_tracker", None)
+        if tracker is None:
+            tracker = self.typing_tracker = TypingTracker(self._broadcast_typing)
+        return tracker
 
+    async def _broadcast_typing(self, is_typing):
+        user = self.scope.get("user")
         await self.channel_layer.group_send(
             self.group_name,
             {
-                "type": "typing.stopped",
+                "group": self.group_name,
+                "type": "typing.started" if is_typing else "typing.stopped",
                 "user_id": str(user.id),
                 "username": user.username,
             },
         )
 
+    async def _get_typing_aggregator(self):
+        """Aggregator for large conversations, or None to relay per-user events."""
+        if not hasattr(self, "typing_aggregator"):
+            self.typing_aggregator = None
+            size = await conversation_size(self.conversation_id)
+            if size >= typing_aggregate_threshold():
+                user = self.scope.get("user")
+                self.typing_aggregator = TypingAggregator(
+                    self.send_json, exclude_user_id=str(user.id) if user else None
+                )
+        return self.typing_aggregator
+
+    async def _close_typing_state(self):
+        tracker = getattr(self, "typing_tracker", None)
+        if tracker:
+            await tracker.close()
+        aggregator = getattr(self, "typing_aggregator", None)
+        if aggregator:
+            aggregator.close()
+
+    async def outbox_batch(self, event):
+        """Unpack a batched outbox message and dispatch each event."""
+        for item in decode_batch(event):
+            await self.dispatch(item)
+
+    async def chat_compact(self, event):
+        """Deliver a compact message event in the client's negotiated format."""
+        event_type = CLIENT_EVENT_TYPES[event["k"]]
+        if self.compact_format:
+            await self.send_msgpack({"type": event_type, "payload": delta_payload(event)})
+            return
+        payload = await expand_message(event["m"])
+        await self.send_json({"type": event_type, "payload": payload})
+
+    async def send_msgpack(self, content):
+        await self.send(bytes_data=msgpack.packb(content, use_bin_type=True))
+
     async def chat_message(self, event):
         await self.send_json(
             {
@@ -165,6 +215,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
     async def typing_started(self, event):
         """Broadcast typing started event to all participants except sender."""
+        aggregator = await self._get_typing_aggregator()
+        if aggregator:
+            aggregator.update(event.get("user_id"), event.get("username"), True)
+            return
         await self.send_json(
             {
                 "type": "typing.started",
@@ -175,6 +229,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
 
     async def typing_stopped(self, event):
         """Broadcast typing stopped event to all participants except sender."""
+        aggregator = await self._get_typing_aggregator()
+        if aggregator:
+            aggregator.update(event.get("user_id"), event.get("username"), False)
+            return
         await self.send_json(
             {
                 "type": "typing.stopped",
@@ -193,6 +251,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(
             self.group_name,
             {
+                "group": self.group_name,
                 "type": "call.offer",
                 "caller_id": str(user.id),
                 "caller_username": user.username,
@@ -221,6 +280,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 receiver_notification_group,
                 {
+                    "group": receiver_notification_group,
                     "type": "call_offer",  # Use underscore for channel layer routing
                     "caller_id": str(user.id),
                     "caller_username": user.username,
@@ -243,6 +303,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(
             self.group_name,
             {
+                "group": self.group_name,
                 "type": "call.answer",
                 "receiver_id": str(user.id),
                 "call_id": content.get("call_id"),
@@ -267,6 +328,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 caller_notification_group,
                 {
+                    "group": caller_notification_group,
                     "type": "call_answer",  # Use underscore for channel layer routing
                     "receiver_id": str(user.id),
                     "call_id": content.get("call_id"),
@@ -285,7 +347,8 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(
             self.group_name,
             {
-                "type": "call.ice-candidate",
+                "group": self.group_name,
+                "type": "call_ice_candidate",  # "-" cannot map to a handler name
                 "user_id": str(user.id),
                 "call_id": content.get("call_id"),
                 "candidate": content.get("candidate"),
@@ -302,6 +365,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(
             self.group_name,
             {
+                "group": self.group_name,
                 "type": "call.end",
                 "user_id": str(user.id),
                 "call_id": content.get("call_id"),
@@ -326,6 +390,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 other_notification_group,
                 {
+                    "group": other_notification_group,
                     "type": "call_end",  # Use underscore for channel layer routing
                     "user_id": str(user.id),
                     "call_id": content.get("call_id"),
@@ -416,12 +481,6 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-    @sync_to_async
-    def _user_in_conversation(self, user_id, conversation_id):
-        return ConversationParticipant.objects.filter(
-            conversation_id=conversation_id, user_id=user_id
-        ).exists()
-
 
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     """Streams real-time notifications for a user (primarily for mobile app)."""
@@ -477,6 +536,7 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 receiver_notification_group,
                 {
+                    "group": receiver_notification_group,
                     "type": "call_offer",
                     "caller_id": str(self.user.id),
                     "caller_username": self.user.username,
@@ -508,6 +568,7 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 caller_notification_group,
                 {
+                    "group": caller_notification_group,
                     "type": "call_answer",
                     "receiver_id": str(self.user.id),
                     "call_id": content.get("call_id"),
@@ -537,6 +598,7 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 other_notification_group,
                 {
+                    "group": other_notification_group,
                     "type": "call_end",
                     "user_id": str(self.user.id),
                     "call_id": content.get("call_id"),
@@ -562,6 +624,7 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 other_notification_group,
                 {
+                    "group": other_notification_group,
                     "type": "call_ice_candidate",
                     "user_id": str(self.user.id),
                     "call_id": content.get("call_id"),
@@ -682,6 +745,7 @@ class UserStatusConsumer(AsyncJsonWebsocketConsumer):
                 await self.channel_layer.group_send(
                     self.group_name,
                     {
+                        "group": self.group_name,
                         "type": "user.status.changed",
                         "user_id": self.user_id,
                         "is_online": True,
@@ -709,6 +773,7 @@ class UserStatusConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_send(
                 self.group_name,
                 {
+                    "group": self.group_name,
                     "type": "user.status.changed",
                     "user_id": self.user_id,
                     "is_online": False,
@@ -760,3 +825,205 @@ class UserStatusConsumer(AsyncJsonWebsocketConsumer):
             user.save(update_fields=["last_activity", "last_seen"])
         except User.DoesNotExist:
             pass
+
+
+class _TopicDelegate:
+    """Runs an existing consumer's handlers for one topic of a multiplexed socket.
+
+    Delegates are mixed in ahead of the legacy consumer class, so every
+    channel-layer handler and client action behaves exactly as it does on the
+    dedicated socket; outgoing frames are only stamped with ``topic``.
+    """
+
+    def __init__(self, owner, topic, group_name):
+        self.owner = owner
+        self.topic = topic
+        self.group_name = group_name
+        self.scope = owner.scope
+        self.channel_layer = owner.channel_layer
+        self.channel_name = None
+
+    async def send_json(self, content, close=False):
+        await self.owner.send_json({**content, "topic": self.topic})
+
+    async def send_msgpack(self, content):
+        await self.owner.send_msgpack({**content, "topic": self.topic})
+
+    async def dispatch(self, message):
+        handler = getattr(self, get_handler_name(message), None)
+        if handler is None:
+            logger.debug("No %s handler for %s", self.topic, message.get("type"))
+            return
+        await handler(message)
+
+    async def on_subscribe(self):
+        pass
+
+    async def on_unsubscribe(self):
+        pass
+
+
+class _ConversationTopic(_TopicDelegate, ChatConsumer):
+    def __init__(self, owner, topic, conversation_id):
+        super().__init__(owner, topic, conversation_group_name(conversation_id))
+        self.conversation_id = conversation_id
+        self.compact_format = owner.compact_format
+
+    async def on_subscribe(self):
+        await self.send_json(
+            {"type": "connection.ack", "conversation": self.conversation_id}
+        )
+
+    async def on_unsubscribe(self):
+        await self._close_typing_state()
+
+
+class _NotificationTopic(_TopicDelegate, NotificationConsumer):
+    def __init__(self, owner, topic):
+        super().__init__(owner, topic, notification_group_name(owner.user_id))
+        self.user = owner.user
+        self.user_id = owner.user_id
+
+    async def on_subscribe(self):
+        await self.send_json({"type": "connection.ack", "user_id": self.user_id})
+
+
+class _PresenceTopic(_TopicDelegate, UserStatusConsumer):
+    def __init__(self, owner, topic):
+        super().__init__(owner, topic, "user_status")
+        self.user_id = owner.user_id
+
+    async def _broadcast_status(self, is_online):
+        await self._set_user_online(self.user_id, is_online)
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                "group": self.group_name,
+                "type": "user.status.changed",
+                "user_id": self.user_id,
+                "is_online": is_online,
+            },
+        )
+
+    async def on_subscribe(self):
+        await self._broadcast_status(True)
+        await self.send_json({"type": "connection.ack", "user_id": self.user_id})
+
+    async def on_unsubscribe(self):
+        await self._broadcast_status(False)
+
+
+class MultiplexConsumer(AsyncJsonWebsocketConsumer):
+    """One authenticated socket carrying conversation, notification and presence topics.
+
+    Clients send ``{"type": "subscribe", "topic": ...}`` / ``unsubscribe`` with
+    topics ``conversation:<id>``, ``notifications`` or ``presence``. Every
+    topic group is joined on the socket's own channel, so a connection holds a
+    single layer subscription however many topics it carries. Producers stamp
+    each event with its ``group``, which picks the topic; unstamped events go
+    to every topic with a handler for their type. Server frames keep the
+    legacy event types and gain a ``topic`` key. Client actions (typing,
+    calls, pings) are routed to the topic named in the frame.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or isinstance(user, AnonymousUser) or user.is_anonymous:
+            await self.close(code=4401)
+            return
+
+        self.user = user
+        self.user_id = str(user.id)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.compact_format = "compact" in query.get("format", [])
+        self.topics = {}
+        self.max_topics = getattr(settings, "WS_MAX_TOPICS", 50)
+
+        await self.accept()
+        await self.send_json({"type": "connection.ack", "user_id": self.user_id})
+
+    async def disconnect(self, code):
+        for topic in list(getattr(self, "topics", {})):
+            await self._unsubscribe(topic)
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get("type")
+        topic = content.get("topic")
+        if message_type == "subscribe":
+            await self._subscribe(topic)
+        elif message_type == "unsubscribe":
+            await self._unsubscribe(topic)
+            await self.send_json({"type": "unsubscribed", "topic": topic})
+        elif topic in self.topics:
+            await self.topics[topic].receive_json(content)
+        elif message_type == "ping":
+            await self.send_json({"type": "pong"})
+
+    async def send_msgpack(self, content):
+        await self.send(bytes_data=msgpack.packb(content, use_bin_type=True))
+
+    async def _subscription_error(self, topic, code):
+        await self.send_json({"type": "subscription.error", "topic": topic, "code": code})
+
+    async def _build_delegate(self, topic):
+        """Return ``(delegate, error_code)`` for a topic name."""
+        if topic == "notifications":
+            return _NotificationTopic(self, topic), None
+        if topic == "presence":
+            return _PresenceTopic(self, topic), None
+        if isinstance(topic, str) and topic.startswith("conversation:"):
+            conversation_id = topic.split(":", 1)[1]
+            if not conversation_id.isdigit():
+                return None, 4400
+            if not await user_in_conversation(self.user.id, int(conversation_id)):
+                return None, 4403
+            return _ConversationTopic(self, topic, conversation_id), None
+        return None, 4400
+
+    async def _subscribe(self, topic):
+        if topic in self.topics:
+            return
+        if len(self.topics) >= self.max_topics:
+            await self._subscription_error(topic, 4429)
+            return
+        try:
+            delegate, error_code = await self._build_delegate(topic)
+        except Exception:
+            logger.exception("Error checking access to topic %s", topic)
+            delegate, error_code = None, 4500
+        if delegate is None:
+            await self._subscription_error(topic, error_code)
+            return
+
+        delegate.channel_name = self.channel_name
+        await self.channel_layer.group_add(delegate.group_name, self.channel_name)
+        self.topics[topic] = delegate
+        await delegate.on_subscribe()
+
+    async def _unsubscribe(self, topic):
+        delegate = self.topics.pop(topic, None)
+        if delegate is None:
+            return
+        if not any(other.group_name == delegate.group_name for other in self.topics.values()):
+            await self.channel_layer.group_discard(delegate.group_name, self.channel_name)
+        try:
+            await delegate.on_unsubscribe()
+        except Exception:
+            logger.exception("Error unsubscribing from topic %s", topic)
+
+    async def dispatch(self, message):
+        """Send websocket messages to the consumer and layer events to their topics."""
+        handler_name = get_handler_name(message)
+        if hasattr(self, handler_name):
+            await super().dispatch(message)
+            return
+        group = message.get("group")
+        for delegate in list(self.topics.values()):
+            if group is not None and delegate.group_name != group:
+                continue
+            if not hasattr(delegate, handler_name):
+                continue
+            try:
+                await delegate.dispatch(message)
+            except Exception:
+                logger.exception("Error handling %s event on %s", message.get("type"), delegate.topic)
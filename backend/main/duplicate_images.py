@@ -0,0 +1,233 @@
+"""
+Near-duplicate photo index across animal and marketplace listings.
+
+Every analyzed photo has an ``ImageFingerprint`` with a 64-bit pHash.
+Two photos are near-duplicates when their hashes differ in at most
+``DUPLICATE_IMAGE_MAX_DISTANCE`` bits. Re-encoding, resizing and light
+edits stay well inside that distance.
+
+The search uses multi-index hashing. The hash is split into four 16-bit
+segments, stored as indexed columns ``phash_0`` .. ``phash_3``. If two
+hashes are within distance ``k``, at least one segment pair is within
+``k // 4`` bits (pigeonhole). A query therefore probes each segment
+index with the values within that radius: 17 values per segment for the
+default ``k`` of 6. It then checks the exact distance of the few rows
+that come back. This is sublinear in the number of stored images, with
+no full scan.
+
+- Online: ``has_earlier_duplicate`` runs one such query against the table
+  when a photo is analyzed (``main.media_analysis``).
+- Batch: ``rebuild`` loads the hashes into an in-memory
+  ``MultiIndexHash``, re-derives the stored segments, and re-checks every
+  listing photo (``rebuild_duplicate_image_index`` command).
+
+Flat or near-uniform photos (blank backgrounds, solid colours) all hash
+to nearly the same pHash, so they are never matched: a photo whose dHash
+has fewer than ``MIN_DETAIL_BITS`` horizontal edges (or all but that many)
+is skipped, and a candidate must also be within ``DHASH_FACTOR * k`` on
+dHash.
+
+A listing is flagged when one of its photos matches a photo on a listing
+that another seller posted earlier. The earlier listing is left alone.
+Animal listings get ``reused_photo`` in ``scam_flags``. Marketplace
+listings, which have no flag list, are marked ``is_flagged`` with a
+reason.
+"""
+
+import logging
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+from .animal_models import AnimalListingMedia, ImageFingerprint
+from .marketplace_models import MarketplaceListing, MarketplaceListingMedia
+from .utils.perceptual_hash import hamming, segments
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS = 4
+SEGMENT_BITS = 16
+SEGMENT_FIELDS = tuple(f"phash_{i}" for i in range(SEGMENTS))
+REUSED_PHOTO_FLAG = "reused_photo"
+REUSED_PHOTO_REASON = "Photo also appears on another seller's earlier listing."
+CHUNK_SIZE = 2000
+# Low-detail guard and dHash agreement; see the module docstring.
+MIN_DETAIL_BITS = 6
+DHASH_FACTOR = 2
+
+# Media kind -> media model.
+MEDIA_MODELS = {
+    "animal": AnimalListingMedia,
+    "marketplace": MarketplaceListingMedia,
+}
+
+
+def max_distance() -> int:
+    return getattr(settings, "DUPLICATE_IMAGE_MAX_DISTANCE", 6)
+
+
+def is_low_detail(dhash: int) -> bool:
+    """Whether a photo has too little structure for its hashes to identify it."""
+    edges = (dhash & ((1 << 64) - 1)).bit_count()
+    return edges < MIN_DETAIL_BITS or edges > 64 - MIN_DETAIL_BITS
+
+
+def _within(value: int, radius: int) -> List[int]:
+    """Every 16-bit value within ``radius`` bits of ``value``."""
+    found = [value]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(SEGMENT_BITS), flips):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            found.append(flipped)
+    return found
+
+
+class MultiIndexHash:
+    """In-memory multi-index hash over ``(id, phash)`` pairs."""
+
+    def __init__(self, distance: int):
+        self.distance = distance
+        self.radius = distance // SEGMENTS
+        self.hashes: Dict[int, int] = {}
+        self.tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(SEGMENTS)]
+
+    def add(self, key: int, phash: int) -> None:
+        self.hashes[key] = phash
+        for table, segment in zip(self.tables, segments(phash)):
+            table[segment].append(key)
+
+    def query(self, phash: int) -> Dict[int, int]:
+        """``{key: distance}`` for every stored hash within ``distance``."""
+        candidates = set()
+        for table, segment in zip(self.tables, segments(phash)):
+            for probe in _within(segment, self.radius):
+                candidates.update(table.get(probe, ()))
+        result = {}
+        for key in candidates:
+            distance = hamming(phash, self.hashes[key])
+            if distance <= self.distance:
+                result[key] = distance
+        return result
+
+
+def near_fingerprints(
+    phash: int, distance: Optional[int] = None, dhash: Optional[int] = None
+) -> Dict[int, int]:
+    """``{fingerprint id: distance}`` within ``distance`` of ``phash``, via the segment indexes.
+
+    With ``dhash``, candidates must also agree on dHash.
+    """
+    distance = max_distance() if distance is None else distance
+    radius = distance // SEGMENTS
+    condition = Q()
+    for field, segment in zip(SEGMENT_FIELDS, segments(phash)):
+        condition |= Q(**{f"{field}__in": _within(segment, radius)})
+    result = {}
+    rows = ImageFingerprint.objects.filter(condition).values_list("pk", "phash", "dhash")
+    for pk, other, other_dhash in rows:
+        found = hamming(phash, other)
+        if found > distance:
+            continue
+        if dhash is not None and hamming(dhash, other_dhash) > DHASH_FACTOR * distance:
+            continue
+        result[pk] = found
+    return result
+
+
+def has_earlier_duplicate(fingerprint: ImageFingerprint, seller_id, created_at) -> bool:
+    """Whether another seller posted a near-identical photo before ``created_at``."""
+    if is_low_detail(fingerprint.dhash):
+        return False
+    ids = list(near_fingerprints(fingerprint.phash, dhash=fingerprint.dhash))
+    return any(
+        model.objects.filter(fingerprint_id__in=ids, listing__created_at__lt=created_at)
+        .exclude(listing__seller_id=seller_id)
+        .exists()
+        for model in MEDIA_MODELS.values()
+    )
+
+
+def flag_listing(kind: str, listing_id) -> None:
+    if kind == "animal":
+        from .media_analysis import add_scam_flags
+
+        add_scam_flags(listing_id, [REUSED_PHOTO_FLAG])
+    else:
+        MarketplaceListing.objects.filter(pk=listing_id, is_flagged=False).update(
+            is_flagged=True, flagged_reason=REUSED_PHOTO_REASON
+        )
+
+
+def _media_by_fingerprint() -> Dict[int, List[tuple]]:
+    """fingerprint id -> [(kind, listing id, seller id, listing created_at)]."""
+    found = defaultdict(list)
+    for kind, model in MEDIA_MODELS.items():
+        rows = model.objects.filter(fingerprint__isnull=False).values_list(
+            "fingerprint_id", "listing_id", "listing__seller_id", "listing__created_at"
+        )
+        for fingerprint_id, listing_id, seller_id, created_at in rows.iterator(chunk_size=CHUNK_SIZE):
+            found[fingerprint_id].append((kind, listing_id, seller_id, created_at))
+    return found
+
+
+def reindex_segments() -> int:
+    """Re-derive the stored segment columns from ``phash``; returns rows fixed."""
+    stale = []
+    for fingerprint in ImageFingerprint.objects.only("pk", "phash", *SEGMENT_FIELDS).iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        expected = segments(fingerprint.phash)
+        if tuple(getattr(fingerprint, field) for field in SEGMENT_FIELDS) != expected:
+            for field, value in zip(SEGMENT_FIELDS, expected):
+                setattr(fingerprint, field, value)
+            stale.append(fingerprint)
+    ImageFingerprint.objects.bulk_update(stale, SEGMENT_FIELDS, batch_size=CHUNK_SIZE)
+    return len(stale)
+
+
+def find_duplicate_listings(distance: Optional[int] = None) -> Iterable[Tuple[str, int]]:
+    """``(kind, listing id)`` of every listing reusing an earlier listing's photo."""
+    distance = max_distance() if distance is None else distance
+    index = MultiIndexHash(distance)
+    media = _media_by_fingerprint()
+    dhashes = {}
+    rows = ImageFingerprint.objects.filter(pk__in=list(media)).values_list("pk", "phash", "dhash")
+    for pk, phash, dhash in rows:
+        if not is_low_detail(dhash):
+            index.add(pk, phash)
+            dhashes[pk] = dhash
+
+    flagged = set()
+    for fingerprint_id, phash in index.hashes.items():
+        dhash = dhashes[fingerprint_id]
+        neighbours = [
+            row
+            for other in index.query(phash)
+            if hamming(dhash, dhashes[other]) <= DHASH_FACTOR * distance
+            for row in media[other]
+        ]
+        for kind, listing_id, seller_id, created_at in media[fingerprint_id]:
+            if (kind, listing_id) in flagged:
+                continue
+            if any(
+                other_seller != seller_id and other_created < created_at
+                for _, _, other_seller, other_created in neighbours
+            ):
+                flagged.add((kind, listing_id))
+    return sorted(flagged)
+
+
+def rebuild(distance: Optional[int] = None) -> Dict[str, int]:
+    """Refresh the segment index and flag every listing with a reused photo."""
+    fixed = reindex_segments()
+    duplicates = find_duplicate_listings(distance)
+    for kind, listing_id in duplicates:
+        flag_listing(kind, listing_id)
+    result = {"segments_fixed": fixed, "duplicates": len(duplicates)}
+    logger.info("Duplicate image index rebuilt: %s", result)
+    return result
@@ -0,0 +1,195 @@
+"""
+Responsive image derivatives for uploaded media.
+
+Post, comment, marketplace and animal media, and profile pictures, are
+stored at their original upload URL. Once a row that points into the
+upload bucket is saved, ``schedule`` queues ``main.tasks.generate_image_derivatives``
+after commit. The task:
+
+- reads the original straight from S3 through the shared client (never
+  over HTTP, so arbitrary user-supplied URLs are not fetched);
+- renders it with Pillow at each of ``WIDTHS`` narrower than the original,
+  as WebP and, when the Pillow build supports it, AVIF;
+- stores each rendition under ``derivatives/<source key>/<width>w.<format>``
+  with a long immutable ``Cache-Control``;
+- computes a BlurHash placeholder from a 32px thumbnail;
+- records everything on the row with a single UPDATE guarded by the source
+  URL, so a URL that changed in the meantime is left for its own task.
+
+The recorded value is::
+
+    {"source": url, "width": w, "height": h,
+     "sizes": [{"width": 160, "height": 120, "webp": url, "avif": url}, ...]}
+
+``source`` tells later saves whether the renditions are current. Sources
+that are not images (or cannot be decoded) are recorded with no sizes, so
+they are not retried on every save.
+"""
+
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from . import s3
+from .utils import blurhash
+
+logger = logging.getLogger(__name__)
+
+# Target name -> (model label, URL field, variants field, blurhash field).
+TARGETS = {
+    "post": ("main.PostMedia", "url", "variants", "blurhash"),
+    "comment": ("main.CommentMedia", "url", "variants", "blurhash"),
+    "marketplace": ("main.MarketplaceListingMedia", "url", "variants", "blurhash"),
+    "animal": ("main.AnimalListingMedia", "url", "variants", "blurhash"),
+    "profile": (
+        "users.User",
+        "profile_image_url",
+        "profile_image_variants",
+        "profile_image_blurhash",
+    ),
+}
+
+WIDTHS = (160, 320, 640, 1280)
+BLURHASH_SIZE = 32
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# (format name, MIME type, Pillow save options)
+_FORMATS = (
+    ("webp", "image/webp", {"quality": 80, "method": 4}),
+    ("avif", "image/avif", {"quality": 55}),
+)
+
+
+def _formats():
+    from PIL import features
+
+    return [fmt for fmt in _FORMATS if features.check(fmt[0])]
+
+
+def _is_image_row(row) -> bool:
+    content_type = getattr(row, "content_type", None) or ""
+    if content_type.startswith("video/"):
+        return False
+    return getattr(row, "media_type", "photo") != "video"
+
+
+def render(data: bytes) -> Tuple[dict, List[Tuple[int, int, str, bytes, str]], str]:
+    """Render ``data`` into ``(size info, renditions, blurhash)``.
+
+    Each rendition is ``(width, height, format, bytes, mime type)``. Raises
+    ``PIL.UnidentifiedImageError`` when ``data`` is not an image.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+    width, height = image.size
+    renditions = []
+    for target in [w for w in WIDTHS if w < width] or [width]:
+        target_height = max(1, round(height * target / width))
+        resized = (
+            image.resize((target, target_height), Image.LANCZOS)
+            if target != width
+            else image
+        )
+        for name, mime, options in _formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, format=name.upper(), **options)
+            renditions.append((target, target_height, name, buffer.getvalue(), mime))
+
+    thumb = image.convert("RGB")
+    thumb.thumbnail((BLURHASH_SIZE, BLURHASH_SIZE))
+    raw = thumb.tobytes()
+    pixels = [tuple(raw[i : i + 3]) for i in range(0, len(raw), 3)]
+    x_components, y_components = (4, 3) if thumb.width >= thumb.height else (3, 4)
+    placeholder = blurhash.encode(pixels, thumb.width, thumb.height, x_components, y_components)
+    return {"width": width, "height": height}, renditions, placeholder
+
+
+def _derivative_key(source_key: str, width: int, fmt: str) -> str:
+    stem = source_key.rsplit(".", 1)[0] if "." in source_key.rsplit("/", 1)[-1] else source_key
+    return f"derivatives/{stem}/{width}w.{fmt}"
+
+
+def generate(target: str, pk) -> str:
+    """Build and record derivatives for one row; returns what happened."""
+    from PIL import Image, UnidentifiedImageError
+
+    label, url_field, variants_field, blurhash_field = TARGETS[target]
+    model = apps.get_model(label)
+    row = model.objects.filter(pk=pk).first()
+    if row is None:
+        return "missing"
+    url = getattr(row, url_field)
+    source_key = s3.key_for_url(url)
+    if not source_key:
+        return "external"
+
+    variants: Dict = {"source": url}
+    placeholder = ""
+    if _is_image_row(row):
+        data = s3.read_object(
+            source_key, getattr(settings, "IMAGE_DERIVATIVE_MAX_SOURCE_BYTES", 30 * 1024 * 1024)
+        )
+        try:
+            size, renditions, placeholder = render(data)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+            logger.info("Not rendering %s %s: %s", target, pk, exc)
+        else:
+            variants.update(size)
+            sizes: Dict[int, dict] = {}
+            for width, height, fmt, body, mime in renditions:
+                entry = sizes.setdefault(width, {"width": width, "height": height})
+                entry[fmt] = s3.put_object(
+                    _derivative_key(source_key, width, fmt), body, mime, CACHE_CONTROL
+                )
+            variants["sizes"] = [sizes[width] for width in sorted(sizes)]
+
+    updated = model.objects.filter(pk=pk, **{url_field: url}).update(
+        **{variants_field: variants, blurhash_field: placeholder}
+    )
+    return "recorded" if updated else "stale"
+
+
+def needs_derivatives(url: Optional[str], variants: Optional[dict]) -> bool:
+    """Whether ``url`` is ours and its recorded renditions are not for it."""
+    if not url or (variants or {}).get("source") == url:
+        return False
+    return s3.key_for_url(url) is not None
+
+
+def schedule(target: str, pk) -> None:
+    """Queue derivative generation for one row after commit."""
+    if not getattr(settings, "IMAGE_DERIVATIVES_ENABLED", True):
+        return
+
+    def enqueue():
+        try:
+            from .tasks import generate_image_derivatives
+
+            generate_image_derivatives.delay(target, pk)
+        except Exception:
+            logger.exception("Failed to enqueue image derivatives for %s %s", target, pk)
+
+    transaction.on_commit(enqueue)
+
+
+def media_variants(url: str, variants: Optional[dict], placeholder: str) -> dict:
+    """Client-facing sizes for ``url``; empty until its renditions exist."""
+    variants = variants or {}
+    current = variants.get("source") == url
+    return {
+        "url": url,
+        "blurhash": placeholder if current else "",
+        "width": variants.get("width") if current else None,
+        "height": variants.get("height") if current else None,
+        "sizes": variants.get("sizes", []) if current else [],
+    }
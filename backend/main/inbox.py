@@ -0,0 +1,92 @@
+"""
+Inbox queries and the denormalized state behind them.
+
+``Conversation.last_message`` and ``ConversationParticipant.unread_count`` are
+maintained here when a message is sent or a conversation is read, so the
+inbox is one keyset-paginated query over the viewer's memberships instead of
+a last-message lookup per conversation.
+"""
+
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Prefetch, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from rest_framework.pagination import CursorPagination
+
+from .models import Conversation, ConversationParticipant
+
+
+class InboxCursorPagination(CursorPagination):
+    """Keyset pagination on the conversation's latest activity."""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-inbox_at", "-id")
+
+
+def inbox_queryset(user, include_archived=False):
+    """Conversations ``user`` belongs to, annotated for the inbox.
+
+    Each row carries the viewer's ``unread_count``, ``last_read_at`` and
+    ``is_archived`` from their membership, and ``inbox_at`` (last message
+    time, falling back to creation) for ordering.
+    """
+    queryset = (
+        Conversation.objects.annotate(
+            membership=FilteredRelation(
+                "participants", condition=Q(participants__user=user)
+            )
+        )
+        .filter(membership__isnull=False)
+        .annotate(
+            unread_count=F("membership__unread_count"),
+            inbox_at=Coalesce("last_message_at", "created_at"),
+        )
+        .select_related("created_by", "last_message__sender")
+        .prefetch_related(
+            Prefetch(
+                "participants",
+                queryset=ConversationParticipant.objects.select_related("user"),
+            ),
+            "last_message__reactions__user",
+        )
+    )
+    if not include_archived:
+        queryset = queryset.filter(membership__is_archived=False)
+    return queryset
+
+
+def record_new_message(message):
+    """Update inbox state after ``message`` was created.
+
+    The sender's membership is marked read; every other participant's
+    ``unread_count`` is incremented in a single UPDATE.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Conversation.objects.filter(id=message.conversation_id).update(
+            last_message=message, last_message_at=message.created_at
+        )
+        memberships = ConversationParticipant.objects.filter(
+            conversation_id=message.conversation_id
+        )
+        memberships.filter(user_id=message.sender_id).update(
+            last_read_at=now, unread_count=0
+        )
+        memberships.exclude(user_id=message.sender_id).update(
+            unread_count=F("unread_count") + 1
+        )
+
+
+def mark_read(conversation, user):
+    return ConversationParticipant.objects.filter(
+        conversation=conversation, user=user
+    ).update(last_read_at=timezone.now(), unread_count=0)
+
+
+def mark_unread(conversation, user):
+    # Keep any real count; otherwise flag the conversation with one unread.
+    return ConversationParticipant.objects.filter(
+        conversation=conversation, user=user
+    ).update(last_read_at=None, unread_count=Greatest(F("unread_count"), Value(1)))
@@ -0,0 +1,59 @@
+"""
+Queue sized WebP/AVIF variants and BlurHash placeholders for media that
+has none yet. New uploads are handled by the ``main.signals`` receivers;
+use this command to backfill rows uploaded before the pipeline existed.
+
+Usage:
+  python manage.py generate_image_derivatives
+  python manage.py generate_image_derivatives --target marketplace --target animal
+  python manage.py generate_image_derivatives --inline --limit 100
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from main import s3
+from main.image_derivatives import TARGETS, generate
+
+
+class Command(BaseCommand):
+    help = "Backfill image derivatives for media rows without them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            dest="targets",
+            choices=sorted(TARGETS),
+            help="Only process this media kind (repeatable).",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Rows per target.")
+        parser.add_argument(
+            "--inline",
+            action="store_true",
+            help="Render in this process instead of queueing Celery tasks.",
+        )
+
+    def handle(self, *args, **options):
+        from main.tasks import generate_image_derivatives
+
+        prefix = s3.object_url("")
+        for target in options["targets"] or sorted(TARGETS):
+            label, url_field, variants_field, _ = TARGETS[target]
+            rows = (
+                apps.get_model(label)
+                .objects.filter(**{f"{url_field}__startswith": prefix, variants_field: {}})
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            if options["limit"]:
+                rows = rows[: options["limit"]]
+            count = 0
+            for pk in rows.iterator():
+                if options["inline"]:
+                    generate(target, pk)
+                else:
+                    generate_image_derivatives.delay(target, pk)
+                count += 1
+            verb = "Processed" if options["inline"] else "Queued"
+            self.stdout.write(self.style.SUCCESS(f"{verb} {count} {target} row(s)."))
@@ -0,0 +1,49 @@
+"""
+Rebuild the near-duplicate photo index and flag listings whose photos
+already appear on another seller's earlier listing. New photos are
+checked as they are analyzed; use this command after changing
+``DUPLICATE_IMAGE_MAX_DISTANCE`` or to catch up on older listings.
+
+Usage:
+  python manage.py rebuild_duplicate_image_index
+  python manage.py rebuild_duplicate_image_index --distance 8
+  python manage.py rebuild_duplicate_image_index --async
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.duplicate_images import rebuild
+
+
+class Command(BaseCommand):
+    help = "Re-derive the pHash segment index and flag listings with reused photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--distance",
+            type=int,
+            default=None,
+            help="Hamming distance threshold (default: DUPLICATE_IMAGE_MAX_DISTANCE).",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="run_async",
+            help="Queue a Celery task instead of rebuilding in this process.",
+        )
+
+    def handle(self, *args, **options):
+        if options["run_async"]:
+            from main.tasks import rebuild_duplicate_image_index
+
+            rebuild_duplicate_image_index.delay(options["distance"])
+            self.stdout.write(self.style.SUCCESS("Queued duplicate image index rebuild."))
+            return
+
+        result = rebuild(options["distance"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fixed {result['segments_fixed']} index row(s); "
+                f"{result['duplicates']} listing(s) reuse an earlier listing's photo."
+            )
+        )
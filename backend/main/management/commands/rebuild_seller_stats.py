@@ -0,0 +1,20 @@
+"""
+Recompute every SellerStats row from animal listings and seller reviews.
+The counters are maintained by signals; use this command after imports,
+raw SQL edits or queryset.update() calls that bypass them.
+
+Usage:
+  python manage.py rebuild_seller_stats
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.seller_stats import rebuild_seller_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild seller reputation aggregates (sold count, reviews, rating histogram)."
+
+    def handle(self, *args, **options):
+        result = rebuild_seller_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {result['sellers']} seller(s)."))
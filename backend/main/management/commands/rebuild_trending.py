@@ -0,0 +1,24 @@
+"""
+Recompute decayed trending scores for marketplace listings.
+Runs every few minutes via Celery beat; use this command for manual runs or
+after importing listings.
+
+Usage:
+  python manage.py rebuild_trending
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.trending import rebuild_trending
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored trending scores for active marketplace listings."
+
+    def handle(self, *args, **options):
+        result = rebuild_trending()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {result['stored']} trending score(s) from {result['scored']} scored listing(s)."
+            )
+        )
@@ -0,0 +1,35 @@
+"""
+Recompute the stored scam risk score of animal listings.
+Runs daily via Celery beat (seller age and verification expiry change with
+time alone); use this command for manual runs or after bulk imports.
+
+Usage:
+  python manage.py recompute_risk_scores
+  python manage.py recompute_risk_scores --listing 12 --listing 40
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.risk_score import recompute
+
+
+class Command(BaseCommand):
+    help = "Recompute AnimalListing.risk_score in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--listing",
+            type=int,
+            action="append",
+            dest="listings",
+            help="Only recompute this listing id (repeatable).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        result = recompute(options["listings"], batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {result['listings']} listing(s); updated {result['updated']} risk score(s)."
+            )
+        )
@@ -0,0 +1,32 @@
+"""
+Archive aged rows according to settings.RETENTION_POLICIES.
+Runs daily via Celery beat; use this command for manual runs or backfills.
+
+Usage:
+  python manage.py run_retention
+  python manage.py run_retention --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.retention import run_retention_policies
+
+
+class Command(BaseCommand):
+    help = "Archive rows older than their retention window to compressed NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many rows would be archived without touching them.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get("dry_run")
+        results = run_retention_policies(dry_run=dry_run)
+        verb = "Would archive" if dry_run else "Archived"
+        for label, count in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{label}: {verb} {count} row(s)."))
+        if not results:
+            self.stdout.write(self.style.WARNING("No retention policies configured"))
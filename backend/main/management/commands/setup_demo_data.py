@@ -18,6 +18,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 from main.models import Post, Conversation, Message, Page
+from main.inbox import record_new_message
 from main.marketplace_models import MarketplaceListing
 from main.animal_models import AnimalListing
 from users.models import FriendRequest
@@ -356,12 +357,13 @@ class Command(BaseCommand):
             if created or conv.messages.count() == 0:
                 for msg_data in conv_data["messages"]:
                     msg_time = timezone.now() - timedelta(hours=msg_data["hours_ago"])
-                    Message.objects.create(
+                    message = Message.objects.create(
                         conversation=conv,
                         sender=msg_data["sender"],
                         content=msg_data["content"],
                         created_at=msg_time,
                     )
+                    record_new_message(message)
                     created_messages += 1
 
         self.stdout.write(
@@ -0,0 +1,156 @@
+"""
+Benchmark the websocket consumers with simulated clients.
+
+Connects in-process clients through the JWT middleware stack, drives typing,
+message fan-out and call signalling, and reports connects/sec, handshake and
+fan-out latency percentiles and memory per connection. Fixture users and
+conversations are written to the configured database and deleted afterwards,
+so the command refuses to run unless DEBUG is on or --allow-db-writes is given.
+
+Usage:
+  python manage.py ws_loadtest --clients 2000 --group-size 5
+  python manage.py ws_loadtest --allow-db-writes  # with DEBUG off
+  python manage.py ws_loadtest --sockets chat,notifications --multiplex
+  python manage.py ws_loadtest --redis-url redis://localhost:6379/0 --json report.json
+"""
+
+import contextlib
+import json
+import os
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from main.ws_loadtest import SOCKET_PATHS, create_fixtures, delete_fixtures, run_load_test
+
+
+class Command(BaseCommand):
+    help = "Load-test the chat, notification and presence websocket consumers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument(
+            "--group-size", type=int, default=5, help="Participants per conversation."
+        )
+        parser.add_argument(
+            "--sockets",
+            default="chat",
+            help="Comma-separated sockets per client: chat, notifications, presence. "
+            "Presence broadcasts to every online user, so expect O(n^2) events.",
+        )
+        parser.add_argument(
+            "--multiplex",
+            action="store_true",
+            help="Use one ws/stream/ socket per client subscribed to --sockets topics.",
+        )
+        parser.add_argument("--compact", action="store_true", help="Request msgpack frames.")
+        parser.add_argument("--messages", type=int, default=5, help="Messages per conversation.")
+        parser.add_argument("--typing-rounds", type=int, default=1)
+        parser.add_argument("--no-calls", action="store_true")
+        parser.add_argument("--connect-concurrency", type=int, default=200)
+        parser.add_argument(
+            "--handshake-timeout",
+            type=float,
+            default=10.0,
+            help="Seconds before a pending handshake counts as failed.",
+        )
+        parser.add_argument("--drain-timeout", type=float, default=30.0)
+        parser.add_argument(
+            "--redis-url",
+            default=None,
+            help="Use a Redis pub/sub channel layer instead of the in-memory layer.",
+        )
+        parser.add_argument("--json", dest="json_path", default=None, help="Write the report here.")
+        parser.add_argument(
+            "--allow-db-writes",
+            action="store_true",
+            help="Create and delete fixture users even though DEBUG is off.",
+        )
+        parser.add_argument(
+            "--consumer-output",
+            action="store_true",
+            help="Keep the consumers' own print output (silenced by default).",
+        )
+
+    def handle(self, *args, **options):
+        sockets = [name.strip() for name in options["sockets"].split(",") if name.strip()]
+        unknown = set(sockets) - set(SOCKET_PATHS)
+        if unknown or not sockets:
+            raise CommandError(f"Unknown sockets: {', '.join(sorted(unknown)) or '(none)'}")
+        if options["clients"] < 1 or options["group_size"] < 1:
+            raise CommandError("--clients and --group-size must be positive")
+        if not settings.DEBUG and not options["allow_db_writes"]:
+            raise CommandError(
+                "Refusing to create fixture users with DEBUG off; "
+                "pass --allow-db-writes to run against this database"
+            )
+
+        if options["redis_url"]:
+            layer = {
+                "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+                "CONFIG": {"hosts": [options["redis_url"]]},
+            }
+        else:
+            layer = {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": 10000},
+            }
+
+        run_id = uuid.uuid4().hex[:8]
+        assignments, conversation_ids = create_fixtures(
+            options["clients"], options["group_size"], run_id
+        )
+        self.stdout.write(
+            f"Created {len(assignments)} clients in {len(conversation_ids)} conversations"
+        )
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+                stack.enter_context(override_settings(CHANNEL_LAYERS={"default": layer}))
+                if not options["consumer_output"]:
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                report = async_to_sync(run_load_test)(
+                    assignments,
+                    conversation_ids,
+                    sockets=sockets,
+                    multiplex=options["multiplex"],
+                    compact=options["compact"],
+                    connect_concurrency=options["connect_concurrency"],
+                    handshake_timeout=options["handshake_timeout"],
+                    typing_rounds=options["typing_rounds"],
+                    messages=options["messages"],
+                    calls=not options["no_calls"],
+                    drain_timeout=options["drain_timeout"],
+                )
+        finally:
+            deleted = delete_fixtures(run_id)
+            self.stdout.write(f"Removed {deleted} fixture row(s)")
+
+        report["channel_layer"] = layer["BACKEND"]
+        self._print_report(report)
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['json_path']}"))
+
+    def _print_report(self, report):
+        connect = report["connect"]
+        fanout = report["fanout"]
+        memory = report["memory"]
+        self.stdout.write(
+            f"Connections: {connect['connections']} ({connect['failed']} failed) in "
+            f"{connect['seconds']}s -> {connect['per_second']} connects/sec"
+        )
+        self.stdout.write(f"Handshake latency (ms): {connect['handshake_ms']}")
+        self.stdout.write(
+            f"Memory: {memory['traced_bytes']} bytes traced, "
+            f"{memory['bytes_per_connection']} bytes/connection"
+        )
+        self.stdout.write(
+            f"Fan-out: {fanout['delivered']}/{fanout['expected_deliveries']} deliveries "
+            f"of {fanout['messages']} messages in {fanout['seconds']}s"
+        )
+        self.stdout.write(f"Fan-out latency (ms): {fanout['latency_ms']}")
+        self.stdout.write(f"Events delivered: {report['events_delivered']}")
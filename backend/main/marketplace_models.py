@@ -156,6 +156,19 @@ class MarketplaceListingMedia(models.Model):
     content_type = models.CharField(max_length=50, blank=True, null=True)
     order = models.IntegerField(default=0)  # For ordering images
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Sized WebP/AVIF renditions and a BlurHash placeholder, filled in by
+    # main.image_derivatives after upload.
+    variants = models.JSONField(default=dict, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True, default="")
+
+    # Set by main.media_analysis; shared by every row showing the same image.
+    fingerprint = models.ForeignKey(
+        "main.ImageFingerprint",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="marketplace_media",
+    )
 
     class Meta:
         ordering = ["order", "uploaded_at"]
@@ -331,3 +344,32 @@ class SellerVerification(models.Model):
 
     def __str__(self):
         return f"{self.seller} - {self.get_verification_type_display()}: {self.status}"
+
+
+class TrendingScore(models.Model):
+    """Decayed engagement score per active listing, rebuilt by ``main.trending``."""
+
+    listing = models.OneToOneField(
+        MarketplaceListing,
+        related_name="trending_score",
+        on_delete=models.CASCADE,
+    )
+    # Denormalized from the listing so per-category rankings read one index.
+    category = models.ForeignKey(
+        MarketplaceCategory,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"]),
+            models.Index(fields=["category", "-score"]),
+        ]
+
+    def __str__(self):
+        return f"Trending {self.listing_id}: {self.score:.3f}"
@@ -5,7 +5,7 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.exceptions import PermissionDenied
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from django.shortcuts import get_object_or_404
 
 from .marketplace_models import (
@@ -17,6 +17,7 @@ from .marketplace_models import (
     MarketplaceOffer,
     SellerVerification,
 )
+from .models import Reaction
 from .serializers import (
     MarketplaceCategorySerializer,
     MarketplaceListingSerializer,
@@ -32,7 +33,10 @@ from .emails import (
     send_offer_accepted_email,
     send_offer_declined_email,
 )
+from .media_analysis import schedule_analysis
 from .slug_utils import SlugOrIdLookupMixin
+from .trending import trending_listing_ids
+from .view_counter import record_view
 from .moderation.pipeline import precheck_text_or_raise, record_text_classification
 from .moderation.throttling import enforce_throttle
 import logging
@@ -40,6 +44,27 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def listing_detail_queryset(queryset, user):
+    """Load everything ``MarketplaceListingSerializer`` reads for ``user``.
+
+    Seller, category, media and reaction users come in with a fixed number
+    of queries, and ``is_saved_by_user`` is annotated instead of checked
+    per listing.
+    """
+    return (
+        queryset.select_related("seller", "category")
+        .prefetch_related(
+            "media",
+            Prefetch("reactions", queryset=Reaction.objects.select_related("user")),
+        )
+        .annotate(
+            is_saved_by_user=Exists(
+                MarketplaceSave.objects.filter(listing=OuterRef("pk"), user_id=user.pk)
+            )
+        )
+    )
+
+
 class MarketplaceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """View categories for marketplace listings."""
 
@@ -60,10 +85,8 @@ class MarketplaceListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
     ordering = ["-created_at"]
 
     def get_queryset(self):
-        queryset = (
-            MarketplaceListing.objects.filter(status="active")
-            .select_related("seller", "category")
-            .prefetch_related("media", "reactions")
+        queryset = listing_detail_queryset(
+            MarketplaceListing.objects.filter(status="active"), self.request.user
         )
 
         # Filter by category
@@ -169,11 +192,10 @@ class MarketplaceListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def view(self, request, pk=None):
-        """Increment view count."""
+        """Increment view count (buffered, once per viewer per window)."""
         listing = self.get_object()
-        listing.views_count = Count("views_count") + 1
-        listing.save(update_fields=["views_count"])
-        return Response({"views_count": listing.views_count})
+        views_count = record_view("marketplace", listing, str(request.user.pk))
+        return Response({"views_count": views_count})
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def save(self, request, pk=None):
@@ -219,54 +241,62 @@ class MarketplaceListingViewSet(SlugOrIdLookupMixin, viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"])
     def trending(self, request):
-        """Get trending listings."""
-        listings = (
-            MarketplaceListing.objects.filter(
-                status="active",
-                created_at__gte=timezone.now() - timezone.timedelta(days=7),
-            )
-            .annotate(activity=Count("saved_by") + Count("offers"))
-            .order_by("-activity")[:20]
-        )
+        """Get trending listings (precomputed decayed scores, cached per page)."""
+        ids = trending_listing_ids(request.query_params.get("category"))
+        by_id = {
+            listing.pk: listing
+            for listing in MarketplaceListing.objects.filter(pk__in=ids, status="active")
+            .select_related("seller", "category")
+            .prefetch_related("media", "reactions")
+        }
+        listings = [by_id[pk] for pk in ids if pk in by_id]
 
         serializer = self.get_serializer(listings, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def sold_items(self, request):
-        """Get sold items by current user with accepted offer details."""
+        """Get sold items by current user with accepted offer details (paginated)."""
         user = request.user
 
-        # Get sold listings with their accepted offers
-        sold_listings = MarketplaceListing.objects.filter(
-            seller=user, status="sold"
-        ).prefetch_related("offers")
+        # The accepted offer and its buyer come from one prefetch query; the
+        # offer's listing is the already-loaded parent row.
+        accepted = MarketplaceOffer.objects.filter(status="accepted").select_related("buyer")
+        sold_listings = listing_detail_queryset(
+            MarketplaceListing.objects.filter(seller=user, status="sold").filter(
+                Exists(accepted.filter(listing=OuterRef("pk")))
+            ),
+            user,
+        ).prefetch_related(
+            Prefetch("offers", queryset=accepted, to_attr="accepted_offers")
+        ).order_by("-sold_at", "-id")
+
+        page = self.paginate_queryset(sold_listings)
+        listings = page if page is not None else sold_listings
+        context = self.get_serializer_context()
 
         result = []
-        for listing in sold_listings:
-            # Find the accepted offer
-            accepted_offer = listing.offers.filter(status="accepted").first()
-            if accepted_offer:
-                result.append(
-                    {
-                        "listing": MarketplaceListingSerializer(
-                            listing, context={"request": request}
-                        ).data,
-                        "offer": MarketplaceOfferSerializer(
-                            accepted_offer, context={"request": request}
-                        ).data,
-                        "sold_price": str(accepted_offer.offered_price),
-                        "sold_to": {
-                            "id": accepted_offer.buyer.id,
-                            "username": accepted_offer.buyer.username,
-                            "first_name": accepted_offer.buyer.first_name,
-                            "last_name": accepted_offer.buyer.last_name,
-                            "profile_image_url": accepted_offer.buyer.profile_image_url,
-                        },
-                        "sold_date": listing.sold_at,
-                    }
-                )
+        for listing in listings:
+            accepted_offer = listing.accepted_offers[0]
+            buyer = accepted_offer.buyer
+            result.append(
+                {
+                    "listing": MarketplaceListingSerializer(listing, context=context).data,
+                    "offer": MarketplaceOfferSerializer(accepted_offer, context=context).data,
+                    "sold_price": str(accepted_offer.offered_price),
+                    "sold_to": {
+                        "id": buyer.id,
+                        "username": buyer.username,
+                        "first_name": buyer.first_name,
+                        "last_name": buyer.last_name,
+                        "profile_image_url": buyer.profile_image_url,
+                    },
+                    "sold_date": listing.sold_at,
+                }
+            )
 
+        if page is not None:
+            return self.get_paginated_response(result)
         return Response(result)
 
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
@@ -291,9 +321,17 @@ class MarketplaceOfferViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Users can see their own offers and offers on their listings
-        return MarketplaceOffer.objects.filter(
-            Q(buyer=self.request.user) | Q(listing__seller=self.request.user)
-        ).select_related("listing", "buyer")
+        user = self.request.user
+        return (
+            MarketplaceOffer.objects.filter(Q(buyer=user) | Q(listing__seller=user))
+            .select_related("buyer")
+            .prefetch_related(
+                Prefetch(
+                    "listing",
+                    queryset=listing_detail_queryset(MarketplaceListing.objects.all(), user),
+                )
+            )
+        )
 
     def perform_create(self, serializer):
         try:
@@ -492,7 +530,11 @@ class MarketplaceListingMediaViewSet(viewsets.ModelViewSet):
 
         # Ensure the serializer saves with the listing object (in case it was
         # obtained from request.data rather than validated_data)
-        serializer.save(listing=listing)
+        media = serializer.save(listing=listing)
+
+        # Near-duplicate photo detection downloads the image; run it after commit.
+        if media.url:
+            schedule_analysis("marketplace", media.pk)
 
     def perform_destroy(self, instance):
         if instance.listing.seller != self.request.user:
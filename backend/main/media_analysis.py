@@ -0,0 +1,224 @@
+"""
+Background analysis of animal and marketplace listing photos.
+
+Adding a photo to a listing queues ``main.tasks.analyze_listing_media``
+after commit, and the request never waits on a download. Only URLs in the
+upload bucket are analyzed, and they are read through the S3 client, never
+over HTTP, so a client-supplied URL cannot make the worker request
+arbitrary (e.g. internal) addresses. Other URLs are refused. The task:
+
+1. Looks the URL up in the cache (``media:analysis:url:<sha1>``). A URL
+   analyzed before maps straight to its ``ImageFingerprint`` with no
+   download.
+2. Reads the first ``HEADER_BYTES`` of the object with a ranged GET.
+   Image dimensions and EXIF live in the header, so the stock-photo
+   heuristics (``StockPhotoDetector.score_metadata``) need nothing more.
+   The ``Content-Range`` total rejects oversized files before they are
+   downloaded.
+3. Reads the rest only when the header did not already hold the whole
+   file, and hashes the bytes (SHA-256). A known content hash reuses its
+   stored row, so the image is not decoded again.
+4. Otherwise it decodes a reduced-size draft of the image and computes
+   pHash/dHash (``main.utils.perceptual_hash``).
+
+Undecodable or oversized images raise ``ValueError``; S3 failures raise
+``RuntimeError`` and are retried by the task.
+
+Results live in ``ImageFingerprint``, one row per distinct image, and
+each media row points at its fingerprint. "Is this photo on another
+seller's earlier listing?" is a near-duplicate query against the pHash
+segment index (``main.duplicate_images``); a hit flags the listing. A
+confident stock-photo result adds ``stock_photo_detected`` to an animal
+listing's ``scam_flags``, as before.
+"""
+
+import hashlib
+import io
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import duplicate_images, s3
+from .animal_models import AnimalListing, ImageFingerprint
+from .utils import perceptual_hash
+from .utils.stock_photo_detector import StockPhotoDetector
+
+logger = logging.getLogger(__name__)
+
+HEADER_BYTES = 64 * 1024
+DRAFT_SIZE = (256, 256)
+STOCK_FLAG_CONFIDENCE = 0.7
+
+
+def _url_key(url: str) -> str:
+    return f"media:analysis:url:{hashlib.sha1(url.encode()).hexdigest()}"
+
+
+def _max_bytes() -> int:
+    return getattr(settings, "MEDIA_ANALYSIS_MAX_BYTES", 20 * 1024 * 1024)
+
+
+def _object_key(url: str) -> str:
+    key = s3.key_for_url(url)
+    if not key:
+        raise ValueError(f"Not an uploaded media URL: {url!r}")
+    return key
+
+
+def _fetch_header(url: str):
+    """``(bytes, complete)`` for the first ``HEADER_BYTES`` of ``url``."""
+    data, total = s3.read_object_start(_object_key(url), HEADER_BYTES)
+    limit = _max_bytes()
+    if total > limit:
+        raise ValueError(f"Image is larger than {limit} bytes")
+    return data, len(data) >= total
+
+
+def _fetch_body(url: str) -> bytes:
+    return s3.read_object(_object_key(url), _max_bytes())
+
+
+def _open(data: bytes):
+    from PIL import Image
+
+    try:
+        return Image.open(io.BytesIO(data))
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ValueError(f"Undecodable image: {exc}") from exc
+
+
+def _parse_header(data: bytes) -> dict:
+    with _open(data) as image:
+        width, height = image.size
+        try:
+            exif = image.getexif()
+        except OSError as exc:
+            raise ValueError(f"Undecodable image: {exc}") from exc
+        exif_text = " ".join(str(value) for value in exif.values()) if exif else ""
+    return {"width": width, "height": height, "exif_text": exif_text}
+
+
+def read_header(url: str) -> dict:
+    """Dimensions and EXIF text of ``url`` from its first bytes only."""
+    data, _ = _fetch_header(url)
+    return _parse_header(data)
+
+
+def _hashes(data: bytes):
+    from PIL import Image
+
+    with _open(data) as image:
+        try:
+            # JPEG decodes at 1/2..1/8 scale directly; hashes only need ~32px.
+            image.draft("RGB", DRAFT_SIZE)
+            image.load()
+        except (OSError, Image.DecompressionBombError) as exc:
+            raise ValueError(f"Undecodable image: {exc}") from exc
+        return perceptual_hash.phash(image), perceptual_hash.dhash(image)
+
+
+def fingerprint_for_url(url: str) -> ImageFingerprint:
+    """The stored analysis of the image at ``url``, computing it if needed."""
+    ttl = getattr(settings, "MEDIA_ANALYSIS_URL_CACHE_TTL", 7 * 24 * 3600)
+    content_hash = cache.get(_url_key(url))
+    if content_hash:
+        fingerprint = ImageFingerprint.objects.filter(content_hash=content_hash).first()
+        if fingerprint:
+            return fingerprint
+
+    header, complete = _fetch_header(url)
+    data = header if complete else _fetch_body(url)
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    fingerprint = ImageFingerprint.objects.filter(content_hash=content_hash).first()
+    if fingerprint is None:
+        meta = _parse_header(header)
+        stock = StockPhotoDetector.score_metadata(meta["exif_text"], meta["width"], meta["height"])
+        phash, dhash = _hashes(data)
+        try:
+            with transaction.atomic():
+                fingerprint = ImageFingerprint.objects.create(
+                    content_hash=content_hash,
+                    phash=phash,
+                    dhash=dhash,
+                    width=meta["width"],
+                    height=meta["height"],
+                    byte_size=len(data),
+                    is_stock=stock["is_stock"],
+                    stock_confidence=stock["confidence"],
+                    stock_reasons=stock["reasons"],
+                )
+        except IntegrityError:
+            # Another worker analyzed the same bytes concurrently.
+            fingerprint = ImageFingerprint.objects.get(content_hash=content_hash)
+
+    cache.set(_url_key(url), content_hash, timeout=ttl)
+    return fingerprint
+
+
+def add_scam_flags(listing_id, flags) -> None:
+    """Append ``flags`` to a listing's ``scam_flags`` (saving triggers a risk recompute)."""
+    if not flags:
+        return
+    with transaction.atomic():
+        listing = AnimalListing.objects.select_for_update().filter(pk=listing_id).first()
+        if listing is None:
+            return
+        missing = [flag for flag in flags if flag not in listing.scam_flags]
+        if missing:
+            listing.scam_flags = listing.scam_flags + missing
+            listing.save(update_fields=["scam_flags"])
+
+
+def _is_photo(kind: str, media) -> bool:
+    if kind == "animal":
+        return media.media_type == "photo"
+    return not (media.content_type or "").startswith("video/")
+
+
+def analyze_media(kind: str, media_id) -> Optional[dict]:
+    """Analyze one listing photo, record the result and flag the listing.
+
+    ``kind`` is a key of ``duplicate_images.MEDIA_MODELS``.
+    """
+    model = duplicate_images.MEDIA_MODELS[kind]
+    media = model.objects.select_related("listing").filter(pk=media_id).first()
+    if media is None or not media.url or not _is_photo(kind, media):
+        return None
+
+    fingerprint = fingerprint_for_url(media.url)
+    listing = media.listing
+    reused = duplicate_images.has_earlier_duplicate(
+        fingerprint, listing.seller_id, listing.created_at
+    )
+    if kind == "animal":
+        model.objects.filter(pk=media.pk).update(
+            fingerprint=fingerprint,
+            is_stock_photo=fingerprint.is_stock,
+            stock_photo_confidence=fingerprint.stock_confidence,
+        )
+        if fingerprint.is_stock and fingerprint.stock_confidence > STOCK_FLAG_CONFIDENCE:
+            add_scam_flags(listing.pk, ["stock_photo_detected"])
+    else:
+        model.objects.filter(pk=media.pk).update(fingerprint=fingerprint)
+
+    if reused:
+        duplicate_images.flag_listing(kind, listing.pk)
+    return {"fingerprint": fingerprint.pk, "stock": fingerprint.is_stock, "reused": reused}
+
+
+def schedule_analysis(kind: str, media_id) -> None:
+    """Queue analysis of one listing photo after commit."""
+
+    def enqueue():
+        try:
+            from .tasks import analyze_listing_media
+
+            analyze_listing_media.delay(kind, media_id)
+        except Exception:
+            logger.exception("Failed to enqueue media analysis for %s %s", kind, media_id)
+
+    transaction.on_commit(enqueue)
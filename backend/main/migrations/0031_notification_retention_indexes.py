@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_merge_20260202_1835'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='main_notifi_recipie_1721c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='main_notifi_created_03020e_idx'),
+        ),
+    ]
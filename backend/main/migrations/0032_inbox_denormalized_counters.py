@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_inbox(apps, schema_editor):
+    Conversation = apps.get_model('main', 'Conversation')
+    ConversationParticipant = apps.get_model('main', 'ConversationParticipant')
+    Message = apps.get_model('main', 'Message')
+
+    Conversation.objects.update(
+        last_message=Subquery(
+            Message.objects.filter(conversation=OuterRef('pk'))
+            .order_by('-created_at', '-id')
+            .values('id')[:1]
+        )
+    )
+
+    # Unread = messages from others since last_read_at (all of them if never read).
+    from_others = Message.objects.filter(conversation=OuterRef('conversation')).exclude(
+        sender=OuterRef('user')
+    )
+
+    def count_of(messages):
+        return Coalesce(
+            Subquery(
+                messages.order_by()
+                .values('conversation')
+                .annotate(total=Count('id'))
+                .values('total')[:1]
+            ),
+            0,
+        )
+
+    ConversationParticipant.objects.filter(last_read_at__isnull=True).update(
+        unread_count=count_of(from_others)
+    )
+    ConversationParticipant.objects.filter(last_read_at__isnull=False).update(
+        unread_count=count_of(from_others.filter(created_at__gt=OuterRef('last_read_at')))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_notification_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.message'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversationparticipant',
+            index=models.Index(fields=['user', 'is_archived'], name='main_conver_user_id_817eca_idx'),
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
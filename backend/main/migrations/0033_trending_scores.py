@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_inbox_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.marketplacecategory')),
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trending_score', to='main.marketplacelisting')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='main_trendi_score_26ffd7_idx'), models.Index(fields=['category', '-score'], name='main_trendi_categor_d96cd8_idx')],
+            },
+        ),
+    ]
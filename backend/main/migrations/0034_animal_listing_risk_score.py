@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:14
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+
+def backfill_risk_scores(apps, schema_editor):
+    # Mirrors main.risk_score.score at the time of this migration.
+    AnimalListing = apps.get_model('main', 'AnimalListing')
+    VetDocumentation = apps.get_model('main', 'VetDocumentation')
+
+    now = timezone.now()
+    sold = dict(
+        AnimalListing.objects.filter(status='sold')
+        .values_list('seller_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    listings = (
+        AnimalListing.objects.select_related('seller', 'seller_verification')
+        .annotate(
+            media_total=Count('media'),
+            has_vet=Exists(VetDocumentation.objects.filter(listing=OuterRef('pk'))),
+        )
+        .order_by('pk')
+    )
+    batch = []
+    for listing in listings.iterator(chunk_size=1000):
+        verification = listing.seller_verification
+        verified = bool(
+            verification
+            and verification.status == 'verified'
+            and not (verification.expires_at and verification.expires_at < now)
+        )
+        total = 0 if listing.media_total else 15
+        total += len(listing.scam_flags or []) * 10
+        total += 0 if verified else 20
+        if listing.price > 0 and not listing.has_vet:
+            total += 10
+        if (now - listing.seller.date_joined) < timedelta(days=7):
+            total += 10
+        if sold.get(listing.seller_id, 0) > 10:
+            total += 15
+        listing.risk_score = min(total, 100)
+        batch.append(listing)
+        if len(batch) >= 1000:
+            AnimalListing.objects.bulk_update(batch, ['risk_score'])
+            batch = []
+    if batch:
+        AnimalListing.objects.bulk_update(batch, ['risk_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0033_trending_scores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animallisting',
+            name='risk_score',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Scam risk score (0-100), recomputed when its inputs change'),
+        ),
+        migrations.RunPython(backfill_risk_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='animallisting',
+            index=models.Index(fields=['status', 'risk_score'], name='main_animal_status_39375e_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_seller_stats(apps, schema_editor):
+    AnimalListing = apps.get_model('main', 'AnimalListing')
+    SellerReview = apps.get_model('main', 'SellerReview')
+    SellerStats = apps.get_model('main', 'SellerStats')
+
+    rows = {}
+    sold = (
+        AnimalListing.objects.filter(status='sold')
+        .values_list('seller_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for seller_id, total in sold:
+        rows.setdefault(seller_id, SellerStats(seller_id=seller_id)).sold_count = total
+
+    reviews = (
+        SellerReview.objects.values('seller_id')
+        .annotate(
+            total=Count('id'),
+            rating_total=Sum('rating'),
+            **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+        .order_by()
+    )
+    for entry in reviews:
+        stats = rows.setdefault(entry['seller_id'], SellerStats(seller_id=entry['seller_id']))
+        stats.review_count = entry['total']
+        stats.rating_sum = entry['rating_total'] or 0
+        for star in range(1, 6):
+            setattr(stats, f'rating_{star}', entry[f'star_{star}'])
+        stats.rating_5 += entry['total'] - sum(entry[f'star_{star}'] for star in range(1, 6))
+
+    SellerStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_animal_listing_risk_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sold_count', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seller_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Seller Stats',
+            },
+        ),
+        migrations.RunPython(backfill_seller_stats, migrations.RunPython.noop),
+    ]
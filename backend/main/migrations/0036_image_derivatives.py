@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_seller_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animallistingmedia',
+            name='blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='animallistingmedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='commentmedia',
+            name='blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='commentmedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='marketplacelistingmedia',
+            name='blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='marketplacelistingmedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
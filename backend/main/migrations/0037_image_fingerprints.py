@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0036_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('phash', models.BigIntegerField(db_index=True)),
+                ('dhash', models.BigIntegerField()),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('byte_size', models.PositiveIntegerField(default=0)),
+                ('is_stock', models.BooleanField(default=False)),
+                ('stock_confidence', models.FloatField(default=0.0)),
+                ('stock_reasons', models.JSONField(blank=True, default=list)),
+                ('analyzed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='animallistingmedia',
+            name='fingerprint',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='animal_media', to='main.imagefingerprint'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_phash_segments(apps, schema_editor):
+    ImageFingerprint = apps.get_model('main', 'ImageFingerprint')
+
+    rows = []
+    for fingerprint in ImageFingerprint.objects.only('pk', 'phash').iterator(chunk_size=2000):
+        value = fingerprint.phash & ((1 << 64) - 1)
+        for i in range(4):
+            setattr(fingerprint, f'phash_{i}', (value >> (16 * i)) & 0xFFFF)
+        rows.append(fingerprint)
+    ImageFingerprint.objects.bulk_update(
+        rows, ['phash_0', 'phash_1', 'phash_2', 'phash_3'], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_image_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagefingerprint',
+            name='phash_0',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='imagefingerprint',
+            name='phash_1',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='imagefingerprint',
+            name='phash_2',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='imagefingerprint',
+            name='phash_3',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='marketplacelistingmedia',
+            name='fingerprint',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='marketplace_media', to='main.imagefingerprint'),
+        ),
+        migrations.RunPython(backfill_phash_segments, migrations.RunPython.noop),
+    ]
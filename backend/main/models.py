@@ -84,6 +84,10 @@ class CommentMedia(models.Model):
     )
     url = models.URLField()
     content_type = models.CharField(max_length=50, blank=True, null=True)
+    # Sized WebP/AVIF renditions and a BlurHash placeholder, filled in by
+    # main.image_derivatives after upload.
+    variants = models.JSONField(default=dict, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"Media for comment {self.comment_id}: {self.url}"
@@ -95,6 +99,10 @@ class PostMedia(models.Model):
     )
     url = models.URLField()
     content_type = models.CharField(max_length=50, blank=True, null=True)
+    # Sized WebP/AVIF renditions and a BlurHash placeholder, filled in by
+    # main.image_derivatives after upload.
+    variants = models.JSONField(default=dict, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"Media for post {self.post_id}: {self.url}"
@@ -209,6 +217,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["recipient", "-created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
 
     def __str__(self):
         return f"Notification to {self.recipient} - {self.actor} {self.verb}"
@@ -252,6 +264,14 @@ class Conversation(models.Model):
         on_delete=models.CASCADE,
     )
     last_message_at = models.DateTimeField(blank=True, null=True)
+    # Denormalized by main.inbox.record_new_message so inbox rows need no subquery.
+    last_message = models.ForeignKey(
+        "Message",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
 
     class Meta:
         ordering = ["-last_message_at", "-updated_at"]
@@ -281,11 +301,15 @@ class ConversationParticipant(models.Model):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="member")
     joined_at = models.DateTimeField(auto_now_add=True)
     last_read_at = models.DateTimeField(blank=True, null=True)
+    unread_count = models.PositiveIntegerField(default=0)
     is_archived = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ("conversation", "user")
         ordering = ["-joined_at"]
+        indexes = [
+            models.Index(fields=["user", "is_archived"]),
+        ]
 
     def __str__(self):
         return f"{self.user} in {self.conversation_id}"
@@ -692,6 +716,7 @@ from .marketplace_models import (
     MarketplaceReport,
     MarketplaceOffer,
     SellerVerification,
+    TrendingScore,
 )
 
 # Import animal marketplace models
@@ -700,8 +725,10 @@ from .animal_models import (
     AnimalSellerVerification,
     VetDocumentation,
     AnimalListing,
+    ImageFingerprint,
     AnimalListingMedia,
     SellerReview,
+    SellerStats,
     SuspiciousActivityLog,
     BreederDirectory,
 )
@@ -0,0 +1,136 @@
+"""
+Non-blocking, batching publisher for channel-layer group events.
+
+Request threads used to call ``async_to_sync(layer.group_send)`` directly,
+blocking on a Redis round-trip per event. ``publish`` instead hands the event
+to a background event loop and returns immediately; events for the same group
+that arrive within ``CHAT_OUTBOX_WINDOW_MS`` are coalesced into one
+``outbox.batch`` group message whose payload is a msgpack-encoded list of the
+original events, stamped with the target group like every other layer event.
+Consumers unpack the batch and dispatch each event to its normal handler.
+"""
+
+import asyncio
+import atexit
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BATCH_EVENT_TYPE = "outbox.batch"
+
+
+def encode_batch(group: str, events: List[dict]) -> dict:
+    return {
+        "type": BATCH_EVENT_TYPE,
+        "group": group,
+        "p": msgpack.packb(events, use_bin_type=True),
+    }
+
+
+def decode_batch(event: dict) -> List[dict]:
+    return msgpack.unpackb(event["p"], raw=False)
+
+
+class ChannelOutbox:
+    """Per-process outbox that batches group events over a short window."""
+
+    def __init__(self, window_ms: Optional[int] = None):
+        if window_ms is None:
+            window_ms = getattr(settings, "CHAT_OUTBOX_WINDOW_MS", 5)
+        self.window = max(window_ms, 0) / 1000.0
+        self._pending: Dict[str, List[dict]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def publish(self, group: str, event: dict) -> None:
+        """Queue ``event`` for ``group``; never blocks on the channel layer."""
+        if not self.window:
+            self._send_now(group, [event])
+            return
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(self._enqueue, group, event)
+
+    def flush(self, timeout: float = 2.0) -> None:
+        """Block until every queued event has been handed to the channel layer."""
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._flush_all(), self._loop)
+        future.result(timeout)
+
+    def _send_now(self, group: str, events: List[dict]) -> None:
+        layer = get_channel_layer()
+        if not layer:
+            return
+        try:
+            async_to_sync(layer.group_send)(group, encode_batch(group, events))
+        except Exception:
+            logger.exception("Failed to publish %d event(s) to %s", len(events), group)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="channel-outbox", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def _enqueue(self, group: str, event: dict) -> None:
+        batch = self._pending.get(group)
+        if batch is not None:
+            batch.append(event)
+            return
+        self._pending[group] = [event]
+        self._loop.call_later(
+            self.window, lambda: asyncio.ensure_future(self._flush_group(group))
+        )
+
+    async def _flush_group(self, group: str) -> None:
+        events = self._pending.pop(group, None)
+        if not events:
+            return
+        layer = get_channel_layer()
+        if not layer:
+            return
+        try:
+            await layer.group_send(group, encode_batch(group, events))
+        except Exception:
+            logger.exception("Failed to publish %d event(s) to %s", len(events), group)
+
+    async def _flush_all(self) -> None:
+        for group in list(self._pending):
+            await self._flush_group(group)
+
+
+_outbox: Optional[ChannelOutbox] = None
+
+
+def get_outbox() -> ChannelOutbox:
+    global _outbox
+    if _outbox is None:
+        _outbox = ChannelOutbox()
+        atexit.register(_flush_on_exit)
+    return _outbox
+
+
+def _flush_on_exit() -> None:
+    try:
+        if _outbox is not None:
+            _outbox.flush(timeout=1.0)
+    except Exception:
+        pass
+
+
+def publish(group: str, event: dict) -> None:
+    get_outbox().publish(group, event)
@@ -0,0 +1,122 @@
+"""
+Rolling retention for append-only tables.
+
+Aged rows are written as gzip-compressed NDJSON and then deleted, so the live
+tables (and every endpoint reading them) only ever hold the hot window.
+Archives go to the media bucket under ``RETENTION_ARCHIVE_S3_PREFIX``, one
+object per batch, because task containers have no durable disk. Setting
+``RETENTION_ARCHIVE_ROOT`` writes them to that (mounted) directory instead.
+Policies live in ``settings.RETENTION_POLICIES`` and are applied in order by
+the ``main.tasks.run_retention_policies`` Celery beat task.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import s3
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_retention_policies() -> Dict[str, Dict[str, Any]]:
+    return getattr(settings, "RETENTION_POLICIES", {}) or {}
+
+
+def _archive_dir(root, model) -> str:
+    path = os.path.join(root, model._meta.label_lower)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _write_archive(model, run_started, batch_index: int, rows) -> str:
+    """Persist one batch of rows; returns the file path or S3 key written."""
+    payload = "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+    name = f"{run_started:%Y%m%dT%H%M%S}"
+    root = getattr(settings, "RETENTION_ARCHIVE_ROOT", "")
+    if root:
+        path = os.path.join(_archive_dir(root, model), f"{name}.ndjson.gz")
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            fh.write(payload)
+        return path
+
+    prefix = getattr(settings, "RETENTION_ARCHIVE_S3_PREFIX", "retention/")
+    key = f"{prefix}{model._meta.label_lower}/{name}-{batch_index:05d}.ndjson.gz"
+    s3.put_object(key, gzip.compress(payload.encode("utf-8")), "application/gzip")
+    return key
+
+
+def archive_model(
+    label: str,
+    *,
+    days: int,
+    filters: Optional[Dict[str, Any]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dry_run: bool = False,
+) -> int:
+    """Archive and delete rows of ``label`` older than ``days``.
+
+    Rows are processed oldest-first in batches of ``batch_size``; each batch is
+    archived before it is deleted, so a crash between the two steps can only
+    duplicate archived rows, never lose them.
+    Returns the number of rows archived (or that would be, for ``dry_run``).
+    """
+    model = apps.get_model(label)
+    cutoff = timezone.now() - timedelta(days=days)
+    qs = model.objects.filter(created_at__lt=cutoff)
+    if filters:
+        qs = qs.filter(**filters)
+
+    if dry_run:
+        return qs.count()
+
+    pk_name = model._meta.pk.attname
+    ordered = qs.order_by("created_at", pk_name)
+    run_started = timezone.now()
+    archived = batches = 0
+    location = None
+
+    while True:
+        rows = list(ordered.values()[:batch_size])
+        if not rows:
+            break
+        location = _write_archive(model, run_started, batches, rows)
+        with transaction.atomic():
+            model.objects.filter(pk__in=[row[pk_name] for row in rows]).delete()
+        archived += len(rows)
+        batches += 1
+
+    if archived:
+        logger.info("Archived %d %s row(s) older than %s to %s", archived, label, cutoff, location)
+    return archived
+
+
+def run_retention_policies(dry_run: bool = False) -> Dict[str, int]:
+    """Apply every configured retention policy; returns rows archived per model."""
+    results: Dict[str, int] = {}
+    for label, policy in get_retention_policies().items():
+        days = policy.get("days")
+        if not days:
+            continue
+        try:
+            results[label] = archive_model(
+                label,
+                days=int(days),
+                filters=policy.get("filters"),
+                batch_size=int(policy.get("batch_size", DEFAULT_BATCH_SIZE)),
+                dry_run=dry_run,
+            )
+        except Exception:
+            logger.exception("Retention policy for %s failed", label)
+    return results
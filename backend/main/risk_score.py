@@ -0,0 +1,158 @@
+"""
+Materialized scam risk scores for animal listings.
+
+``AnimalListing.risk_score`` stores the 0-100 score so that risk filtering
+is an indexed WHERE clause and serializers read a column. The score adds:
+
+- 15 when the listing has no media;
+- 10 per scam flag;
+- 20 when the seller is not (or no longer) verified;
+- 10 for a paid listing without vet documentation;
+- 10 when the seller joined less than ``NEW_SELLER_DAYS`` days ago;
+- 15 when the seller has more than ``RESALE_THRESHOLD`` sold listings
+  (``SellerStats.sold_count``).
+
+Scores are recomputed in bulk, a few queries per batch, for the listings
+touched by a change. The ``main.signals`` receivers schedule this after
+commit whenever a listing, its media or vet documentation, or the seller's
+verification changes. A listing entering or leaving "sold" recomputes
+every listing of that seller.
+
+Two inputs change with time alone: seller age and verification expiry.
+The daily ``main.tasks.recompute_risk_scores`` beat task and the
+``recompute_risk_scores`` command refresh every listing for those.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from .animal_models import AnimalListing, SellerStats, VetDocumentation
+
+logger = logging.getLogger(__name__)
+
+NEW_SELLER_DAYS = 7
+RESALE_THRESHOLD = 10
+BATCH_SIZE = 1000
+
+
+def score(
+    *,
+    media_count: int,
+    scam_flags,
+    seller_verified: bool,
+    price,
+    has_vet_documentation: bool,
+    seller_joined,
+    seller_sold_count: int,
+    now=None,
+) -> int:
+    """The risk score for one listing's inputs."""
+    now = now or timezone.now()
+    total = 0
+    if not media_count:
+        total += 15
+    total += len(scam_flags or []) * 10
+    if not seller_verified:
+        total += 20
+    if price > 0 and not has_vet_documentation:
+        total += 10
+    if seller_joined and (now - seller_joined) < timedelta(days=NEW_SELLER_DAYS):
+        total += 10
+    if seller_sold_count > RESALE_THRESHOLD:
+        total += 15
+    return min(total, 100)
+
+
+def _sold_counts(seller_ids) -> dict:
+    return dict(
+        SellerStats.objects.filter(seller_id__in=seller_ids).values_list(
+            "seller_id", "sold_count"
+        )
+    )
+
+
+def _recompute_batch(ids, now) -> int:
+    listings = list(
+        AnimalListing.objects.filter(pk__in=ids)
+        .select_related("seller", "seller_verification")
+        .annotate(
+            media_total=Count("media"),
+            has_vet=Exists(VetDocumentation.objects.filter(listing=OuterRef("pk"))),
+        )
+        .only(
+            "id",
+            "price",
+            "scam_flags",
+            "risk_score",
+            "seller__date_joined",
+            "seller_verification__status",
+            "seller_verification__expires_at",
+        )
+    )
+    sold = _sold_counts({listing.seller_id for listing in listings})
+    changed = []
+    for listing in listings:
+        verification = listing.seller_verification
+        value = score(
+            media_count=listing.media_total,
+            scam_flags=listing.scam_flags,
+            seller_verified=bool(verification and verification.is_verified),
+            price=listing.price,
+            has_vet_documentation=listing.has_vet,
+            seller_joined=listing.seller.date_joined,
+            seller_sold_count=sold.get(listing.seller_id, 0),
+            now=now,
+        )
+        if value != listing.risk_score:
+            listing.risk_score = value
+            changed.append(listing)
+    if changed:
+        AnimalListing.objects.bulk_update(changed, ["risk_score"])
+    return len(changed)
+
+
+def recompute(listing_ids: Optional[Iterable[int]] = None, batch_size: int = BATCH_SIZE) -> dict:
+    """Recompute the given listings (all when ``None``); returns run counters."""
+    now = timezone.now()
+    seen = updated = 0
+    if listing_ids is None:
+        last = 0
+        while True:
+            batch = list(
+                AnimalListing.objects.filter(pk__gt=last)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last = batch[-1]
+            seen += len(batch)
+            updated += _recompute_batch(batch, now)
+    else:
+        ids = sorted(set(listing_ids))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start : start + batch_size]
+            seen += len(batch)
+            updated += _recompute_batch(batch, now)
+    return {"listings": seen, "updated": updated}
+
+
+def schedule_recompute(listing_ids) -> None:
+    """Recompute ``listing_ids`` once the current transaction commits."""
+    ids = {pk for pk in listing_ids if pk is not None}
+    if ids:
+        transaction.on_commit(lambda: recompute(ids))
+
+
+def schedule_seller_recompute(seller_id) -> None:
+    """Recompute every listing of ``seller_id`` after commit."""
+
+    def run():
+        recompute(AnimalListing.objects.filter(seller_id=seller_id).values_list("pk", flat=True))
+
+    transaction.on_commit(run)
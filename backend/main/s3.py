@@ -1,7 +1,40 @@
+"""
+S3 uploads.
+
+Clients get files into the bucket in one of two ways.
+
+Direct upload (preferred for photos and videos). ``presign_upload`` issues
+a presigned POST for a fresh key under ``uploads/<user id>/``. The POST
+policy pins the content type and caps the size, and the browser or app
+sends the bytes straight to S3. The client then calls the upload-complete
+endpoint (``main.views_uploads.UploadCompleteView``), which HEADs the
+object and checks its size and type against the signed grant before the
+URL is handed back.
+
+Proxied upload (``upload_fileobj_to_s3`` / ``upload_many``). The server
+streams request files itself. Batches are uploaded in parallel on a small
+thread pool.
+
+Both paths share one module-level boto3 client. boto3 clients are
+thread-safe, and reusing one keeps its connection pool (sized by
+``S3_MAX_POOL_CONNECTIONS``) warm, where building a ``Session`` per file
+paid for credential resolution and a new TLS connection every time.
+
+Any S3-compatible endpoint (MinIO, moto) works through
+``AWS_S3_ENDPOINT_URL``.
+"""
+
+import re
+import threading
 import uuid
-from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
 from decouple import config
 
+_client = None
+_client_lock = threading.Lock()
+
 
 def _ensure_boto():
     try:
@@ -12,49 +45,52 @@ def _ensure_boto():
         raise RuntimeError('boto3 is required for S3 uploads but is not installed') from e
 
 
-def upload_fileobj_to_s3(file_obj, filename=None, content_type=None):
-    """Upload a file-like object to S3 and return the public URL.
-
-    Expects AWS credentials and bucket in environment variables.
-    """
+def _bucket():
     bucket = config('AWS_STORAGE_BUCKET_NAME', default=None)
-    region = config('AWS_REGION', default=None) or config('AWS_S3_REGION', default='')
-    access_key = config('AWS_ACCESS_KEY_ID', default=None)
-    secret = config('AWS_SECRET_ACCESS_KEY', default=None)
-    endpoint = config('AWS_S3_ENDPOINT_URL', default=None)
-
     if not bucket:
         raise RuntimeError('AWS_STORAGE_BUCKET_NAME not set in environment')
-    if not access_key or not secret:
-        raise RuntimeError('AWS credentials not configured (AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY)')
-
-    boto3, BotoCoreError, ClientError = _ensure_boto()
-    session = boto3.session.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret,
-        region_name=region or None,
-    )
-    client_kwargs = {}
-    if endpoint:
-        client_kwargs['endpoint_url'] = endpoint
-    s3 = session.client('s3', **client_kwargs)
+    return bucket
 
-    key = f"uploads/{uuid.uuid4().hex}_{filename or getattr(file_obj, 'name', 'file')}"
 
-    extra_args = {}
-    if content_type:
-        extra_args['ContentType'] = content_type
+def _region():
+    return config('AWS_REGION', default=None) or config('AWS_S3_REGION', default='')
 
-    upload_kwargs = {}
-    if extra_args:
-        upload_kwargs['ExtraArgs'] = extra_args
 
-    try:
-        s3.upload_fileobj(file_obj, bucket, key, **upload_kwargs)
-    except (BotoCoreError, ClientError) as e:
-        raise RuntimeError(f'Failed to upload file to S3: {e}') from e
+def get_client():
+    """The shared S3 client, created on first use."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            access_key = config('AWS_ACCESS_KEY_ID', default=None)
+            secret = config('AWS_SECRET_ACCESS_KEY', default=None)
+            if not access_key or not secret:
+                raise RuntimeError('AWS credentials not configured (AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY)')
+
+            boto3, _, _ = _ensure_boto()
+            from botocore.config import Config
+
+            client_kwargs = {
+                'aws_access_key_id': access_key,
+                'aws_secret_access_key': secret,
+                'region_name': _region() or None,
+                'config': Config(
+                    max_pool_connections=config('S3_MAX_POOL_CONNECTIONS', default=20, cast=int),
+                    retries={'max_attempts': 3, 'mode': 'standard'},
+                ),
+            }
+            endpoint = config('AWS_S3_ENDPOINT_URL', default=None)
+            if endpoint:
+                client_kwargs['endpoint_url'] = endpoint
+            _client = boto3.client('s3', **client_kwargs)
+    return _client
 
-    # Build URL
+
+def object_url(key):
+    """Public URL of ``key`` in the upload bucket."""
+    bucket = _bucket()
+    region = _region()
     custom = config('AWS_S3_CUSTOM_DOMAIN', default='').strip()
     encoded_key = quote(key, safe="/")
     if custom:
@@ -68,3 +104,142 @@ def upload_fileobj_to_s3(file_obj, filename=None, content_type=None):
     if region and region != 'us-east-1':
         return f"https://{bucket}.s3.{region}.amazonaws.com/{encoded_key}"
     return f"https://{bucket}.s3.amazonaws.com/{encoded_key}"
+
+
+def key_for_url(url):
+    """The object key behind ``url`` when it points into the upload bucket."""
+    try:
+        prefix = object_url('')
+    except RuntimeError:
+        return None
+    if not url or not url.startswith(prefix):
+        return None
+    return unquote(url[len(prefix):].split('?', 1)[0]) or None
+
+
+def _safe_name(filename):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', filename or 'file')[-100:]
+
+
+def new_upload_key(filename=None, owner_id=None):
+    """A fresh object key, scoped to ``owner_id`` when given."""
+    prefix = f"uploads/{owner_id}/" if owner_id is not None else "uploads/"
+    return f"{prefix}{uuid.uuid4().hex}_{_safe_name(filename)}"
+
+
+def upload_fileobj_to_s3(file_obj, filename=None, content_type=None):
+    """Upload a file-like object to S3 and return the public URL.
+
+    Expects AWS credentials and bucket in environment variables.
+    """
+    bucket = _bucket()
+    s3 = get_client()
+    _, BotoCoreError, ClientError = _ensure_boto()
+
+    key = f"uploads/{uuid.uuid4().hex}_{filename or getattr(file_obj, 'name', 'file')}"
+
+    upload_kwargs = {}
+    if content_type:
+        upload_kwargs['ExtraArgs'] = {'ContentType': content_type}
+
+    try:
+        s3.upload_fileobj(file_obj, bucket, key, **upload_kwargs)
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to upload file to S3: {e}') from e
+
+    return object_url(key)
+
+
+def upload_many(files):
+    """Upload Django ``UploadedFile`` objects in parallel; URLs in input order."""
+    if len(files) == 1:
+        f = files[0]
+        return [upload_fileobj_to_s3(f, filename=f.name, content_type=f.content_type)]
+    workers = min(len(files), config('S3_UPLOAD_CONCURRENCY', default=4, cast=int))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(
+            pool.map(
+                lambda f: upload_fileobj_to_s3(f, filename=f.name, content_type=f.content_type),
+                files,
+            )
+        )
+
+
+def presign_upload(key, content_type, max_size, expires_in):
+    """Presigned POST (``{"url", "fields"}``) for one object of ``content_type``.
+
+    S3 rejects the POST if the body exceeds ``max_size`` bytes or the
+    ``Content-Type`` field differs.
+    """
+    _, BotoCoreError, ClientError = _ensure_boto()
+    try:
+        return get_client().generate_presigned_post(
+            Bucket=_bucket(),
+            Key=key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size],
+            ],
+            ExpiresIn=expires_in,
+        )
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to presign S3 upload: {e}') from e
+
+
+def head_object(key):
+    """``(size, content_type)`` of ``key``, or ``None`` when it does not exist."""
+    _, BotoCoreError, ClientError = _ensure_boto()
+    try:
+        head = get_client().head_object(Bucket=_bucket(), Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise RuntimeError(f'Failed to inspect S3 object: {e}') from e
+    except BotoCoreError as e:
+        raise RuntimeError(f'Failed to inspect S3 object: {e}') from e
+    return head['ContentLength'], head.get('ContentType', '')
+
+
+def delete_object(key):
+    _, BotoCoreError, ClientError = _ensure_boto()
+    try:
+        get_client().delete_object(Bucket=_bucket(), Key=key)
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to delete S3 object: {e}') from e
+
+
+def read_object(key, max_bytes):
+    """Body of ``key``; raises ``RuntimeError`` when missing or over ``max_bytes``."""
+    _, BotoCoreError, ClientError = _ensure_boto()
+    try:
+        obj = get_client().get_object(Bucket=_bucket(), Key=key)
+        if obj['ContentLength'] > max_bytes:
+            obj['Body'].close()
+            raise RuntimeError(f'S3 object {key} is larger than {max_bytes} bytes')
+        return obj['Body'].read()
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to read S3 object: {e}') from e
+
+
+def read_object_start(key, length):
+    """``(first length bytes, total size)`` of ``key``, via a ranged GET."""
+    _, BotoCoreError, ClientError = _ensure_boto()
+    try:
+        obj = get_client().get_object(Bucket=_bucket(), Key=key, Range=f'bytes=0-{length - 1}')
+        data = obj['Body'].read()
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to read S3 object: {e}') from e
+    total = obj.get('ContentRange', '').rpartition('/')[2]
+    return data, int(total) if total.isdigit() else len(data)
+
+
+def put_object(key, data, content_type, cache_control=None):
+    """Store ``data`` under ``key`` and return its public URL."""
+    _, BotoCoreError, ClientError = _ensure_boto()
+    extra = {'CacheControl': cache_control} if cache_control else {}
+    try:
+        get_client().put_object(Bucket=_bucket(), Key=key, Body=data, ContentType=content_type, **extra)
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f'Failed to upload file to S3: {e}') from e
+    return object_url(key)
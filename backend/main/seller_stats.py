@@ -0,0 +1,128 @@
+"""
+Seller reputation aggregates.
+
+``SellerStats`` keeps one row per seller with these counters:
+
+- sold animal listings;
+- reviews received;
+- the sum of their ratings;
+- a five-bucket rating histogram.
+
+The seller profile and the listing serializers read averages and counts
+from this row (select_related through ``seller__seller_stats``) instead of
+aggregating ``SellerReview`` and counting sold listings per request.
+
+The counters are adjusted with atomic ``F()`` updates from the
+``main.signals`` receivers:
+
+- a review is created, re-rated or deleted;
+- a listing enters or leaves "sold", or a sold listing is deleted.
+
+``rebuild_seller_stats`` recomputes every row from scratch. It is used by
+the ``rebuild_seller_stats`` command after imports or raw SQL edits.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .animal_models import AnimalListing, SellerReview, SellerStats
+
+logger = logging.getLogger(__name__)
+
+STARS = range(1, 6)
+
+
+def _star(rating: int) -> int:
+    return min(max(int(rating), 1), 5)
+
+
+def _adjust(seller_id, **deltas) -> None:
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes or seller_id is None:
+        return
+    if SellerStats.objects.filter(seller_id=seller_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SellerStats.objects.create(
+                seller_id=seller_id, **{field: max(delta, 0) for field, delta in deltas.items()}
+            )
+    except IntegrityError:
+        # Created concurrently; fall back to the increment.
+        SellerStats.objects.filter(seller_id=seller_id).update(**changes)
+
+
+def adjust_sold(seller_id, delta: int) -> None:
+    _adjust(seller_id, sold_count=delta)
+
+
+def adjust_review(seller_id, rating: int, delta: int) -> None:
+    """Add (``delta=1``) or remove (``delta=-1``) one review's rating."""
+    _adjust(
+        seller_id,
+        review_count=delta,
+        rating_sum=delta * int(rating),
+        **{f"rating_{_star(rating)}": delta},
+    )
+
+
+def change_review_rating(seller_id, old: int, new: int) -> None:
+    if old == new:
+        return
+    deltas = {"rating_sum": int(new) - int(old)}
+    deltas[f"rating_{_star(old)}"] = -1
+    deltas[f"rating_{_star(new)}"] = deltas.get(f"rating_{_star(new)}", 0) + 1
+    _adjust(seller_id, **deltas)
+
+
+def stats_of(user) -> Optional[SellerStats]:
+    """The user's stats row, or ``None``; free after select_related."""
+    try:
+        return user.seller_stats
+    except SellerStats.DoesNotExist:
+        return None
+
+
+def rebuild_seller_stats() -> Dict[str, int]:
+    """Recompute every seller's row from listings and reviews."""
+    rows: Dict = {}
+
+    def row(seller_id):
+        return rows.setdefault(seller_id, SellerStats(seller_id=seller_id))
+
+    sold = (
+        AnimalListing.objects.filter(status="sold")
+        .values_list("seller_id")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for seller_id, total in sold:
+        row(seller_id).sold_count = total
+
+    reviews = (
+        SellerReview.objects.values("seller_id")
+        .annotate(
+            total=Count("id"),
+            rating_total=Sum("rating"),
+            **{f"star_{star}": Count("id", filter=Q(rating=star)) for star in STARS},
+        )
+        .order_by()
+    )
+    for entry in reviews:
+        stats = row(entry["seller_id"])
+        stats.review_count = entry["total"]
+        stats.rating_sum = entry["rating_total"] or 0
+        for star in STARS:
+            setattr(stats, f"rating_{star}", entry[f"star_{star}"])
+        # Ratings above 5 are counted in the top bucket, as adjust_review does.
+        stats.rating_5 += entry["total"] - sum(entry[f"star_{star}"] for star in STARS)
+
+    with transaction.atomic():
+        SellerStats.objects.all().delete()
+        SellerStats.objects.bulk_create(rows.values(), batch_size=1000)
+    result = {"sellers": len(rows)}
+    logger.info("Seller stats rebuilt: %s", result)
+    return result
@@ -31,6 +31,7 @@ from .models import (
 )
 from users.serializers import UserSerializer
 from .moderation_models import ContentClassification
+from .image_derivatives import media_variants
 from .moderation.filtering import get_active_filter_profile
 from .moderation.redaction import redact_profanity
 
@@ -263,6 +264,7 @@ class PageFollowerSerializer(serializers.ModelSerializer):
 class CommentSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     media = serializers.SerializerMethodField()
+    media_variants = serializers.SerializerMethodField()
     media_urls = serializers.ListField(
         child=serializers.URLField(), write_only=True, required=False
     )
@@ -283,6 +285,7 @@ class CommentSerializer(serializers.ModelSerializer):
             "parent",
             "created_at",
             "media",
+            "media_variants",
             "media_urls",
             "reactions",
             "reaction_summary",
@@ -340,6 +343,9 @@ class CommentSerializer(serializers.ModelSerializer):
     def get_media(self, obj):
         return [m.url for m in obj.media.all()]
 
+    def get_media_variants(self, obj):
+        return [media_variants(m.url, m.variants, m.blurhash) for m in obj.media.all()]
+
     def get_reaction_summary(self, obj):
         base = {choice[0]: 0 for choice in Reaction.TYPE_CHOICES}
         total = 0
@@ -424,6 +430,7 @@ class PostSerializer(serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
     reactions = ReactionSerializer(many=True, read_only=True)
     media = serializers.SerializerMethodField()
+    media_variants = serializers.SerializerMethodField()
     media_urls = serializers.ListField(
         child=serializers.URLField(), write_only=True, required=False
     )
@@ -444,6 +451,7 @@ class PostSerializer(serializers.ModelSerializer):
             "page_id",
             "content",
             "media",
+            "media_variants",
             "media_urls",
             "visibility",
             "created_at",
@@ -505,6 +513,9 @@ class PostSerializer(serializers.ModelSerializer):
     def get_media(self, obj):
         return [m.url for m in obj.media.all()]
 
+    def get_media_variants(self, obj):
+        return [media_variants(m.url, m.variants, m.blurhash) for m in obj.media.all()]
+
     def get_bookmarked(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
@@ -872,8 +883,16 @@ class ConversationParticipantSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ConversationParticipant
-        fields = ["id", "user", "role", "joined_at", "last_read_at", "is_archived"]
-        read_only_fields = ["id", "user", "role", "joined_at"]
+        fields = [
+            "id",
+            "user",
+            "role",
+            "joined_at",
+            "last_read_at",
+            "unread_count",
+            "is_archived",
+        ]
+        read_only_fields = ["id", "user", "role", "joined_at", "unread_count"]
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -950,6 +969,7 @@ class ConversationSerializer(serializers.ModelSerializer):
     participants = ConversationParticipantSerializer(many=True, read_only=True)
     created_by = UserSerializer(read_only=True)
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
     participant_ids = serializers.ListField(
         child=serializers.UUIDField(),
         write_only=True,
@@ -969,6 +989,7 @@ class ConversationSerializer(serializers.ModelSerializer):
             "last_message_at",
             "participants",
             "last_message",
+            "unread_count",
             "participant_ids",
         ]
         read_only_fields = [
@@ -979,6 +1000,7 @@ class ConversationSerializer(serializers.ModelSerializer):
             "last_message_at",
             "participants",
             "last_message",
+            "unread_count",
         ]
 
     def validate_participant_ids(self, value):
@@ -1028,14 +1050,24 @@ class ConversationSerializer(serializers.ModelSerializer):
         return conversation
 
     def get_last_message(self, obj):
-        message = (
-            getattr(obj, "messages", None)
-            and obj.messages.order_by("-created_at").select_related("sender").first()
-        )
+        # Denormalized by main.inbox.record_new_message.
+        message = obj.last_message
         if not message:
             return None
         return MessageSerializer(message, context=self.context).data
 
+    def get_unread_count(self, obj):
+        # Annotated by main.inbox.inbox_queryset; fall back to the membership row.
+        if hasattr(obj, "unread_count"):
+            return obj.unread_count
+        request = self.context.get("request")
+        if not request or not request.user.is_authenticated:
+            return 0
+        for participant in obj.participants.all():
+            if participant.user_id == request.user.id:
+                return participant.unread_count
+        return 0
+
 
 # Marketplace Serializers
 class MarketplaceCategorySerializer(serializers.ModelSerializer):
@@ -1060,8 +1092,17 @@ class MarketplaceListingMediaSerializer(serializers.ModelSerializer):
         model = __import__(
             "main.marketplace_models", fromlist=["MarketplaceListingMedia"]
         ).MarketplaceListingMedia
-        fields = ["id", "url", "content_type", "order", "uploaded_at", "listing_id"]
-        read_only_fields = ["id", "uploaded_at"]
+        fields = [
+            "id",
+            "url",
+            "content_type",
+            "order",
+            "uploaded_at",
+            "listing_id",
+            "variants",
+            "blurhash",
+        ]
+        read_only_fields = ["id", "uploaded_at", "variants", "blurhash"]
 
 
 class MarketplaceListingSerializer(serializers.ModelSerializer):
@@ -1123,6 +1164,9 @@ class MarketplaceListingSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_saved(self, obj):
+        # Annotated by main.marketplace_views.listing_detail_queryset.
+        if hasattr(obj, "is_saved_by_user"):
+            return obj.is_saved_by_user
         try:
             request = self.context.get("request")
             if request and request.user.is_authenticated:
@@ -3,11 +3,33 @@ import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
-from .models import Reaction, Comment, Notification, Post, UserFeedPreference, Message
+from .animal_models import (
+    AnimalListing,
+    AnimalListingMedia,
+    AnimalSellerVerification,
+    SellerReview,
+    VetDocumentation,
+)
+from .chat_access import invalidate_membership
+from .marketplace_models import MarketplaceListingMedia
+from .models import (
+    Reaction,
+    Comment,
+    CommentMedia,
+    Notification,
+    Post,
+    PostMedia,
+    UserFeedPreference,
+    Message,
+    ConversationParticipant,
+)
 from users.models import FriendRequest
+from users.profile_overview import invalidate_profile
+from .risk_score import schedule_recompute, schedule_seller_recompute
+from . import image_derivatives, seller_stats
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -133,6 +155,7 @@ def dispatch_notification(sender, instance, created, **kwargs):
             async_to_sync(layer.group_send)(
                 notification_group_name(str(instance.recipient.id)),
                 {
+                    "group": notification_group_name(str(instance.recipient.id)),
                     "type": "notification_created",
                     "data": serializer.data,
                 },
@@ -239,3 +262,117 @@ def message_notification(sender, instance, created, **kwargs):
         logger.exception(
             "Failed to create message notification for message %s", instance.pk
         )
+
+
+@receiver(post_save, sender=ConversationParticipant)
+@receiver(post_delete, sender=ConversationParticipant)
+def conversation_membership_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.conversation_id, instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    if instance.author_id:
+        invalidate_profile(instance.author_id)
+
+
+@receiver(post_save, sender=PostMedia)
+@receiver(post_delete, sender=PostMedia)
+def post_media_changed(sender, instance, **kwargs):
+    author_id = (
+        Post.objects.filter(pk=instance.post_id).values_list("author_id", flat=True).first()
+    )
+    if author_id:
+        invalidate_profile(author_id)
+
+
+# Fields whose changes never affect a listing's risk score.
+RISK_NEUTRAL_FIELDS = {"views_count", "contact_count", "risk_score", "updated_at"}
+
+
+@receiver(post_init, sender=AnimalListing)
+def remember_animal_listing_status(sender, instance, **kwargs):
+    # Read __dict__ so deferred loads are not triggered.
+    instance._loaded_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=AnimalListing)
+def animal_listing_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= RISK_NEUTRAL_FIELDS:
+        return
+    previous = None if created else getattr(instance, "_loaded_status", None)
+    if previous != instance.status and "sold" in (previous, instance.status):
+        seller_stats.adjust_sold(instance.seller_id, 1 if instance.status == "sold" else -1)
+        # The seller's sold count feeds every one of their listings' scores.
+        schedule_seller_recompute(instance.seller_id)
+    else:
+        schedule_recompute([instance.pk])
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=AnimalListing)
+def animal_listing_deleted(sender, instance, **kwargs):
+    if instance.status == "sold":
+        seller_stats.adjust_sold(instance.seller_id, -1)
+        schedule_seller_recompute(instance.seller_id)
+
+
+@receiver(post_save, sender=AnimalListingMedia)
+@receiver(post_delete, sender=AnimalListingMedia)
+@receiver(post_save, sender=VetDocumentation)
+@receiver(post_delete, sender=VetDocumentation)
+def animal_listing_evidence_changed(sender, instance, **kwargs):
+    schedule_recompute([instance.listing_id])
+
+
+@receiver(post_save, sender=AnimalSellerVerification)
+@receiver(post_delete, sender=AnimalSellerVerification)
+def animal_seller_verification_changed(sender, instance, **kwargs):
+    schedule_seller_recompute(instance.user_id)
+
+
+@receiver(post_init, sender=SellerReview)
+def remember_seller_review_rating(sender, instance, **kwargs):
+    instance._loaded_rating = instance.__dict__.get("rating")
+
+
+@receiver(post_save, sender=SellerReview)
+def seller_review_saved(sender, instance, created, **kwargs):
+    if created:
+        seller_stats.adjust_review(instance.seller_id, instance.rating, 1)
+    elif instance._loaded_rating is not None:
+        seller_stats.change_review_rating(instance.seller_id, instance._loaded_rating, instance.rating)
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=SellerReview)
+def seller_review_deleted(sender, instance, **kwargs):
+    seller_stats.adjust_review(instance.seller_id, instance.rating, -1)
+
+
+IMAGE_DERIVATIVE_TARGETS = {
+    PostMedia: "post",
+    CommentMedia: "comment",
+    MarketplaceListingMedia: "marketplace",
+    AnimalListingMedia: "animal",
+}
+
+
+@receiver(post_save, sender=PostMedia)
+@receiver(post_save, sender=CommentMedia)
+@receiver(post_save, sender=MarketplaceListingMedia)
+@receiver(post_save, sender=AnimalListingMedia)
+def media_saved(sender, instance, **kwargs):
+    if image_derivatives.needs_derivatives(instance.url, instance.variants):
+        image_derivatives.schedule(IMAGE_DERIVATIVE_TARGETS[sender], instance.pk)
+
+
+@receiver(post_save, sender=User)
+def profile_image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "profile_image_url" not in update_fields:
+        return
+    # Read __dict__ so deferred loads are not triggered.
+    url = instance.__dict__.get("profile_image_url")
+    if image_derivatives.needs_derivatives(url, instance.__dict__.get("profile_image_variants")):
+        image_derivatives.schedule("profile", instance.pk)
@@ -4,6 +4,7 @@ from typing import Optional, List, Tuple
 
 from celery import shared_task
 from django.conf import settings
+from django.db import InterfaceError, OperationalError
 from exponent_server_sdk import PushClient, PushMessage, PushTicketError
 
 from .models import Notification
@@ -399,3 +400,114 @@ def _send_fcm_notifications(
     except Exception as e:
         logger.exception("Error sending FCM notifications: %s", e)
         raise
+
+
+@shared_task
+def run_retention_policies():
+    """Archive aged rows for every model in settings.RETENTION_POLICIES."""
+    from .retention import run_retention_policies as _run
+
+    results = _run()
+    logger.info("Retention run complete: %s", results)
+    return results
+
+
+@shared_task
+def rebuild_friend_suggestions():
+    """Recompute stored friends-of-friends candidates for every user."""
+    from users.friend_suggestions import rebuild_friend_suggestions as _rebuild
+
+    return _rebuild()
+
+
+@shared_task
+def reconcile_user_rollups():
+    """Rebuild the analytics rollup buckets from the User table."""
+    from users.analytics_rollup import reconcile_rollups
+
+    return reconcile_rollups()
+
+
+@shared_task(
+    acks_late=True,
+    autoretry_for=(OperationalError, InterfaceError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=10,
+)
+def process_login_events():
+    """Apply queued login side-effects (sessions, history, security events)."""
+    from users.login_pipeline import drain_login_events
+
+    applied = drain_login_events()
+    if applied is None:
+        # Another worker holds the drain lock; check again once it is done.
+        process_login_events.apply_async(
+            countdown=getattr(settings, "LOGIN_EVENTS_BATCH_DELAY", 1.0)
+        )
+    return applied
+
+
+@shared_task(acks_late=True)
+def flush_listing_views():
+    """Apply buffered listing view deltas in bulk UPDATEs."""
+    from .view_counter import flush_view_counts
+
+    return flush_view_counts()
+
+
+@shared_task
+def rebuild_trending_listings():
+    """Recompute decayed trending scores for marketplace listings."""
+    from .trending import rebuild_trending
+
+    return rebuild_trending()
+
+
+@shared_task
+def recompute_risk_scores():
+    """Refresh every animal listing's stored risk score (time-based inputs)."""
+    from .risk_score import recompute
+
+    return recompute()
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(RuntimeError,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def generate_image_derivatives(self, target: str, pk):
+    """Render and record sized WebP/AVIF variants and a BlurHash for one media row."""
+    from .image_derivatives import generate
+
+    return generate(target, pk)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(RuntimeError,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    max_retries=3,
+)
+def analyze_listing_media(self, kind: str, media_id: int):
+    """Fingerprint a listing photo and flag stock or reused photos."""
+    from .media_analysis import analyze_media
+
+    try:
+        return analyze_media(kind, media_id)
+    except ValueError as exc:
+        # Not an uploaded URL, oversized or undecodable image: nothing to retry.
+        logger.info("Skipping analysis of %s media %s: %s", kind, media_id, exc)
+        return None
+
+
+@shared_task
+def rebuild_duplicate_image_index(distance: Optional[int] = None):
+    """Re-derive the pHash segment index and flag listings with reused photos."""
+    from .duplicate_images import rebuild
+
+    return rebuild(distance)
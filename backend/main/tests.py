@@ -1,4 +1,6 @@
-from django.test import TestCase
+import json
+
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from users.models import User, Friends, UserSettings
 from .models import Notification
@@ -68,3 +70,1220 @@ class MainAppTests(TestCase):
         self.assertEqual(resp.status_code, 201)
         self.assertEqual(resp.data.get('content'), '')
         self.assertEqual(resp.data.get('media'), ['https://example.com/post-image.jpg'])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_root, ignore_errors=True)
+        self.user1 = User.objects.create_user(email='r1@example.com', password='pass', username='r1')
+        self.user2 = User.objects.create_user(email='r2@example.com', password='pass', username='r2')
+
+    def test_aged_read_notifications_are_archived(self):
+        import gzip
+        import json
+        import os
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from .retention import run_retention_policies
+
+        old_read = Notification.objects.create(recipient=self.user1, actor=self.user2, verb='reacted', unread=False)
+        old_unread = Notification.objects.create(recipient=self.user1, actor=self.user2, verb='reacted')
+        fresh = Notification.objects.create(recipient=self.user1, actor=self.user2, verb='reacted', unread=False)
+        Notification.objects.filter(id__in=[old_read.id, old_unread.id]).update(
+            created_at=timezone.now() - timedelta(days=120)
+        )
+
+        policies = {'main.Notification': {'days': 90, 'filters': {'unread': False}}}
+        with override_settings(RETENTION_POLICIES=policies, RETENTION_ARCHIVE_ROOT=self.archive_root):
+            results = run_retention_policies()
+
+        self.assertEqual(results, {'main.Notification': 1})
+        remaining = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {old_unread.id, fresh.id})
+
+        archive_dir = os.path.join(self.archive_root, 'main.notification')
+        (filename,) = os.listdir(archive_dir)
+        with gzip.open(os.path.join(archive_dir, filename), 'rt') as fh:
+            rows = [json.loads(line) for line in fh]
+        self.assertEqual([row['id'] for row in rows], [old_read.id])
+
+    def test_compliance_logs_keep_their_action_link(self):
+        import gzip
+        import json
+        import os
+        from datetime import timedelta
+        from django.conf import settings
+        from django.test import override_settings
+        from django.utils import timezone
+        from .moderation_models import ComplianceLog, ModerationAction
+        from .retention import run_retention_policies
+
+        aged = timezone.now() - timedelta(days=800)
+        action = ModerationAction.objects.create(layer='l1', action='block', reason_code='spam', rule_ref='r1')
+        log = ComplianceLog.objects.create(action=action, layer='l1', category='spam')
+        kept_action = ModerationAction.objects.create(layer='l1', action='block', reason_code='spam', rule_ref='r2')
+        ComplianceLog.objects.create(action=kept_action, layer='l1', category='spam')
+        ModerationAction.objects.update(created_at=aged)
+        ComplianceLog.objects.filter(id=log.id).update(created_at=aged)
+
+        policies = {
+            label: policy for label, policy in settings.RETENTION_POLICIES.items()
+            if label in ('main.ComplianceLog', 'main.ModerationAction')
+        }
+        with override_settings(RETENTION_POLICIES=policies, RETENTION_ARCHIVE_ROOT=self.archive_root):
+            results = run_retention_policies()
+
+        self.assertEqual(results, {'main.ComplianceLog': 1, 'main.ModerationAction': 1})
+        self.assertEqual(list(ModerationAction.objects.values_list('id', flat=True)), [kept_action.id])
+        archive_dir = os.path.join(self.archive_root, 'main.compliancelog')
+        (filename,) = os.listdir(archive_dir)
+        with gzip.open(os.path.join(archive_dir, filename), 'rt') as fh:
+            (row,) = [json.loads(line) for line in fh]
+        self.assertEqual(row['action_id'], action.id)
+
+    def test_archives_go_to_s3_without_a_mounted_root(self):
+        import gzip
+        import json
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from . import s3
+        from .retention import run_retention_policies
+
+        start_test_bucket(self)
+        notifications = [
+            Notification.objects.create(recipient=self.user1, actor=self.user2, verb='reacted', unread=False)
+            for _ in range(3)
+        ]
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=120))
+
+        policies = {'main.Notification': {'days': 90, 'batch_size': 2}}
+        with override_settings(RETENTION_POLICIES=policies, RETENTION_ARCHIVE_ROOT=''):
+            results = run_retention_policies()
+
+        self.assertEqual(results, {'main.Notification': 3})
+        self.assertFalse(Notification.objects.exists())
+        listing = s3.get_client().list_objects_v2(Bucket='liberty-test', Prefix='retention/main.notification/')
+        keys = sorted(item['Key'] for item in listing['Contents'])
+        self.assertEqual(len(keys), 2)
+        archived = []
+        for key in keys:
+            body = s3.get_client().get_object(Bucket='liberty-test', Key=key)['Body'].read()
+            archived += [json.loads(line)['id'] for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(archived, [notification.id for notification in notifications])
+
+
+class CompactChatEventTests(TestCase):
+    def setUp(self):
+        from .models import Conversation, ConversationParticipant, Message
+
+        self.user1 = User.objects.create_user(email='c1@example.com', password='pass', username='c1')
+        self.user2 = User.objects.create_user(email='c2@example.com', password='pass', username='c2')
+        self.conversation = Conversation.objects.create(created_by=self.user1)
+        ConversationParticipant.objects.create(conversation=self.conversation, user=self.user1)
+        ConversationParticipant.objects.create(conversation=self.conversation, user=self.user2)
+        self.message = Message.objects.create(conversation=self.conversation, sender=self.user1, content='hi')
+
+    def test_expanded_event_matches_message_serializer(self):
+        from asgiref.sync import async_to_sync
+        from django.contrib.contenttypes.models import ContentType
+        from .chat_events import compact_message, expand_message
+        from .models import Message, Reaction
+        from .serializers import MessageSerializer
+
+        Reaction.objects.create(
+            content_type=ContentType.objects.get_for_model(Message),
+            object_id=self.message.id,
+            user=self.user2,
+            reaction_type='love',
+        )
+        message = Message.objects.prefetch_related('reactions__user').get(id=self.message.id)
+
+        expanded = async_to_sync(expand_message)(compact_message(message))
+        expected = MessageSerializer(message).data
+        self.assertEqual(
+            json.loads(json.dumps(expanded)),
+            json.loads(json.dumps(expected)),
+        )
+
+    def test_delta_payload_only_carries_changed_fields(self):
+        from .chat_events import MESSAGE_UPDATED, REACTION_FIELDS, build_message_event, delta_payload
+
+        event = build_message_event(MESSAGE_UPDATED, self.message, fields=REACTION_FIELDS, reactions=[])
+        self.assertEqual(
+            delta_payload(event),
+            {'id': self.message.id, 'c': self.conversation.id, 'rx': []},
+        )
+
+
+class WebSocketAdmissionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Conversation, ConversationParticipant
+
+        cache.clear()
+        self.user = User.objects.create_user(email='ws@example.com', password='pass', username='ws')
+        self.conversation = Conversation.objects.create(created_by=self.user)
+        self.participant = ConversationParticipant.objects.create(
+            conversation=self.conversation, user=self.user
+        )
+
+    def test_membership_cache_is_invalidated_on_removal(self):
+        from asgiref.sync import async_to_sync
+        from .chat_access import user_in_conversation
+
+        check = async_to_sync(user_in_conversation)
+        self.assertTrue(check(self.user.id, self.conversation.id))
+        self.participant.delete()
+        self.assertFalse(check(self.user.id, self.conversation.id))
+
+    def test_saturated_worker_closes_handshake_with_1013(self):
+        from asgiref.sync import async_to_sync
+        from unittest import mock
+        from liberty_social.auth import JWTAuthMiddleware
+        from liberty_social.ws_admission import HandshakeAdmission
+
+        admission = HandshakeAdmission(limit=1, timeout=0.01)
+
+        async def run():
+            await admission.acquire()  # occupy the only slot
+            sent = []
+
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+
+            middleware = JWTAuthMiddleware(inner=mock.AsyncMock())
+            with mock.patch('liberty_social.auth.get_admission', return_value=admission):
+                await middleware({'type': 'websocket', 'headers': []}, receive, send)
+            return sent, middleware.inner
+
+        sent, inner = async_to_sync(run)()
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 1013}])
+        inner.assert_not_called()
+        self.assertEqual(admission.metrics()['rejected'], 1)
+
+    def test_cached_handshakes_still_check_revocation_and_is_active(self):
+        import hashlib
+
+        import fakeredis
+        from asgiref.sync import async_to_sync
+        from unittest import mock
+        from django.core.cache import cache
+        from rest_framework_simplejwt.tokens import AccessToken
+        from liberty_social.auth import JWTAuthMiddleware
+        from users import token_denylist
+
+        token = AccessToken.for_user(self.user)
+        middleware = JWTAuthMiddleware(inner=mock.AsyncMock())
+        get_user = async_to_sync(middleware._get_user)
+        with mock.patch.object(token_denylist, '_client', fakeredis.FakeRedis()), \
+                mock.patch.object(token_denylist, '_unavailable_until', 0.0):
+            self.assertEqual(get_user(str(token)), self.user)
+            cached = cache.get(f'ws:auth:{hashlib.sha256(str(token).encode()).hexdigest()}')
+            self.assertEqual(cached, {'user_id': str(self.user.id), 'jti': token['jti']})
+
+            User.objects.filter(id=self.user.id).update(is_active=False)
+            self.assertIsNone(get_user(str(token)))
+            User.objects.filter(id=self.user.id).update(is_active=True)
+            self.assertEqual(get_user(str(token)), self.user)
+
+            token_denylist.deny_token(token)
+            self.assertIsNone(get_user(str(token)))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MultiplexConsumerTests(TestCase):
+    def setUp(self):
+        from .models import Conversation, ConversationParticipant
+
+        self.user = User.objects.create_user(email='mux@example.com', password='pass', username='mux')
+        self.conversation = Conversation.objects.create(created_by=self.user)
+        self.other_conversation = Conversation.objects.create(created_by=self.user)
+        ConversationParticipant.objects.create(conversation=self.conversation, user=self.user)
+
+    def test_topics_share_one_socket_and_keep_event_types(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from channels.testing import WebsocketCommunicator
+        from .consumers import MultiplexConsumer
+        from .realtime import notification_group_name
+
+        topic = f'conversation:{self.conversation.id}'
+
+        async def run():
+            communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), '/ws/stream/')
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()
+
+            await communicator.send_json_to({'type': 'subscribe', 'topic': topic})
+            ack = await communicator.receive_json_from()
+            await communicator.send_json_to(
+                {'type': 'subscribe', 'topic': f'conversation:{self.other_conversation.id}'}
+            )
+            denied = await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'subscribe', 'topic': 'notifications'})
+            await communicator.receive_json_from()
+
+            await get_channel_layer().group_send(
+                notification_group_name(str(self.user.id)),
+                {'type': 'notification.created', 'data': {'id': 1}},
+            )
+            notification = await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'typing.start', 'topic': topic})
+            typing = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return ack, denied, notification, typing
+
+        ack, denied, notification, typing = async_to_sync(run)()
+        self.assertEqual(ack['topic'], topic)
+        self.assertEqual(denied['code'], 4403)
+        self.assertEqual(
+            notification,
+            {'type': 'notification.created', 'payload': {'id': 1}, 'topic': 'notifications'},
+        )
+        self.assertEqual(typing['type'], 'typing.started')
+        self.assertEqual(typing['topic'], topic)
+
+    def test_topics_are_routed_by_group_on_one_channel(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from channels.testing import WebsocketCommunicator
+        from .consumers import MultiplexConsumer
+        from .models import ConversationParticipant
+        from .realtime import conversation_group_name, notification_group_name
+        from .realtime_outbox import encode_batch
+
+        ConversationParticipant.objects.create(conversation=self.other_conversation, user=self.user)
+        first = f'conversation:{self.conversation.id}'
+        second = f'conversation:{self.other_conversation.id}'
+        second_group = conversation_group_name(str(self.other_conversation.id))
+        notifications_group = notification_group_name(str(self.user.id))
+
+        async def run():
+            layer = get_channel_layer()
+            communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), '/ws/stream/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.receive_json_from()
+            for topic in (first, second, 'notifications'):
+                await communicator.send_json_to({'type': 'subscribe', 'topic': topic})
+                await communicator.receive_json_from()
+            channels = set()
+            for group in (conversation_group_name(str(self.conversation.id)), second_group, notifications_group):
+                channels.update(layer.groups[group])
+
+            await layer.group_send(
+                notifications_group,
+                {'type': 'call_end', 'group': notifications_group, 'call_id': '7', 'user_id': '2'},
+            )
+            call_end = await communicator.receive_json_from()
+            event = {'type': 'chat.message', 'data': {'id': 3}}
+            await layer.group_send(second_group, encode_batch(second_group, [event]))
+            message = await communicator.receive_json_from()
+            nothing_else = await communicator.receive_nothing()
+            await communicator.disconnect()
+            return channels, call_end, message, nothing_else
+
+        channels, call_end, message, nothing_else = async_to_sync(run)()
+        self.assertEqual(len(channels), 1)
+        self.assertEqual(call_end['topic'], 'notifications')
+        self.assertEqual(message, {'type': 'message.created', 'payload': {'id': 3}, 'topic': second})
+        self.assertTrue(nothing_else)
+
+
+class WsLoadTestTests(TestCase):
+    def setUp(self):
+        import fakeredis
+        from unittest import mock
+        from users import token_denylist
+
+        for patcher in (
+            mock.patch.object(token_denylist, '_client', fakeredis.FakeRedis()),
+            mock.patch.object(token_denylist, '_unavailable_until', 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_command_refuses_db_writes_without_debug(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        with self.assertRaisesMessage(CommandError, '--allow-db-writes'):
+            call_command('ws_loadtest', clients=2)
+        self.assertFalse(User.objects.filter(email__startswith='loadtest-').exists())
+
+    def test_run_reports_connections_and_fanout(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        report_path = os.path.join(tempfile.mkdtemp(), 'report.json')
+        self.addCleanup(os.remove, report_path)
+        call_command(
+            'ws_loadtest', clients=4, group_size=2, messages=2, no_calls=True,
+            drain_timeout=5, allow_db_writes=True, json_path=report_path, stdout=StringIO(),
+        )
+        with open(report_path) as fh:
+            report = json.load(fh)
+
+        self.assertEqual(
+            set(report),
+            {'clients', 'conversations', 'sockets', 'topics', 'format', 'connect', 'memory',
+             'fanout', 'events_delivered', 'channel_layer'},
+        )
+        self.assertEqual(report['channel_layer'], 'channels.layers.InMemoryChannelLayer')
+        self.assertEqual(report['connect']['connections'], 4)
+        self.assertEqual(report['connect']['failed'], 0)
+        self.assertEqual(report['fanout']['messages'], 4)
+        self.assertEqual(report['fanout']['expected_deliveries'], 8)
+        self.assertEqual(report['fanout']['delivered'], 8)
+        self.assertEqual(report['events_delivered']['message.created'], 8)
+        self.assertFalse(User.objects.filter(email__startswith='loadtest-').exists())
+
+
+class TypingStateTests(TestCase):
+    def test_tracker_coalesces_and_expires(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from .typing_state import TypingTracker
+
+        async def run():
+            emitted = []
+
+            async def emit(is_typing):
+                emitted.append(is_typing)
+
+            tracker = TypingTracker(emit, interval=0.05, ttl=0.2)
+            await tracker.start()
+            await tracker.start()
+            await tracker.stop()
+            await tracker.start()  # stop/start flap inside the interval is dropped
+            await asyncio.sleep(0.08)
+            snapshot = list(emitted)
+            await asyncio.sleep(0.25)  # no refresh: state expires
+            await tracker.close()
+            return snapshot, emitted
+
+        snapshot, emitted = async_to_sync(run)()
+        self.assertEqual(snapshot, [True])
+        self.assertEqual(emitted, [True, False])
+
+    def test_aggregator_summarises_typists(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from .typing_state import TypingAggregator
+
+        async def run():
+            sent = []
+
+            async def send(content):
+                sent.append(content)
+
+            aggregator = TypingAggregator(send, exclude_user_id='me', interval=0.05, ttl=1)
+            for user_id in ('me', 'a', 'b', 'c', 'd'):
+                aggregator.update(user_id, user_id.upper(), True)
+            await asyncio.sleep(0.02)
+            aggregator.close()
+            return sent
+
+        sent = async_to_sync(run)()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]['type'], 'typing.summary')
+        self.assertEqual(sent[0]['count'], 4)
+        self.assertEqual(len(sent[0]['users']), 3)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(email='alice@example.com', password='pass', username='alice')
+        self.bob = User.objects.create_user(email='bob@example.com', password='pass', username='bob')
+
+    def _conversation(self):
+        from .models import Conversation, ConversationParticipant
+
+        conversation = Conversation.objects.create(created_by=self.alice)
+        ConversationParticipant.objects.bulk_create(
+            [
+                ConversationParticipant(conversation=conversation, user=self.alice),
+                ConversationParticipant(conversation=conversation, user=self.bob),
+            ]
+        )
+        return conversation
+
+    def _send(self, conversation, content):
+        self.client.force_authenticate(user=self.alice)
+        resp = self.client.post(
+            f'/api/conversations/{conversation.id}/messages/', {'content': content}, format='json'
+        )
+        self.assertEqual(resp.status_code, 201)
+        return resp.data['id']
+
+    def test_unread_counts_and_last_message_are_maintained(self):
+        conversation = self._conversation()
+        self._send(conversation, 'one')
+        last_id = self._send(conversation, 'two')
+
+        self.client.force_authenticate(user=self.bob)
+        resp = self.client.get('/api/conversations/')
+        self.assertEqual(resp.status_code, 200)
+        row = resp.data['results'][0]
+        self.assertEqual(row['unread_count'], 2)
+        self.assertEqual(row['last_message']['id'], last_id)
+
+        self.client.post(f'/api/conversations/{conversation.id}/mark-read/')
+        resp = self.client.get('/api/conversations/')
+        self.assertEqual(resp.data['results'][0]['unread_count'], 0)
+
+    def test_inbox_query_count_is_constant_and_keyset_paginated(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for index in range(3):
+            self._send(self._conversation(), f'hello {index}')
+        self.client.force_authenticate(user=self.bob)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/conversations/')
+
+        for index in range(6):
+            self._send(self._conversation(), f'hello again {index}')
+        self.client.force_authenticate(user=self.bob)
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.get('/api/conversations/?page_size=5')
+        self.assertEqual(len(small), len(large))
+
+        seen = [row['id'] for row in resp.data['results']]
+        resp = self.client.get(resp.data['next'])
+        seen += [row['id'] for row in resp.data['results']]
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(len(set(seen)), 9)
+
+
+class ListingViewCounterTests(TestCase):
+    def setUp(self):
+        from .marketplace_models import MarketplaceListing
+
+        self.seller = User.objects.create_user(email='seller@example.com', password='pass', username='seller')
+        self.listings = [
+            MarketplaceListing.objects.create(
+                seller=self.seller, title=f'Lamp {i}', description='Desk lamp', price='10.00', status='active'
+            )
+            for i in range(3)
+        ]
+
+    def test_flush_applies_deltas_in_one_update(self):
+        from .view_counter import _apply
+
+        deltas = {str(self.listings[0].pk): 5, str(self.listings[2].pk): 2}
+        with self.assertNumQueries(1):
+            updated = _apply('marketplace', deltas)
+        self.assertEqual(updated, 2)
+        for listing in self.listings:
+            listing.refresh_from_db()
+        self.assertEqual([listing.views_count for listing in self.listings], [5, 0, 2])
+
+    def test_view_falls_back_to_direct_increment_without_redis(self):
+        import redis
+
+        from . import view_counter
+
+        listing = self.listings[1]
+        view_counter._client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        try:
+            client = APIClient()
+            client.force_authenticate(user=self.seller)
+            resp = client.post(f'/api/marketplace/listings/{listing.pk}/view/')
+        finally:
+            view_counter._client = None
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['views_count'], 1)
+        listing.refresh_from_db()
+        self.assertEqual(listing.views_count, 1)
+
+
+class TrendingListingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .marketplace_models import MarketplaceListing
+
+        cache.clear()
+        self.seller = User.objects.create_user(email='trend@example.com', password='pass', username='trend')
+        self.buyers = [
+            User.objects.create_user(email=f'buyer{i}@example.com', password='pass', username=f'buyer{i}')
+            for i in range(2)
+        ]
+        self.saved, self.offered, self.stale = [
+            MarketplaceListing.objects.create(
+                seller=self.seller, title=title, description='Item', price='5.00', status='active'
+            )
+            for title in ('Saved', 'Offered', 'Stale')
+        ]
+
+    def test_rebuild_ranks_by_decayed_engagement(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .marketplace_models import MarketplaceOffer, MarketplaceSave
+        from .trending import rebuild_trending
+
+        MarketplaceSave.objects.create(user=self.buyers[0], listing=self.saved)
+        for buyer in self.buyers:
+            # Both offers and saves on one listing must not multiply each other.
+            MarketplaceOffer.objects.create(listing=self.offered, buyer=buyer, offered_price='4.00')
+        MarketplaceSave.objects.create(user=self.buyers[1], listing=self.offered)
+        old_save = MarketplaceSave.objects.create(user=self.buyers[0], listing=self.stale)
+        MarketplaceSave.objects.filter(pk=old_save.pk).update(created_at=timezone.now() - timedelta(days=5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rebuild_trending()
+        self.assertEqual(result['stored'], 3)
+
+        client = APIClient()
+        client.force_authenticate(user=self.seller)
+        resp = client.get('/api/marketplace/listings/trending/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in resp.data], [self.offered.pk, self.saved.pk, self.stale.pk]
+        )
+
+        self.saved.status = 'sold'
+        self.saved.save(update_fields=['status'])
+        resp = client.get('/api/marketplace/listings/trending/')
+        self.assertEqual([item['id'] for item in resp.data], [self.offered.pk, self.stale.pk])
+
+
+class AnimalRiskScoreTests(TestCase):
+    def setUp(self):
+        from .animal_models import AnimalListing
+
+        self.seller = User.objects.create_user(email='breeder@example.com', password='pass', username='breeder')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing = AnimalListing.objects.create(
+                seller=self.seller,
+                title='Corgi puppy',
+                description='Friendly',
+                location='Austin',
+                state_code='TX',
+                price='400.00',
+                status='active',
+            )
+
+    def test_score_is_maintained_and_filterable(self):
+        from .animal_models import AnimalListingMedia
+
+        self.listing.refresh_from_db()
+        # No media, unverified seller, paid without vet docs, new seller.
+        self.assertEqual(self.listing.risk_score, 55)
+        self.assertEqual(self.listing.risk_score, self.listing.get_risk_score())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnimalListingMedia.objects.create(listing=self.listing, url='https://example.com/a.jpg')
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.risk_score, 40)
+
+        client = APIClient()
+        resp = client.get('/api/animals/listings/?risk_score_max=45')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([item['risk_score'] for item in resp.data['results']], [40])
+        resp = client.get('/api/animals/listings/?risk_score_min=50')
+        self.assertEqual(resp.data['results'], [])
+
+    def test_recompute_command_refreshes_stale_scores(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from .animal_models import AnimalListing
+
+        AnimalListing.objects.filter(pk=self.listing.pk).update(risk_score=0)
+        out = StringIO()
+        call_command('recompute_risk_scores', stdout=out)
+        self.assertIn('updated 1', out.getvalue())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.risk_score, 55)
+
+
+class SellerStatsTests(TestCase):
+    def setUp(self):
+        from .animal_models import AnimalListing
+
+        self.seller = User.objects.create_user(email='kennel@example.com', password='pass', username='kennel')
+        self.buyers = [
+            User.objects.create_user(email=f'owner{i}@example.com', password='pass', username=f'owner{i}')
+            for i in range(2)
+        ]
+        self.listing = AnimalListing.objects.create(
+            seller=self.seller, title='Beagle', description='Calm', location='Reno', state_code='NV', status='active'
+        )
+
+    def test_counters_follow_reviews_and_sales(self):
+        from .animal_models import SellerReview, SellerStats
+        from .seller_stats import rebuild_seller_stats
+
+        self.listing.status = 'sold'
+        self.listing.save()
+        first = SellerReview.objects.create(listing=self.listing, buyer=self.buyers[0], seller=self.seller, rating=5)
+        SellerReview.objects.create(listing=self.listing, buyer=self.buyers[1], seller=self.seller, rating=3)
+        first = SellerReview.objects.get(pk=first.pk)
+        first.rating = 4
+        first.save()
+
+        stats = SellerStats.objects.get(seller=self.seller)
+        self.assertEqual((stats.sold_count, stats.review_count, stats.rating_sum), (1, 2, 7))
+        self.assertEqual(stats.rating_histogram, {1: 0, 2: 0, 3: 1, 4: 1, 5: 0})
+        self.assertEqual(stats.average_rating, 3.5)
+
+        client = APIClient()
+        client.force_authenticate(user=self.buyers[0])
+        resp = client.get(f'/api/animals/listings/{self.listing.pk}/seller_profile/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['listings_sold'], 1)
+        self.assertEqual(resp.data['review_count'], 2)
+        self.assertEqual(resp.data['average_rating'], 3.5)
+
+        resp = client.get(f'/api/animals/listings/{self.listing.pk}/')
+        self.assertEqual(resp.data['seller_rating'], 3.5)
+
+        first.delete()
+        self.listing.status = 'active'
+        self.listing.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.sold_count, stats.review_count, stats.rating_sum), (0, 1, 3))
+
+        SellerStats.objects.all().delete()
+        rebuild_seller_stats()
+        rebuilt = SellerStats.objects.get(seller=self.seller)
+        self.assertEqual((rebuilt.sold_count, rebuilt.review_count, rebuilt.rating_3), (0, 1, 1))
+
+
+class MarketplaceSoldItemsTests(TestCase):
+    # Count, page, and one query per prefetch; independent of the page size.
+    QUERY_BUDGET = 8
+
+    def setUp(self):
+        self.seller = User.objects.create_user(email='seller@example.com', password='pass', username='seller')
+        self.client = APIClient()
+
+    def _sell(self, count):
+        from django.contrib.contenttypes.models import ContentType
+        from django.utils import timezone
+
+        from .marketplace_models import MarketplaceListing, MarketplaceListingMedia, MarketplaceOffer
+        from .models import Reaction
+
+        start = MarketplaceListing.objects.count()
+        for index in range(start, start + count):
+            buyer = User.objects.create_user(
+                email=f'shopper{index}@example.com', password='pass', username=f'shopper{index}'
+            )
+            listing = MarketplaceListing.objects.create(
+                seller=self.seller, title=f'Chair {index}', description='Oak', price='20.00',
+                status='sold', sold_at=timezone.now(),
+            )
+            MarketplaceListingMedia.objects.create(listing=listing, url=f'https://cdn.example.com/{index}.jpg')
+            Reaction.objects.create(
+                content_type=ContentType.objects.get_for_model(MarketplaceListing),
+                object_id=listing.pk,
+                user=buyer,
+                reaction_type='like',
+            )
+            MarketplaceOffer.objects.create(listing=listing, buyer=buyer, offered_price='18.00', status='accepted')
+
+    def _queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(user=self.seller)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(queries)
+
+    def test_sold_items_query_count_is_constant(self):
+        self._sell(1)
+        _, small = self._queries('/api/marketplace/listings/sold_items/')
+        self._sell(5)
+        resp, large = self._queries('/api/marketplace/listings/sold_items/')
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.QUERY_BUDGET)
+        self.assertEqual(resp.data['count'], 6)
+        item = resp.data['results'][0]
+        self.assertEqual(item['sold_price'], '18.00')
+        self.assertEqual(item['sold_to']['username'], 'shopper5')
+        self.assertEqual(item['offer']['listing']['id'], item['listing']['id'])
+        self.assertEqual(len(item['listing']['reactions']), 1)
+
+    def test_offer_history_query_count_is_constant(self):
+        self._sell(1)
+        _, small = self._queries('/api/marketplace/offers/')
+        self._sell(5)
+        resp, large = self._queries('/api/marketplace/offers/')
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.QUERY_BUDGET)
+        self.assertEqual(resp.data['count'], 6)
+        self.assertFalse(resp.data['results'][0]['listing']['is_saved'])
+
+
+def start_test_bucket(test):
+    """Point main.s3 at an in-memory moto bucket for the duration of ``test``."""
+    import os
+    from unittest import mock
+
+    from moto import mock_aws  # requirements-dev.txt
+
+    from . import s3
+
+    env = mock.patch.dict(os.environ, {
+        'AWS_STORAGE_BUCKET_NAME': 'liberty-test',
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_REGION': 'us-east-1',
+    })
+    env.start()
+    test.addCleanup(env.stop)
+    aws = mock_aws()
+    aws.start()
+    test.addCleanup(aws.stop)
+    s3._client = None
+    test.addCleanup(setattr, s3, '_client', None)
+    s3.get_client().create_bucket(Bucket='liberty-test')
+
+
+def put_test_photo(key, size=(640, 360), exif_text='', quality=90):
+    """Upload a public JPEG (gradient plus ellipse) to the test bucket; returns its URL."""
+    import io
+
+    from PIL import Image, ImageDraw
+
+    from . import s3
+
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((size[0] // 6, size[1] // 6, size[0] // 2, size[1] * 5 // 6), fill=(180, 120, 60))
+    exif = Image.Exif()
+    if exif_text:
+        exif[0x8298] = exif_text  # Copyright
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, exif=exif)
+    return s3.put_object(key, buffer.getvalue(), 'image/jpeg')
+
+
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        start_test_bucket(self)
+        self.user = User.objects.create_user(email='uploader@example.com', password='pass', username='uploader')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _presign(self, **spec):
+        resp = self.client.post('/api/uploads/presign/', {'files': [spec]}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data['items'][0]
+
+    def _post_to_bucket(self, item, body, content_type):
+        import requests
+
+        fields = dict(item['upload']['fields'], **{'Content-Type': content_type})
+        return requests.post(item['upload']['url'], data=fields, files={'file': ('photo', body)})
+
+    def test_presigned_upload_is_finalized(self):
+        item = self._presign(name='cat photo.jpg', content_type='image/jpeg', size=4)
+        self.assertTrue(item['key'].startswith(f'uploads/{self.user.pk}/'))
+        self.assertLess(self._post_to_bucket(item, b'\xff\xd8ok', 'image/jpeg').status_code, 300)
+
+        resp = self.client.post('/api/uploads/complete/', {'tokens': [item['token']]}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertTrue(resp.data['url'].endswith(item['key']))
+        self.assertEqual(resp.data['items'][0]['size'], 4)
+
+        other = User.objects.create_user(email='other@example.com', password='pass', username='other')
+        self.client.force_authenticate(user=other)
+        resp = self.client.post('/api/uploads/complete/', {'token': item['token']}, format='json')
+        self.assertEqual(resp.status_code, 403)
+
+    def test_mismatched_or_missing_objects_are_rejected(self):
+        from . import s3
+
+        self.assertEqual(
+            self.client.post(
+                '/api/uploads/presign/', {'name': 'x.exe', 'content_type': 'application/x-msdownload'}, format='json'
+            ).status_code,
+            400,
+        )
+
+        missing = self._presign(name='a.png', content_type='image/png', size=10)
+        resp = self.client.post('/api/uploads/complete/', {'token': missing['token']}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+        # An object written outside the POST policy with the wrong type is deleted.
+        item = self._presign(name='b.png', content_type='image/png', size=10)
+        s3.get_client().put_object(Bucket='liberty-test', Key=item['key'], Body=b'<html>', ContentType='text/html')
+        resp = self.client.post('/api/uploads/complete/', {'token': item['token']}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIsNone(s3.head_object(item['key']))
+
+    def test_server_side_batch_uses_shared_client(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from . import s3
+
+        files = [SimpleUploadedFile(f'p{i}.png', b'png', content_type='image/png') for i in range(3)]
+        resp = self.client.post('/api/uploads/images/', {'files': files}, format='multipart')
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual([item['name'] for item in resp.data['items']], ['p0.png', 'p1.png', 'p2.png'])
+        client = s3.get_client()
+        listed = client.list_objects_v2(Bucket='liberty-test', Prefix='uploads/')
+        self.assertEqual(listed['KeyCount'], 3)
+        self.assertIs(s3.get_client(), client)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        start_test_bucket(self)
+        from .marketplace_models import MarketplaceListing
+
+        self.seller = User.objects.create_user(email='photos@example.com', password='pass', username='photos')
+        self.listing = MarketplaceListing.objects.create(
+            seller=self.seller, title='Bike', description='Red', price='50.00', status='active'
+        )
+
+    def _upload_png(self, width, height):
+        import io
+
+        from PIL import Image
+
+        from . import s3
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, format='PNG')
+        return s3.put_object(f'uploads/{width}x{height}.png', buffer.getvalue(), 'image/png')
+
+    def test_upload_is_rendered_and_exposed(self):
+        from .image_derivatives import generate
+        from .marketplace_models import MarketplaceListingMedia
+        from . import s3
+
+        url = self._upload_png(800, 600)
+        with self.captureOnCommitCallbacks() as callbacks:
+            media = MarketplaceListingMedia.objects.create(listing=self.listing, url=url)
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(generate('marketplace', media.pk), 'recorded')
+        media.refresh_from_db()
+        self.assertEqual(media.variants['source'], url)
+        self.assertEqual((media.variants['width'], media.variants['height']), (800, 600))
+        self.assertEqual([size['width'] for size in media.variants['sizes']], [160, 320, 640])
+        self.assertEqual(media.variants['sizes'][0]['height'], 120)
+        self.assertTrue(media.blurhash)
+        webp_key = s3.key_for_url(media.variants['sizes'][0]['webp'])
+        self.assertEqual(s3.head_object(webp_key)[1], 'image/webp')
+
+        # Saving again with current renditions schedules nothing.
+        with self.captureOnCommitCallbacks() as callbacks:
+            media.save()
+        self.assertEqual(callbacks, [])
+
+        client = APIClient()
+        client.force_authenticate(user=self.seller)
+        resp = client.get(f'/api/marketplace/listings/{self.listing.pk}/')
+        self.assertEqual(resp.data['media'][0]['blurhash'], media.blurhash)
+        self.assertEqual(len(resp.data['media'][0]['variants']['sizes']), 3)
+
+    def test_external_and_non_image_sources_are_not_rendered(self):
+        from .image_derivatives import generate
+        from .marketplace_models import MarketplaceListingMedia
+        from . import s3
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            external = MarketplaceListingMedia.objects.create(
+                listing=self.listing, url='https://elsewhere.example.com/cat.jpg'
+            )
+        self.assertEqual(callbacks, [])
+        self.assertEqual(generate('marketplace', external.pk), 'external')
+
+        url = s3.put_object('uploads/notes.png', b'not an image', 'image/png')
+        broken = MarketplaceListingMedia.objects.create(listing=self.listing, url=url)
+        self.assertEqual(generate('marketplace', broken.pk), 'recorded')
+        broken.refresh_from_db()
+        self.assertEqual(broken.variants, {'source': url})
+
+    def test_profile_picture_variants(self):
+        from .image_derivatives import generate
+
+        from unittest import mock
+
+        url = self._upload_png(100, 100)
+        with mock.patch('main.image_derivatives.schedule') as schedule:
+            self.seller.profile_image_url = url
+            self.seller.save()
+            self.seller.save(update_fields=['last_login'])
+        schedule.assert_called_once_with('profile', self.seller.pk)
+
+        self.assertEqual(generate('profile', self.seller.pk), 'recorded')
+        self.seller.refresh_from_db()
+        # Smaller than the narrowest width: one rendition at the original size.
+        self.assertEqual([size['width'] for size in self.seller.profile_image_variants['sizes']], [100])
+        self.assertTrue(self.seller.profile_image_blurhash)
+
+
+class MediaAnalysisTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .animal_models import AnimalListing
+
+        start_test_bucket(self)
+        cache.clear()
+        self.sellers = [
+            User.objects.create_user(email=f'breeder{i}@example.com', password='pass', username=f'breeder{i}')
+            for i in range(2)
+        ]
+        self.listings = [
+            AnimalListing.objects.create(
+                seller=seller, title='Puppy', description='Playful', location='Austin', state_code='TX', status='active'
+            )
+            for seller in self.sellers
+        ]
+
+    def test_reused_photo_is_flagged_and_analysis_is_cached(self):
+        from unittest import mock
+
+        from . import media_analysis
+        from .animal_models import AnimalListingMedia, ImageFingerprint
+
+        url = put_test_photo('uploads/puppy.jpg')
+        first = AnimalListingMedia.objects.create(listing=self.listings[0], url=url)
+        second = AnimalListingMedia.objects.create(listing=self.listings[1], url=url)
+
+        self.assertFalse(media_analysis.analyze_media('animal', first.pk)['reused'])
+        with mock.patch.object(media_analysis, '_fetch_header', wraps=media_analysis._fetch_header) as fetch:
+            result = media_analysis.analyze_media('animal', second.pk)
+        fetch.assert_not_called()
+        self.assertTrue(result['reused'])
+        self.assertEqual(ImageFingerprint.objects.count(), 1)
+
+        self.listings[1].refresh_from_db()
+        self.assertIn('reused_photo', self.listings[1].scam_flags)
+        self.listings[0].refresh_from_db()
+        self.assertNotIn('reused_photo', self.listings[0].scam_flags)
+
+        # The same picture re-encoded is a new image with a near-identical phash.
+        from .utils.perceptual_hash import hamming
+
+        original = ImageFingerprint.objects.get()
+        copy = media_analysis.fingerprint_for_url(put_test_photo('uploads/puppy-copy.jpg', quality=60))
+        self.assertNotEqual(copy.content_hash, original.content_hash)
+        self.assertLessEqual(hamming(copy.phash, original.phash), 4)
+
+    def test_stock_metadata_is_read_from_the_header(self):
+        from . import media_analysis
+        from .animal_models import AnimalListingMedia
+        from .utils.stock_photo_detector import StockPhotoDetector
+
+        url = put_test_photo('uploads/stock.jpg', size=(1600, 900), exif_text='Shutterstock via iStockphoto')
+        header = media_analysis.read_header(url)
+        self.assertEqual((header['width'], header['height']), (1600, 900))
+        self.assertGreater(StockPhotoDetector.check_image_metadata(url)['confidence'], 0.7)
+
+        media = AnimalListingMedia.objects.create(listing=self.listings[0], url=url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            client = APIClient()
+            client.force_authenticate(user=self.sellers[0])
+            resp = client.post(
+                '/api/animals/media/',
+                {'listing_id': self.listings[0].pk, 'url': url, 'media_type': 'photo'},
+                format='json',
+            )
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertFalse(resp.data['is_stock_photo'])
+        self.assertTrue(callbacks)
+
+        media_analysis.analyze_media('animal', media.pk)
+        media.refresh_from_db()
+        self.assertTrue(media.is_stock_photo)
+        self.listings[0].refresh_from_db()
+        self.assertIn('stock_photo_detected', self.listings[0].scam_flags)
+
+    def test_only_uploaded_images_are_read(self):
+        from unittest import mock
+
+        from . import media_analysis, s3
+        from .animal_models import AnimalListingMedia
+        from .tasks import analyze_listing_media
+
+        internal = AnimalListingMedia.objects.create(
+            listing=self.listings[0], url='http://169.254.169.254/latest/meta-data/'
+        )
+        with mock.patch('requests.Session.request') as request:
+            with self.assertRaises(ValueError):
+                media_analysis.analyze_media('animal', internal.pk)
+        request.assert_not_called()
+
+        garbage = AnimalListingMedia.objects.create(
+            listing=self.listings[0], url=s3.put_object('uploads/not-an-image.jpg', b'plain text', 'image/jpeg')
+        )
+        with self.assertRaises(ValueError):
+            media_analysis.analyze_media('animal', garbage.pk)
+        # Undecodable images are skipped by the task, not retried.
+        self.assertIsNone(analyze_listing_media.apply(args=('animal', garbage.pk)).get())
+
+
+class MultiIndexHashTests(TestCase):
+    def test_multi_index_query_matches_brute_force(self):
+        import random
+
+        from .duplicate_images import MultiIndexHash, near_fingerprints
+        from .animal_models import ImageFingerprint
+        from .utils.perceptual_hash import hamming, to_signed64
+
+        rng = random.Random(7)
+        base = rng.getrandbits(64)
+        hashes = [to_signed64(rng.getrandbits(64)) for _ in range(200)]
+        # Near neighbours of ``base`` with flipped bits spread over all segments.
+        for flips in range(0, 9):
+            value = base
+            for bit in rng.sample(range(64), flips):
+                value ^= 1 << bit
+            hashes.append(to_signed64(value))
+
+        index = MultiIndexHash(6)
+        for key, value in enumerate(hashes):
+            index.add(key, value)
+        expected = {key: hamming(base, value) for key, value in enumerate(hashes) if hamming(base, value) <= 6}
+        self.assertEqual(index.query(base), expected)
+        self.assertGreaterEqual(len(expected), 7)
+
+        stored = {
+            ImageFingerprint.objects.create(content_hash=f'{key:064x}', phash=value, dhash=0).pk: value
+            for key, value in enumerate(hashes)
+        }
+        self.assertEqual(
+            near_fingerprints(base, 6),
+            {pk: hamming(base, value) for pk, value in stored.items() if hamming(base, value) <= 6},
+        )
+
+    def test_flat_images_are_low_detail(self):
+        from PIL import Image
+
+        from .duplicate_images import is_low_detail
+        from .utils.perceptual_hash import dhash, hamming, phash
+
+        grey, white = Image.new('RGB', (64, 64), (128, 128, 128)), Image.new('RGB', (64, 64), 'white')
+        # Different pictures, near-identical pHash: only the detail guard tells them apart.
+        self.assertLessEqual(hamming(phash(grey), phash(white)), 6)
+        self.assertTrue(is_low_detail(dhash(grey)))
+        self.assertTrue(is_low_detail(dhash(white)))
+
+
+class DuplicateImageIndexTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .animal_models import AnimalListing
+        from .marketplace_models import MarketplaceListing
+
+        start_test_bucket(self)
+        cache.clear()
+        self.sellers = [
+            User.objects.create_user(email=f'dup{i}@example.com', password='pass', username=f'dup{i}')
+            for i in range(2)
+        ]
+        self.item = MarketplaceListing.objects.create(
+            seller=self.sellers[0], title='Puppy crate', description='Used', price='40.00', status='active'
+        )
+        self.animal = AnimalListing.objects.create(
+            seller=self.sellers[1], title='Puppy', description='Playful', location='Austin', state_code='TX', status='active'
+        )
+
+    def test_reencoded_photo_on_later_listing_is_flagged(self):
+        from . import media_analysis
+        from .animal_models import AnimalListingMedia
+        from .marketplace_models import MarketplaceListingMedia
+
+        item_photo = MarketplaceListingMedia.objects.create(
+            listing=self.item, url=put_test_photo('uploads/crate.jpg'), content_type='image/jpeg'
+        )
+        animal_photo = AnimalListingMedia.objects.create(
+            listing=self.animal, url=put_test_photo('uploads/crate-copy.jpg', size=(480, 270), quality=60)
+        )
+        self.assertFalse(media_analysis.analyze_media('marketplace', item_photo.pk)['reused'])
+        self.assertTrue(media_analysis.analyze_media('animal', animal_photo.pk)['reused'])
+
+        self.animal.refresh_from_db()
+        self.assertIn('reused_photo', self.animal.scam_flags)
+        self.item.refresh_from_db()
+        self.assertFalse(self.item.is_flagged)
+
+    def test_blank_photos_are_not_matched(self):
+        import io
+
+        from PIL import Image
+
+        from . import media_analysis, s3
+        from .animal_models import AnimalListingMedia
+        from .marketplace_models import MarketplaceListingMedia
+
+        def blank(key, colour):
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 360), colour).save(buffer, format='JPEG')
+            return s3.put_object(key, buffer.getvalue(), 'image/jpeg')
+
+        item_photo = MarketplaceListingMedia.objects.create(
+            listing=self.item, url=blank('uploads/grey.jpg', (128, 128, 128)), content_type='image/jpeg'
+        )
+        animal_photo = AnimalListingMedia.objects.create(
+            listing=self.animal, url=blank('uploads/white.jpg', 'white')
+        )
+        media_analysis.analyze_media('marketplace', item_photo.pk)
+        self.assertFalse(media_analysis.analyze_media('animal', animal_photo.pk)['reused'])
+        self.animal.refresh_from_db()
+        self.assertNotIn('reused_photo', self.animal.scam_flags)
+
+    def test_rebuild_flags_only_the_later_listing(self):
+        import io
+
+        from django.core.management import call_command
+
+        from . import media_analysis
+        from .animal_models import AnimalListingMedia, ImageFingerprint
+        from .marketplace_models import MarketplaceListing, MarketplaceListingMedia
+
+        url = put_test_photo('uploads/shared.jpg')
+        first = AnimalListingMedia.objects.create(listing=self.animal, url=url)
+        media_analysis.analyze_media('animal', first.pk)
+        # Created later by another seller, but never analyzed online.
+        later = MarketplaceListing.objects.create(
+            seller=self.sellers[0], title='Crate', description='New', price='45.00', status='active'
+        )
+        MarketplaceListingMedia.objects.create(
+            listing=later, url=url, fingerprint=ImageFingerprint.objects.get()
+        )
+        # Rows written without their segments are repaired by the rebuild.
+        ImageFingerprint.objects.update(phash_0=0, phash_1=0, phash_2=0, phash_3=0)
+
+        call_command('rebuild_duplicate_image_index', stdout=io.StringIO())
+
+        later.refresh_from_db()
+        self.assertTrue(later.is_flagged)
+        self.animal.refresh_from_db()
+        self.assertNotIn('reused_photo', self.animal.scam_flags)
+        self.assertFalse(self.item.is_flagged)
+        self.assertEqual(
+            ImageFingerprint.objects.get().phash_0, ImageFingerprint.objects.get().phash & 0xFFFF
+        )
@@ -0,0 +1,149 @@
+"""
+Precomputed trending marketplace listings.
+
+``rebuild_trending`` runs on a schedule (beat: ``main.tasks.rebuild_trending_listings``)
+and stores one ``TrendingScore`` per active listing with recent engagement.
+The score is the sum of weighted engagement events, each decayed
+exponentially by its age with a half-life of ``TRENDING_HALF_LIFE_HOURS``:
+
+    score = sum(weight(event) * 0.5 ** (age_hours / half_life))
+
+Only events from the last ``TRENDING_WINDOW_DAYS`` are counted:
+
+- saves and offers, each at its ``created_at``;
+- reactions on the listing, at their ``created_at``.
+
+Views carry no timestamps, so the buffered ``views_count`` counts as
+views at the listing's creation time.
+
+Each event type is read as a flat ``(listing_id, created_at)`` scan rather
+than joined, so a listing with many saves and offers is not inflated by a
+cross product. Rankings per category and overall are then read from the
+``(category, -score)`` and ``(-score)`` indexes.
+
+``trending_listing_ids`` caches each ranked page of ids for
+``TRENDING_PAGE_CACHE_TTL`` seconds. The cache key carries a version that
+every rebuild bumps, so a new ranking is served as soon as it is stored.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .marketplace_models import (
+    MarketplaceListing,
+    MarketplaceOffer,
+    MarketplaceSave,
+    TrendingScore,
+)
+from .models import Reaction
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS = {
+    "view": 0.1,
+    "reaction": 1.0,
+    "save": 3.0,
+    "offer": 5.0,
+}
+
+VERSION_KEY = "trending:marketplace:version"
+CHUNK_SIZE = 1000
+
+
+def _decay(now, half_life_seconds: float):
+    def factor(created_at) -> float:
+        age = max((now - created_at).total_seconds(), 0.0)
+        return 0.5 ** (age / half_life_seconds)
+
+    return factor
+
+
+def compute_scores(now=None) -> Dict[int, float]:
+    """Decayed engagement score per listing id (active or not)."""
+    now = now or timezone.now()
+    since = now - timedelta(days=getattr(settings, "TRENDING_WINDOW_DAYS", 7))
+    decay = _decay(now, getattr(settings, "TRENDING_HALF_LIFE_HOURS", 24) * 3600)
+    scores: Dict[int, float] = defaultdict(float)
+
+    sources = (
+        ("save", MarketplaceSave.objects.values_list("listing_id", "created_at")),
+        ("offer", MarketplaceOffer.objects.values_list("listing_id", "created_at")),
+        (
+            "reaction",
+            Reaction.objects.filter(
+                content_type=ContentType.objects.get_for_model(MarketplaceListing)
+            ).values_list("object_id", "created_at"),
+        ),
+    )
+    for kind, rows in sources:
+        weight = WEIGHTS[kind]
+        for listing_id, created_at in rows.filter(created_at__gte=since).iterator(
+            chunk_size=CHUNK_SIZE
+        ):
+            scores[listing_id] += weight * decay(created_at)
+
+    recent = MarketplaceListing.objects.filter(created_at__gte=since, views_count__gt=0)
+    for listing_id, views, created_at in recent.values_list(
+        "id", "views_count", "created_at"
+    ).iterator(chunk_size=CHUNK_SIZE):
+        scores[listing_id] += WEIGHTS["view"] * views * decay(created_at)
+    return scores
+
+
+def rebuild_trending(now=None) -> Dict[str, int]:
+    """Replace the stored scores with a fresh ranking; returns run counters."""
+    now = now or timezone.now()
+    scores = compute_scores(now)
+    ids = [listing_id for listing_id, score in scores.items() if score > 0]
+
+    rows = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        active = MarketplaceListing.objects.filter(
+            pk__in=ids[start : start + CHUNK_SIZE], status="active"
+        ).values_list("id", "category_id")
+        rows.extend(
+            TrendingScore(
+                listing_id=listing_id,
+                category_id=category_id,
+                score=scores[listing_id],
+                computed_at=now,
+            )
+            for listing_id, category_id in active
+        )
+
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+        transaction.on_commit(_bump_version)
+    result = {"scored": len(scores), "stored": len(rows)}
+    logger.info("Trending listings rebuilt: %s", result)
+    return result
+
+
+def _bump_version() -> None:
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def trending_listing_ids(category_slug: Optional[str] = None, limit: int = 20) -> List[int]:
+    """Top ``limit`` listing ids overall or within a category, cached per version."""
+    version = cache.get(VERSION_KEY, 0)
+    key = f"trending:marketplace:{version}:{category_slug or '*'}:{limit}"
+    ids = cache.get(key)
+    if ids is None:
+        ranked = TrendingScore.objects.order_by("-score")
+        if category_slug:
+            ranked = ranked.filter(category__slug=category_slug)
+        ids = list(ranked.values_list("listing_id", flat=True)[:limit])
+        cache.set(key, ids, timeout=getattr(settings, "TRENDING_PAGE_CACHE_TTL", 300))
+    return ids
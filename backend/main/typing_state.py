@@ -0,0 +1,191 @@
+"""
+Server-side typing-indicator state for chat sockets.
+
+``TypingTracker`` sits on the typist's socket and turns the client's raw
+``typing.start``/``typing.stop`` frames into group broadcasts: repeated
+starts are coalesced, a start/stop flap inside ``TYPING_EVENT_INTERVAL``
+produces no traffic at all, at most one event per user is broadcast per
+interval, and typing state that is not refreshed within ``TYPING_STATE_TTL``
+expires with a ``typing.stopped``.
+
+``TypingAggregator`` sits on receiving sockets of conversations with at least
+``TYPING_AGGREGATE_THRESHOLD`` participants and replaces per-user events with
+a throttled ``typing.summary`` ("N people are typing").
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_USER_LIMIT = 3
+
+
+def typing_event_interval() -> float:
+    return getattr(settings, "TYPING_EVENT_INTERVAL", 3.0)
+
+
+def typing_state_ttl() -> float:
+    return getattr(settings, "TYPING_STATE_TTL", 6.0)
+
+
+def typing_aggregate_threshold() -> int:
+    return getattr(settings, "TYPING_AGGREGATE_THRESHOLD", 10)
+
+
+def _run_later(delay: float, callback: Callable[[], Awaitable[None]]) -> asyncio.TimerHandle:
+    def fire():
+        task = asyncio.ensure_future(callback())
+        task.add_done_callback(_log_failure)
+
+    return asyncio.get_running_loop().call_later(max(delay, 0), fire)
+
+
+def _log_failure(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception():
+        logger.error("Typing state callback failed", exc_info=task.exception())
+
+
+class TypingTracker:
+    """Coalesces one socket's typing frames into rate-limited broadcasts."""
+
+    def __init__(
+        self,
+        emit: Callable[[bool], Awaitable[None]],
+        interval: Optional[float] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.emit = emit
+        self.interval = typing_event_interval() if interval is None else interval
+        self.ttl = typing_state_ttl() if ttl is None else ttl
+        self.typing = False
+        self.broadcast_state = False
+        self.last_emit: Optional[float] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._expire_handle: Optional[asyncio.TimerHandle] = None
+
+    async def start(self) -> None:
+        self.typing = True
+        if self._expire_handle:
+            self._expire_handle.cancel()
+        self._expire_handle = _run_later(self.ttl, self.stop)
+        await self._sync()
+
+    async def stop(self) -> None:
+        self.typing = False
+        if self._expire_handle:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+        await self._sync()
+
+    async def close(self) -> None:
+        """Cancel timers and clear any typing state receivers still see."""
+        for handle in (self._flush_handle, self._expire_handle):
+            if handle:
+                handle.cancel()
+        self._flush_handle = self._expire_handle = None
+        self.typing = False
+        if self.broadcast_state:
+            await self._emit()
+
+    def _refresh_due(self, now: float) -> bool:
+        # Receivers expire typists after the TTL, so long typing runs re-announce.
+        refresh_every = max(self.interval, self.ttl / 2)
+        return self.typing and (self.last_emit is None or now - self.last_emit >= refresh_every)
+
+    async def _sync(self) -> None:
+        now = asyncio.get_running_loop().time()
+        if self.typing == self.broadcast_state and not self._refresh_due(now):
+            return
+        if self.last_emit is not None:
+            wait = self.last_emit + self.interval - now
+            if wait > 0:
+                if self._flush_handle is None:
+                    self._flush_handle = _run_later(wait, self._flush)
+                return
+        await self._emit()
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        if self.typing != self.broadcast_state:
+            await self._emit()
+
+    async def _emit(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.broadcast_state = self.typing
+        self.last_emit = asyncio.get_running_loop().time()
+        await self.emit(self.broadcast_state)
+
+
+class TypingAggregator:
+    """Folds per-user typing events into throttled ``typing.summary`` frames."""
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        exclude_user_id: Optional[str] = None,
+        interval: Optional[float] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.send = send
+        self.exclude_user_id = exclude_user_id
+        self.interval = typing_event_interval() if interval is None else interval
+        self.ttl = typing_state_ttl() if ttl is None else ttl
+        self.typists: Dict[str, Tuple[Optional[str], float]] = {}
+        self.last_summary: Optional[dict] = None
+        self.last_sent: Optional[float] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def update(self, user_id: str, username: Optional[str], is_typing: bool) -> None:
+        if user_id == self.exclude_user_id:
+            return
+        if is_typing:
+            expires_at = asyncio.get_running_loop().time() + self.ttl
+            self.typists[user_id] = (username, expires_at)
+        else:
+            self.typists.pop(user_id, None)
+        self._schedule(0)
+
+    def close(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def summary(self) -> dict:
+        ordered = sorted(self.typists.items(), key=lambda item: item[1][1])
+        return {
+            "type": "typing.summary",
+            "count": len(ordered),
+            "users": [
+                {"user_id": user_id, "username": username}
+                for user_id, (username, _) in ordered[:SUMMARY_USER_LIMIT]
+            ],
+        }
+
+    def _schedule(self, delay: float) -> None:
+        if self._flush_handle is not None:
+            return
+        if self.last_sent is not None:
+            now = asyncio.get_running_loop().time()
+            delay = max(delay, self.last_sent + self.interval - now)
+        self._flush_handle = _run_later(delay, self._flush)
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        now = asyncio.get_running_loop().time()
+        self.typists = {
+            user_id: state for user_id, state in self.typists.items() if state[1] > now
+        }
+        summary = self.summary()
+        if summary != self.last_summary:
+            self.last_summary = summary
+            self.last_sent = now
+            await self.send(summary)
+        if self.typists:
+            next_expiry = min(expires_at for _, expires_at in self.typists.values())
+            self._schedule(next_expiry - now)
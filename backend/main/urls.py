@@ -44,6 +44,7 @@ from .views import (
     FirebaseConfigView,
     RedisHealthView,
     WebSocketDiagnosticView,
+    WebSocketMetricsView,
     TestPushNotificationView,
     TurnIceServersView,
 )
@@ -73,7 +74,7 @@ from .animal_views import (
     BreederDirectoryViewSet,
     AdminActionLogViewSet,
 )
-from .views_uploads import UploadImageView
+from .views_uploads import PresignUploadView, UploadCompleteView, UploadImageView
 from .search_views import UniversalSearchView
 
 router = DefaultRouter()
@@ -229,9 +230,12 @@ urlpatterns = [
     path("feed/", NewsFeedView.as_view(), name="newsfeed"),
     path("feedback/", FeedbackView.as_view(), name="feedback"),
     path("uploads/images/", UploadImageView.as_view(), name="upload-image"),
+    path("uploads/presign/", PresignUploadView.as_view(), name="upload-presign"),
+    path("uploads/complete/", UploadCompleteView.as_view(), name="upload-complete"),
     path("firebase-config/", FirebaseConfigView.as_view(), name="firebase-config"),
     path("redis-health/", RedisHealthView.as_view(), name="redis-health"),
     path("ws-diagnostic/", WebSocketDiagnosticView.as_view(), name="ws-diagnostic"),
+    path("ws-metrics/", WebSocketMetricsView.as_view(), name="ws-metrics"),
     path(
         "test-push-notification/",
         TestPushNotificationView.as_view(),
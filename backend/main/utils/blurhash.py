@@ -0,0 +1,90 @@
+"""
+BlurHash encoder (https://blurha.sh).
+
+Encodes a small RGB image into a short string that clients decode into a
+blurred placeholder while the real image loads. Callers should downscale
+first (``main.image_derivatives`` passes at most 32x32 pixels); the cost is
+``width * height * x_components * y_components``.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(
+        _ALPHABET[(value // 83 ** (length - i - 1)) % 83] for i in range(length)
+    )
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def encode(
+    pixels: Sequence[Tuple[int, int, int]],
+    width: int,
+    height: int,
+    x_components: int = 4,
+    y_components: int = 3,
+) -> str:
+    """BlurHash of ``pixels`` (row-major RGB tuples of a ``width`` x ``height`` image)."""
+    if not 1 <= x_components <= 9 or not 1 <= y_components <= 9:
+        raise ValueError("BlurHash components must be between 1 and 9")
+    if len(pixels) != width * height:
+        raise ValueError("Pixel count does not match the image size")
+
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in pixels]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors: List[Tuple[float, float, float]] = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = (1.0 if i == 0 and j == 0 else 2.0) / (width * height)
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                cy = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * cy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            factors.append((r * norm, g * norm, b * norm))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(v) for factor in ac for v in factor)
+        quantised_max = max(0, min(82, math.floor(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+
+    result += _base83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4
+    )
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5))) for v in factor
+        )
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
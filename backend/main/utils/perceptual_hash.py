@@ -0,0 +1,68 @@
+"""
+64-bit perceptual hashes for photos.
+
+- ``dhash``: compares horizontally adjacent pixels of a 9x8 grayscale
+  thumbnail. It is cheap and robust to scaling and re-encoding.
+- ``phash``: thresholds the 8x8 lowest frequencies of a 32x32 grayscale
+  DCT at their median. It also survives small crops, brightness changes
+  and watermarks.
+
+Similar images have hashes within a small Hamming distance. Hashes are
+returned as signed 64-bit integers so they fit a ``BigIntegerField``;
+``hamming`` works on either representation.
+"""
+
+import numpy as np
+
+_MASK = (1 << 64) - 1
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n).reshape(-1, 1)
+    x = np.arange(n).reshape(1, -1)
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def to_signed64(value: int) -> int:
+    value &= _MASK
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _pack(bits) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bool(bit))
+    return to_signed64(value)
+
+
+def _grayscale(image, width: int, height: int) -> np.ndarray:
+    from PIL import Image
+
+    small = image.convert("L").resize((width, height), Image.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
+
+
+def dhash(image) -> int:
+    pixels = _grayscale(image, 9, 8)
+    return _pack((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+
+def phash(image) -> int:
+    pixels = _grayscale(image, _DCT_SIZE, _DCT_SIZE)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].flatten()
+    return _pack(low > np.median(low))
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & _MASK).bit_count()
+
+
+def segments(value: int, count: int = 4) -> tuple:
+    """Split a 64-bit hash into ``count`` equal unsigned segments, low bits first."""
+    bits = 64 // count
+    value &= _MASK
+    return tuple((value >> (bits * i)) & ((1 << bits) - 1) for i in range(count))
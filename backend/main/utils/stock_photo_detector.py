@@ -3,12 +3,6 @@ Stock photo detection utility for animal listings.
 Uses simple heuristics and can be extended with ML models.
 """
 
-import hashlib
-import requests
-from django.core.files.base import ContentFile
-from PIL import Image
-import io
-
 
 class StockPhotoDetector:
     """Detect stock photos in animal listings."""
@@ -28,55 +22,65 @@ class StockPhotoDetector:
     ]
 
     @staticmethod
-    def check_image_metadata(image_url: str) -> dict:
+    def score_metadata(exif_text: str, width: int, height: int) -> dict:
         """
-        Check image metadata for stock photo indicators.
-        
+        Score stock photo indicators from EXIF text and dimensions.
+
         Returns:
             dict with confidence score and reasons
         """
-        try:
-            response = requests.get(image_url, timeout=10)
-            if response.status_code != 200:
-                return {"is_stock": False, "confidence": 0.0, "reasons": []}
+        reasons = []
+        confidence = 0.0
 
-            image = Image.open(io.BytesIO(response.content))
-            exif_data = image._getexif() if hasattr(image, "_getexif") else {}
-            
-            reasons = []
-            confidence = 0.0
-
-            # Check for common stock photo metadata
-            if exif_data:
-                exif_str = str(exif_data).lower()
-                for watermark in StockPhotoDetector.WATERMARKS:
-                    if watermark in exif_str:
-                        reasons.append(f"Found watermark: {watermark}")
-                        confidence += 0.3
-
-            # Check image dimensions (stock photos often have specific aspect ratios)
-            width, height = image.size
-            aspect_ratio = width / height if height > 0 else 1
-
-            # Common stock photo dimensions
-            common_ratios = [16/9, 4/3, 1/1, 3/2]  # 16:9, 4:3, 1:1, 3:2
-            for ratio in common_ratios:
-                if abs(aspect_ratio - ratio) < 0.1:
-                    reasons.append(f"Common stock photo aspect ratio: {aspect_ratio:.2f}")
-                    confidence += 0.15
-                    break
-
-            # Check for very high image quality (>5000px width typically stock)
-            if width > 5000 or height > 5000:
-                reasons.append("Very high resolution suggests professional/stock image")
-                confidence += 0.1
+        # Check for common stock photo metadata
+        if exif_text:
+            exif_str = exif_text.lower()
+            for watermark in StockPhotoDetector.WATERMARKS:
+                if watermark in exif_str:
+                    reasons.append(f"Found watermark: {watermark}")
+                    confidence += 0.3
 
-            return {
-                "is_stock": confidence > 0.5,
-                "confidence": min(confidence, 1.0),
-                "reasons": reasons
-            }
+        # Check image dimensions (stock photos often have specific aspect ratios)
+        aspect_ratio = width / height if height else 1
+
+        # Common stock photo dimensions
+        common_ratios = [16/9, 4/3, 1/1, 3/2]  # 16:9, 4:3, 1:1, 3:2
+        for ratio in common_ratios:
+            if abs(aspect_ratio - ratio) < 0.1:
+                reasons.append(f"Common stock photo aspect ratio: {aspect_ratio:.2f}")
+                confidence += 0.15
+                break
+
+        # Check for very high image quality (>5000px width typically stock)
+        if width > 5000 or height > 5000:
+            reasons.append("Very high resolution suggests professional/stock image")
+            confidence += 0.1
+
+        return {
+            "is_stock": confidence > 0.5,
+            "confidence": min(confidence, 1.0),
+            "reasons": reasons
+        }
 
+    @staticmethod
+    def check_image_metadata(image_url: str) -> dict:
+        """
+        Check image metadata for stock photo indicators.
+
+        Only the first bytes of the image are read (ranged S3 GET);
+        dimensions and EXIF live in the header. URLs outside the upload
+        bucket are not fetched.
+
+        Returns:
+            dict with confidence score and reasons
+        """
+        from main.media_analysis import read_header
+
+        try:
+            header = read_header(image_url)
+            return StockPhotoDetector.score_metadata(
+                header["exif_text"], header["width"], header["height"]
+            )
         except Exception as e:
             return {
                 "is_stock": False,
@@ -116,13 +120,20 @@ class StockPhotoDetector:
         Returns:
             tuple (is_stock_photo: bool, confidence: float 0-1)
         """
-        metadata_result = cls.check_image_metadata(image_url)
-        
+        from main.media_analysis import fingerprint_for_url
+
+        # Results are stored per distinct image (content hash) and remembered
+        # per URL, so repeated photos are not re-downloaded or re-decoded.
+        try:
+            fingerprint = fingerprint_for_url(image_url)
+        except Exception:
+            return (False, 0.0)
+
         # Could combine with reverse image search in production
         # reverse_result = cls.check_reverse_image_search(image_url)
-        # combined_confidence = max(metadata_result["confidence"], reverse_result["confidence"])
-        
+        # combined_confidence = max(fingerprint.stock_confidence, reverse_result["confidence"])
+
         return (
-            metadata_result["is_stock"],
-            metadata_result["confidence"]
+            fingerprint.is_stock,
+            fingerprint.stock_confidence
         )
@@ -0,0 +1,162 @@
+"""
+Buffered listing view counts.
+
+Recording a view does not touch the listing row. Each view first claims
+a per-viewer dedupe key (``SET NX EX LISTING_VIEW_DEDUPE_WINDOW``). Only
+the first view in a window then increments the listing's pending delta
+in a Redis hash per counter (``views:pending:<counter>``). Both steps run
+in one Lua call, so a popular listing costs one Redis round trip per view
+and no row lock.
+
+``flush_view_counts`` (beat: ``main.tasks.flush_listing_views``) claims
+every pending hash by renaming it to a processing key. It then applies
+the deltas with one ``UPDATE ... SET views_count = views_count + CASE ...``
+per chunk of listings, and drops the processing key after the transaction
+commits. A worker that dies in between leaves the processing key behind,
+and the next flush applies it, so deltas are delivered at least once.
+
+When Redis is unreachable, the view is applied directly with an
+``F()`` increment. That is still a single UPDATE, with no read and no
+full-row save.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# Counter name -> (model label, counter field).
+COUNTERS = {
+    "marketplace": ("main.MarketplaceListing", "views_count"),
+    "animal": ("main.AnimalListing", "views_count"),
+}
+
+FLUSH_LOCK_KEY = "views:flush"
+FLUSH_CHUNK_SIZE = 500
+
+# KEYS: dedupe key, pending hash. ARGV: window seconds, listing id.
+# Returns the listing's pending delta after this view.
+_RECORD_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', tonumber(ARGV[1])) then
+    return redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+return tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or 0)
+"""
+
+# KEYS: pending hash, processing hash. Re-claims a leftover processing hash
+# before taking the pending one.
+_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+
+        _client = redis.Redis.from_url(
+            settings.CELERY_REDIS_URL, socket_connect_timeout=1, socket_timeout=2
+        )
+    return _client
+
+
+def _pending_key(counter: str) -> str:
+    return f"views:pending:{counter}"
+
+
+def _processing_key(counter: str) -> str:
+    return f"views:processing:{counter}"
+
+
+def _seen_key(counter: str, listing_id, viewer: str) -> str:
+    return f"views:seen:{counter}:{listing_id}:{viewer}"
+
+
+def _model(counter: str):
+    label, field = COUNTERS[counter]
+    return apps.get_model(label), field
+
+
+def record_view(counter: str, listing, viewer: str) -> int:
+    """Count ``viewer``'s view of ``listing``; returns the displayed total.
+
+    The total is the stored counter plus the listing's not-yet-flushed delta.
+    """
+    import redis
+
+    model, field = _model(counter)
+    stored = getattr(listing, field)
+    window = getattr(settings, "LISTING_VIEW_DEDUPE_WINDOW", 1800)
+    try:
+        pending = _redis().eval(
+            _RECORD_SCRIPT,
+            2,
+            _seen_key(counter, listing.pk, viewer),
+            _pending_key(counter),
+            window,
+            str(listing.pk),
+        )
+        return stored + int(pending)
+    except redis.RedisError as exc:
+        logger.warning("View counter unavailable, updating %s directly: %s", counter, exc)
+    model.objects.filter(pk=listing.pk).update(**{field: F(field) + 1})
+    return stored + 1
+
+
+def _apply(counter: str, deltas: Dict[str, int]) -> int:
+    model, field = _model(counter)
+    pk_field = model._meta.pk
+    items = [(pk_field.to_python(pk), delta) for pk, delta in deltas.items() if delta]
+    updated = 0
+    for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+        chunk = items[start : start + FLUSH_CHUNK_SIZE]
+        updated += model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            **{
+                field: F(field)
+                + Case(
+                    *[When(pk=pk, then=Value(delta)) for pk, delta in chunk],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            }
+        )
+    return updated
+
+
+def flush_view_counts() -> Optional[Dict[str, int]]:
+    """Apply buffered deltas; returns listings updated per counter.
+
+    Returns ``None`` without doing anything when another flush is running.
+    """
+    client = _redis()
+    lock = client.lock(FLUSH_LOCK_KEY, timeout=300, blocking=False)
+    if not lock.acquire():
+        return None
+    try:
+        claim = client.register_script(_CLAIM_SCRIPT)
+        result = {}
+        for counter in COUNTERS:
+            raw = claim(keys=[_pending_key(counter), _processing_key(counter)])
+            deltas = {
+                raw[i].decode(): int(raw[i + 1]) for i in range(0, len(raw), 2)
+            }
+            with transaction.atomic():
+                result[counter] = _apply(counter, deltas)
+            client.delete(_processing_key(counter))
+        return result
+    finally:
+        lock.release()
@@ -13,7 +13,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.mail import EmailMessage
 from redis import asyncio as redis_async
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.views import APIView
@@ -48,6 +48,23 @@ from .models import (
     UserReactionPreference,
 )
 from .realtime import conversation_group_name, notification_group_name
+from .inbox import (
+    InboxCursorPagination,
+    inbox_queryset,
+    mark_read as mark_conversation_read,
+    mark_unread as mark_conversation_unread,
+    record_new_message,
+)
+from liberty_social.ws_admission import get_handshake_metrics
+from .chat_events import (
+    DELETE_FIELDS,
+    EDIT_FIELDS,
+    MESSAGE_CREATED,
+    MESSAGE_DELETED,
+    MESSAGE_UPDATED,
+    REACTION_FIELDS,
+    publish_message_event,
+)
 from .serializers import (
     PostSerializer,
     CommentSerializer,
@@ -68,7 +85,7 @@ from .serializers import (
     UserFeedPreferenceSerializer,
     UserReactionPreferenceSerializer,
 )
-from users.models import Friends
+from users.social_graph import BLOCKED, BLOCKED_BY, FRIENDS, graph_for
 from users.emails import send_page_admin_invite_email
 from .emails import send_page_invite_email
 from .moderation.pipeline import precheck_text_or_raise, record_text_classification
@@ -283,25 +300,13 @@ class ReactionViewSet(ModelViewSet):
             return
 
         try:
-            message = (
-                Message.objects.select_related("sender", "conversation")
-                .prefetch_related("reactions__user")
-                .get(id=content_object.id)
+            message = Message.objects.prefetch_related("reactions").get(
+                id=content_object.id
             )
         except Message.DoesNotExist:
             return
 
-        serializer = MessageSerializer(message, context=self.get_serializer_context())
-        layer = get_channel_layer()
-        if not layer:
-            return
-        try:
-            async_to_sync(layer.group_send)(
-                conversation_group_name(str(message.conversation_id)),
-                {"type": "message_updated", "data": serializer.data},
-            )
-        except Exception:
-            pass
+        publish_message_event(MESSAGE_UPDATED, message, fields=REACTION_FIELDS)
 
 
 class NotificationViewSet(ModelViewSet):
@@ -1040,61 +1045,14 @@ class PageInviteViewSet(ModelViewSet):
 class ConversationViewSet(ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = InboxCursorPagination
     http_method_names = ["get", "post", "patch", "delete"]
 
     def get_queryset(self):
-        user = self.request.user
         # Filter out archived conversations by default
         # If 'include_archived' query param is True, include them
         include_archived = self.request.query_params.get("include_archived", "false").lower() == "true"
-        
-        queryset = (
-            Conversation.objects.filter(participants__user=user)
-            .select_related("created_by")
-            .prefetch_related("participants__user")
-            .distinct()
-        )
-        
-        if not include_archived:
-            # Exclude conversations where the user has archived them
-            # Get participant IDs that are archived
-            archived_participant_ids = ConversationParticipant.objects.filter(
-                user=user,
-                is_archived=True
-            ).values_list('conversation_id', flat=True)
-            queryset = queryset.exclude(id__in=archived_participant_ids)
-        
-        return queryset
-
-    def get_object(self):
-        """
-        Override to allow accessing archived conversations when include_archived=true
-        is passed, even for POST/PATCH/DELETE actions.
-        """
-        # Check if include_archived is in query params (works for GET, POST, etc.)
-        include_archived = self.request.query_params.get("include_archived", "false").lower() == "true"
-        
-        if include_archived:
-            # Temporarily modify queryset to include archived
-            original_queryset = self.get_queryset()
-            # Get all conversations user is part of (including archived)
-            user = self.request.user
-            queryset = (
-                Conversation.objects.filter(participants__user=user)
-                .select_related("created_by")
-                .prefetch_related("participants__user")
-                .distinct()
-            )
-            # Use the modified queryset for get_object
-            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
-            lookup_value = self.kwargs[lookup_url_kwarg]
-            filter_kwargs = {self.lookup_field: lookup_value}
-            obj = queryset.get(**filter_kwargs)
-            self.check_object_permissions(self.request, obj)
-            return obj
-        else:
-            # Use default behavior
-            return super().get_object()
+        return inbox_queryset(self.request.user, include_archived=include_archived)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -1177,42 +1135,24 @@ class ConversationViewSet(ModelViewSet):
                 decision=decision,
                 metadata={"context": "message_create"},
             )
-        ConversationParticipant.objects.filter(
-            conversation=conversation, user=request.user
-        ).update(last_read_at=timezone.now())
-        Conversation.objects.filter(id=conversation.id).update(
-            last_message_at=message.created_at
-        )
+        record_new_message(message)
 
-        serializer = MessageSerializer(message, context=self.get_serializer_context())
-
-        layer = get_channel_layer()
-        if layer:
-            try:
-                async_to_sync(layer.group_send)(
-                    conversation_group_name(str(conversation.id)),
-                    {"type": "chat_message", "data": serializer.data},
-                )
-            except Exception:
-                pass
+        publish_message_event(MESSAGE_CREATED, message, reactions=[])
 
+        serializer = MessageSerializer(message, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=["post"], url_path="mark-read")
     def mark_read(self, request, pk=None):
         conversation = self._ensure_participant(self.get_object())
-        updated_count = ConversationParticipant.objects.filter(
-            conversation=conversation, user=request.user
-        ).update(last_read_at=timezone.now())
+        updated_count = mark_conversation_read(conversation, request.user)
         return Response({"updated": updated_count})
 
     @action(detail=True, methods=["post"], url_path="mark-unread")
     def mark_unread(self, request, pk=None):
         conversation = self._ensure_participant(self.get_object())
         # Set last_read_at to None to mark as unread
-        updated_count = ConversationParticipant.objects.filter(
-            conversation=conversation, user=request.user
-        ).update(last_read_at=None)
+        updated_count = mark_conversation_unread(conversation, request.user)
         return Response({"updated": updated_count})
 
     @action(detail=True, methods=["post"], url_path="archive")
@@ -1291,46 +1231,24 @@ class ConversationViewSet(ModelViewSet):
                 metadata={"context": "message_update"},
             )
 
+            # Broadcast update via WebSocket
+            publish_message_event(MESSAGE_UPDATED, message, fields=EDIT_FIELDS)
+
             serializer = MessageSerializer(
                 message, context=self.get_serializer_context()
             )
-
-            # Broadcast update via WebSocket
-            layer = get_channel_layer()
-            if layer:
-                try:
-                    async_to_sync(layer.group_send)(
-                        conversation_group_name(str(conversation.id)),
-                        {"type": "message_updated", "data": serializer.data},
-                    )
-                except Exception:
-                    pass
-
             return Response(serializer.data)
 
         elif request.method == "DELETE":
             # Delete message (soft delete)
             message.is_deleted = True
             message.save(update_fields=["is_deleted", "updated_at"])
-            # Refresh to get reactions
-            message.refresh_from_db()
-            message.reactions.prefetch_related("user")
+            # Broadcast deletion via WebSocket
+            publish_message_event(MESSAGE_DELETED, message, fields=DELETE_FIELDS)
 
             serializer = MessageSerializer(
                 message, context=self.get_serializer_context()
             )
-
-            # Broadcast deletion via WebSocket
-            layer = get_channel_layer()
-            if layer:
-                try:
-                    async_to_sync(layer.group_send)(
-                        conversation_group_name(str(conversation.id)),
-                        {"type": "message_deleted", "data": serializer.data},
-                    )
-                except Exception:
-                    pass
-
             return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -1401,6 +1319,15 @@ class RedisHealthView(APIView):
         return Response(diagnostics, status=status_code)
 
 
+class WebSocketMetricsView(APIView):
+    """Handshake admission counters and latency percentiles for this worker."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_handshake_metrics())
+
+
 class WebSocketDiagnosticView(APIView):
     """Diagnostic endpoint to test WebSocket infrastructure."""
 
@@ -1596,9 +1523,8 @@ class NewsFeedView(APIView):
         print(f"[DEBUG] Query params: {request.query_params}")
 
         # get friend ids
-        friend_ids = list(
-            Friends.objects.filter(user=user).values_list("friend_id", flat=True)
-        )
+        graph = graph_for(request).prefetch(FRIENDS, BLOCKED, BLOCKED_BY)
+        friend_ids = list(graph.friends)
         print(f"[DEBUG] Friend IDs: {friend_ids}")
 
         # build queryset: public posts OR user's own posts OR friends' posts with friends visibility
@@ -1622,15 +1548,7 @@ class NewsFeedView(APIView):
         print(f"[DEBUG] Base queryset count: {qs.count()}")
 
         # exclude posts where either side has blocked the other
-        from users.models import BlockedUsers
-
-        user_blocked = BlockedUsers.objects.filter(user=user).values_list(
-            "blocked_user_id", flat=True
-        )
-        blocked_me = BlockedUsers.objects.filter(blocked_user=user).values_list(
-            "user_id", flat=True
-        )
-        excluded_authors = set(list(user_blocked)) | set(list(blocked_me))
+        excluded_authors = graph.block_exclusions()
         if excluded_authors:
             qs = qs.exclude(author__id__in=excluded_authors)
         print(f"[DEBUG] After block exclusion: {qs.count()}")
@@ -1835,6 +1753,7 @@ class CallViewSet(ModelViewSet):
                     async_to_sync(layer.group_send)(
                         conv_group_name,
                         {
+                            "group": conv_group_name,
                             "type": "call.incoming",
                             "call_id": str(call.id),
                             "caller_id": str(request.user.id),
@@ -1851,6 +1770,7 @@ class CallViewSet(ModelViewSet):
                 async_to_sync(layer.group_send)(
                     notification_group,
                     {
+                        "group": notification_group,
                         "type": "call.incoming",
                         "call_id": str(call.id),
                         "caller_id": str(request.user.id),
@@ -1920,6 +1840,7 @@ class CallViewSet(ModelViewSet):
                     async_to_sync(layer.group_send)(
                         conversation_group_name(str(call.conversation.id)),
                         {
+                            "group": conversation_group_name(str(call.conversation.id)),
                             "type": "call.accepted",
                             "call_id": str(call.id),
                             "receiver_id": str(request.user.id),
@@ -1930,6 +1851,7 @@ class CallViewSet(ModelViewSet):
                 async_to_sync(layer.group_send)(
                     notification_group_name(str(call.caller.id)),
                     {
+                        "group": notification_group_name(str(call.caller.id)),
                         "type": "call.answer",
                         "call_id": str(call.id),
                         "receiver_id": str(request.user.id),
@@ -1964,6 +1886,7 @@ class CallViewSet(ModelViewSet):
                 async_to_sync(layer.group_send)(
                     notification_group_name(str(call.caller.id)),
                     {
+                        "group": notification_group_name(str(call.caller.id)),
                         "type": "call.rejected",
                         "call_id": str(call.id),
                         "rejected_by": str(request.user.id),
@@ -1975,6 +1898,7 @@ class CallViewSet(ModelViewSet):
                     async_to_sync(layer.group_send)(
                         conversation_group_name(str(call.conversation.id)),
                         {
+                            "group": conversation_group_name(str(call.conversation.id)),
                             "type": "call.rejected",
                             "call_id": str(call.id),
                             "rejected_by": str(request.user.id),
@@ -2011,6 +1935,7 @@ class CallViewSet(ModelViewSet):
                     async_to_sync(layer.group_send)(
                         conversation_group_name(str(call.conversation.id)),
                         {
+                            "group": conversation_group_name(str(call.conversation.id)),
                             "type": "call.end",
                             "call_id": str(call.id),
                             "user_id": str(request.user.id),
@@ -2022,6 +1947,7 @@ class CallViewSet(ModelViewSet):
                     async_to_sync(layer.group_send)(
                         notification_group_name(str(participant_id)),
                         {
+                            "group": notification_group_name(str(participant_id)),
                             "type": "call.end",
                             "call_id": str(call.id),
                             "user_id": str(request.user.id),
@@ -1,9 +1,32 @@
+from django.conf import settings
+from django.core import signing
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema
-from .s3 import upload_fileobj_to_s3
+from .s3 import (
+    delete_object,
+    head_object,
+    new_upload_key,
+    object_url,
+    presign_upload,
+    upload_many,
+)
+
+UPLOAD_GRANT_SALT = "main.uploads.grant"
+# Grants stay redeemable for a while after the POST policy expires, so an
+# upload started just before expiry can still be finalized.
+UPLOAD_GRANT_GRACE = 3600
+MAX_FILES_PER_REQUEST = 20
+
+
+def _uploads_payload(uploaded):
+    return {
+        'url': uploaded[0]['url'],
+        'urls': [item['url'] for item in uploaded],
+        'items': uploaded,
+    }
 
 
 class UploadImageView(APIView):
@@ -20,23 +43,139 @@ class UploadImageView(APIView):
         if not files:
             return Response({'detail': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            urls = upload_many(files)
+        except Exception as e:
+            return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        uploaded = [
+            {
+                'url': url,
+                'content_type': getattr(f, 'content_type', None),
+                'name': f.name,
+                'size': getattr(f, 'size', None),
+            }
+            for f, url in zip(files, urls)
+        ]
+        return Response(_uploads_payload(uploaded))
+
+
+class PresignUploadView(APIView):
+    """Issue presigned S3 POSTs so clients upload directly to the bucket.
+
+    Body: ``{"files": [{"name", "content_type", "size"}]}`` (or one file's
+    fields at the top level). Each item in the response carries the POST
+    ``upload`` target and a signed ``token`` for the upload-complete call.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=None, responses={200: dict})
+    def post(self, request):
+        specs = request.data.get('files')
+        if specs is None:
+            specs = [request.data]
+        if not isinstance(specs, list) or not specs:
+            return Response({'detail': 'No file described'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(specs) > MAX_FILES_PER_REQUEST:
+            return Response(
+                {'detail': f'At most {MAX_FILES_PER_REQUEST} files per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        allowed = settings.UPLOAD_ALLOWED_CONTENT_TYPES
+        limit = settings.UPLOAD_MAX_BYTES
+        expires_in = settings.UPLOAD_PRESIGN_EXPIRES
+        items = []
+        try:
+            for spec in specs:
+                content_type = (spec.get('content_type') or '').strip().lower()
+                if content_type not in allowed:
+                    return Response(
+                        {'detail': f'Unsupported content type: {content_type or "missing"}'},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                try:
+                    size = int(spec.get('size') or limit)
+                except (TypeError, ValueError):
+                    return Response({'detail': 'Invalid size'}, status=status.HTTP_400_BAD_REQUEST)
+                if size < 1 or size > limit:
+                    return Response(
+                        {'detail': f'File size must be between 1 and {limit} bytes'},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+                key = new_upload_key(spec.get('name'), owner_id=request.user.pk)
+                grant = {'key': key, 'user': str(request.user.pk), 'content_type': content_type, 'max_size': size}
+                items.append(
+                    {
+                        'key': key,
+                        'name': spec.get('name'),
+                        'upload': presign_upload(key, content_type, size, expires_in),
+                        'token': signing.dumps(grant, salt=UPLOAD_GRANT_SALT),
+                        'expires_in': expires_in,
+                    }
+                )
+        except RuntimeError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'items': items})
+
+
+class UploadCompleteView(APIView):
+    """Finalize direct uploads: check each object against its grant.
+
+    Body: ``{"tokens": [...]}`` (or ``{"token": ...}``). Objects that are
+    larger or of a different type than granted are deleted and rejected.
+    The response matches ``UploadImageView``.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=None, responses={200: dict})
+    def post(self, request):
+        tokens = request.data.get('tokens')
+        if tokens is None:
+            tokens = [request.data.get('token')] if request.data.get('token') else []
+        if not isinstance(tokens, list) or not tokens:
+            return Response({'detail': 'No upload token provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tokens) > MAX_FILES_PER_REQUEST:
+            return Response(
+                {'detail': f'At most {MAX_FILES_PER_REQUEST} files per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        max_age = settings.UPLOAD_PRESIGN_EXPIRES + UPLOAD_GRANT_GRACE
+        grants = []
+        for token in tokens:
+            try:
+                grant = signing.loads(token, salt=UPLOAD_GRANT_SALT, max_age=max_age)
+            except signing.BadSignature:
+                return Response({'detail': 'Invalid or expired upload token'}, status=status.HTTP_400_BAD_REQUEST)
+            if grant['user'] != str(request.user.pk):
+                return Response({'detail': 'Upload token belongs to another user'}, status=status.HTTP_403_FORBIDDEN)
+            grants.append(grant)
+
         uploaded = []
         try:
-            for f in files:
-                url = upload_fileobj_to_s3(f, filename=f.name, content_type=f.content_type)
+            for grant in grants:
+                key = grant['key']
+                head = head_object(key)
+                if head is None:
+                    return Response({'detail': f'Upload not found: {key}'}, status=status.HTTP_400_BAD_REQUEST)
+                size, content_type = head
+                if size > grant['max_size'] or content_type.lower() != grant['content_type']:
+                    delete_object(key)
+                    return Response(
+                        {'detail': f'Uploaded object does not match its grant: {key}'},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
                 uploaded.append(
                     {
-                        'url': url,
-                        'content_type': getattr(f, 'content_type', None),
-                        'name': f.name,
-                        'size': getattr(f, 'size', None),
+                        'url': object_url(key),
+                        'content_type': content_type,
+                        'name': key.rsplit('/', 1)[-1].split('_', 1)[-1],
+                        'size': size,
                     }
                 )
-        except Exception as e:
+        except RuntimeError as e:
             return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        payload = {
-            'url': uploaded[0]['url'],
-            'urls': [item['url'] for item in uploaded],
-            'items': uploaded,
-        }
-        return Response(payload)
+        return Response(_uploads_payload(uploaded))
@@ -0,0 +1,341 @@
+"""
+Load generator for the websocket consumers.
+
+Drives ``ChatConsumer``, ``NotificationConsumer``, ``UserStatusConsumer`` (or
+the multiplexed ``ws/stream/`` socket) in-process through Channels'
+``WebsocketCommunicator`` and the real ``JWTAuthMiddleware`` stack, against
+either an in-memory or a Redis channel layer. Simulated clients connect,
+type, receive message fan-out and exchange call signalling; the report covers
+connects/sec, handshake and fan-out latency percentiles and traced memory per
+connection. Fixture rows are committed (each socket's database calls run on
+their own connection) and removed by ``delete_fixtures`` afterwards. Run it
+via ``python manage.py ws_loadtest``.
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import msgpack
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from liberty_social.auth import JWTAuthMiddlewareStack
+from liberty_social.routing import websocket_urlpatterns
+
+from .chat_events import MESSAGE_CREATED, build_message_event
+from .models import Conversation, ConversationParticipant, Message
+from .realtime import conversation_group_name
+from .realtime_outbox import encode_batch
+
+SOCKET_PATHS = {
+    "chat": "/ws/chat/{conversation_id}/",
+    "notifications": "/ws/notifications/",
+    "presence": "/ws/user-status/",
+}
+MULTIPLEX_PATH = "/ws/stream/"
+READ_TIMEOUT = 3600
+FIXTURE_PREFIX = "loadtest"
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max of ``samples`` (seconds) in milliseconds."""
+    ordered = sorted(samples)
+
+    def pick(p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "samples": len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": pick(1.0),
+    }
+
+
+def create_fixtures(clients: int, group_size: int, run_id: str):
+    """Create ``clients`` users split into conversations of ``group_size``.
+
+    Users are saved one by one rather than bulk-created so their signal
+    handlers (analytics rollups, feed preferences) run, matching the
+    ``post_delete`` handlers that fire when ``delete_fixtures`` removes them.
+    """
+    from users.models import User
+
+    with transaction.atomic():
+        users = [
+            User.objects.create(
+                email=f"{FIXTURE_PREFIX}-{run_id}-{i}@example.invalid",
+                username=f"{FIXTURE_PREFIX}-{run_id}-{i}",
+                slug=f"{FIXTURE_PREFIX}-{run_id}-{i}",
+            )
+            for i in range(clients)
+        ]
+    conversations = []
+    participants = []
+    for start in range(0, clients, group_size):
+        members = users[start : start + group_size]
+        conversation = Conversation.objects.create(
+            created_by=members[0], is_group=len(members) > 2
+        )
+        conversations.append(conversation)
+        participants.extend(
+            ConversationParticipant(conversation=conversation, user=member)
+            for member in members
+        )
+    ConversationParticipant.objects.bulk_create(participants)
+
+    assignments = []
+    for index, user in enumerate(users):
+        conversation = conversations[index // group_size]
+        assignments.append((user, str(AccessToken.for_user(user)), conversation.id))
+    return assignments, [c.id for c in conversations]
+
+
+def delete_fixtures(run_id: str) -> int:
+    """Delete a run's users; conversations and participants cascade."""
+    from users.models import User
+
+    deleted, _ = User.objects.filter(
+        email__startswith=f"{FIXTURE_PREFIX}-{run_id}-"
+    ).delete()
+    return deleted
+
+
+class LoadStats:
+    def __init__(self):
+        self.handshakes: List[float] = []
+        self.failed_connects = 0
+        self.fanout: List[float] = []
+        self.delivered: Dict[str, int] = {}
+        self.fanout_done = asyncio.Event()
+        self.fanout_expected = 0
+
+    def count(self, event_type: str) -> None:
+        self.delivered[event_type] = self.delivered.get(event_type, 0) + 1
+
+
+class SimulatedClient:
+    """One user with one or more sockets and a reader task per socket."""
+
+    def __init__(
+        self, app, user, token, conversation_id, sockets, multiplex, compact, stats, timeout
+    ):
+        self.app = app
+        self.user = user
+        self.token = token
+        self.conversation_id = conversation_id
+        self.sockets = sockets
+        self.multiplex = multiplex
+        self.compact = compact
+        self.stats = stats
+        self.timeout = timeout
+        self.communicators: Dict[str, WebsocketCommunicator] = {}
+        self.readers: List[asyncio.Task] = []
+
+    def _communicator(self, path: str) -> WebsocketCommunicator:
+        query = f"?token={self.token}"
+        if self.compact:
+            query += "&format=compact"
+        return WebsocketCommunicator(self.app, path + query)
+
+    async def connect(self) -> None:
+        if self.multiplex:
+            paths = {"stream": MULTIPLEX_PATH}
+        else:
+            paths = {
+                name: SOCKET_PATHS[name].format(conversation_id=self.conversation_id)
+                for name in self.sockets
+            }
+        for name, path in paths.items():
+            communicator = self._communicator(path)
+            started = time.perf_counter()
+            try:
+                connected, _ = await communicator.connect(timeout=self.timeout)
+            except asyncio.TimeoutError:
+                connected = False
+            if not connected:
+                self.stats.failed_connects += 1
+                continue
+            self.stats.handshakes.append(time.perf_counter() - started)
+            self.communicators[name] = communicator
+            self.readers.append(asyncio.ensure_future(self._read(communicator)))
+
+        stream = self.communicators.get("stream")
+        if stream:
+            topics = {
+                "chat": f"conversation:{self.conversation_id}",
+                "notifications": "notifications",
+                "presence": "presence",
+            }
+            for name in self.sockets:
+                await stream.send_json_to({"type": "subscribe", "topic": topics[name]})
+
+    @property
+    def chat_socket(self) -> Optional[WebsocketCommunicator]:
+        return self.communicators.get("stream") or self.communicators.get("chat")
+
+    async def send(self, content: dict) -> None:
+        socket = self.chat_socket
+        if socket is None:
+            return
+        if "stream" in self.communicators:
+            content = {**content, "topic": f"conversation:{self.conversation_id}"}
+        await socket.send_json_to(content)
+
+    async def _read(self, communicator: WebsocketCommunicator) -> None:
+        while True:
+            output = await communicator.receive_output(READ_TIMEOUT)
+            received_at = time.perf_counter()
+            if output.get("type") != "websocket.send":
+                continue
+            if output.get("bytes") is not None:
+                frame = msgpack.unpackb(output["bytes"], raw=False)
+                content = frame.get("payload", {}).get("t")
+            else:
+                frame = json.loads(output["text"])
+                content = (frame.get("payload") or {}).get("content")
+            event_type = frame.get("type")
+            self.stats.count(event_type)
+            if event_type == "message.created" and content:
+                self.stats.fanout.append(received_at - float(content))
+                if len(self.stats.fanout) >= self.stats.fanout_expected:
+                    self.stats.fanout_done.set()
+
+    async def close(self) -> None:
+        for reader in self.readers:
+            reader.cancel()
+        for communicator in self.communicators.values():
+            try:
+                await communicator.disconnect()
+            except Exception:
+                pass
+
+
+async def _gather_limited(coros, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coro):
+        async with semaphore:
+            await coro
+
+    await asyncio.gather(*(run(coro) for coro in coros))
+
+
+async def run_load_test(
+    assignments,
+    conversation_ids,
+    *,
+    sockets=("chat",),
+    multiplex=False,
+    compact=False,
+    connect_concurrency=200,
+    handshake_timeout=10.0,
+    typing_rounds=1,
+    messages=5,
+    calls=True,
+    drain_timeout=30.0,
+) -> dict:
+    app = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    stats = LoadStats()
+    clients = [
+        SimulatedClient(
+            app, user, token, conversation_id, sockets, multiplex, compact, stats, handshake_timeout
+        )
+        for user, token, conversation_id in assignments
+    ]
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    await _gather_limited((client.connect() for client in clients), connect_concurrency)
+    connect_seconds = time.perf_counter() - started
+    await asyncio.sleep(0.5)  # let acks and presence broadcasts settle
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    connections = sum(len(client.communicators) for client in clients)
+
+    for _ in range(typing_rounds):
+        await asyncio.gather(*(client.send({"type": "typing.start"}) for client in clients))
+        await asyncio.gather(*(client.send({"type": "typing.stop"}) for client in clients))
+
+    chat_members: Dict[int, int] = {}
+    for client in clients:
+        if client.chat_socket is not None:
+            chat_members[client.conversation_id] = chat_members.get(client.conversation_id, 0) + 1
+    stats.fanout_expected = messages * sum(chat_members.values())
+    senders = {client.conversation_id: client.user for client in reversed(clients)}
+    layer = get_channel_layer()
+    fanout_started = time.perf_counter()
+    sequence = 0
+    for _ in range(messages):
+        for conversation_id in conversation_ids:
+            sequence += 1
+            now = timezone.now()
+            message = Message(
+                id=sequence,
+                conversation_id=conversation_id,
+                sender_id=senders[conversation_id].id,
+                content=repr(time.perf_counter()),
+                created_at=now,
+                updated_at=now,
+            )
+            event = build_message_event(MESSAGE_CREATED, message, reactions=[])
+            group = conversation_group_name(str(conversation_id))
+            await layer.group_send(group, encode_batch(group, [event]))
+    if stats.fanout_expected:
+        try:
+            await asyncio.wait_for(stats.fanout_done.wait(), drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+    fanout_seconds = time.perf_counter() - fanout_started
+
+    if calls:
+        # ICE candidates are relayed without touching the Call table.
+        callers = {client.conversation_id: client for client in clients}.values()
+        await asyncio.gather(
+            *(
+                caller.send({"type": "call.ice-candidate", "call_id": 0, "candidate": "loadtest"})
+                for caller in callers
+            )
+        )
+    await asyncio.sleep(1.0)
+
+    await _gather_limited((client.close() for client in clients), connect_concurrency)
+
+    return {
+        "clients": len(clients),
+        "conversations": len(conversation_ids),
+        "sockets": ["stream"] if multiplex else list(sockets),
+        "topics": list(sockets) if multiplex else None,
+        "format": "compact" if compact else "json",
+        "connect": {
+            "connections": connections,
+            "failed": stats.failed_connects,
+            "seconds": round(connect_seconds, 3),
+            "per_second": round(connections / connect_seconds, 1) if connect_seconds else None,
+            "handshake_ms": percentiles(stats.handshakes),
+        },
+        "memory": {
+            "traced_bytes": traced - baseline,
+            "bytes_per_connection": (traced - baseline) // connections if connections else None,
+        },
+        "fanout": {
+            "messages": sequence,
+            "expected_deliveries": stats.fanout_expected,
+            "delivered": len(stats.fanout),
+            "seconds": round(fanout_seconds, 3),
+            "latency_ms": percentiles(stats.fanout),
+        },
+        "events_delivered": dict(sorted(stats.delivered.items())),
+    }
@@ -42,7 +42,14 @@ PY
 
 # Start Celery (still from venv)
 # Note: Removed --uid nobody --gid nobody to avoid PostgreSQL certificate permission issues
-exec ./venv/bin/celery -A liberty_social worker \
+# Set CELERY_EMBED_BEAT=1 on exactly one worker to run the periodic schedule
+# (retention, etc.) inside it.
+BEAT_FLAG=""
+if [ "${CELERY_EMBED_BEAT:-0}" = "1" ]; then
+  BEAT_FLAG="--beat"
+fi
+
+exec ./venv/bin/celery -A liberty_social worker $BEAT_FLAG \
   --loglevel=info \
   --concurrency="${CELERY_WORKER_CONCURRENCY:-2}" \
   --max-tasks-per-child="${CELERY_MAX_TASKS_PER_CHILD:-500}" \
@@ -11,6 +11,7 @@ from rest_framework.permissions import IsAdminUser
 
 from .models import User, PasskeyCredential, Session, SessionHistory, SecurityEvent
 from .device_utils import get_client_ip, get_user_agent
+from .token_denylist import revoke_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -159,7 +160,7 @@ class UserLockView(APIView):
             user.save(update_fields=["account_locked_at", "locked_reason"])
             
             # Revoke all active sessions
-            user.sessions.filter(revoked_at__isnull=True).update(revoked_at=timezone.now())
+            revoke_sessions(user.sessions.all())
             
             # Log security event
             SecurityEvent.objects.create(
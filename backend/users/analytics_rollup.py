@@ -0,0 +1,217 @@
+"""
+Pre-aggregated user counts for the admin analytics endpoints.
+
+``UserRollup`` holds one row per (country, state, age, gender, signup day)
+bucket with the number of users in it, so dashboard queries sum a few
+thousand bucket rows instead of grouping the whole ``User`` table.
+
+Presence is deliberately not a dimension: ``is_online`` flips on every
+socket connect and disconnect, which would turn each one into two bucket
+UPDATEs. Active counts are grouped live from the online users instead
+(``active_counts``), a small set served by a partial index.
+
+Buckets are maintained incrementally: ``User`` instances remember their
+bucket when loaded (``remember_bucket``), and after a save that changes any
+dimension the old bucket is decremented and the new one incremented in the
+same transaction (``apply_user_change``). Queryset ``update()`` calls and
+raw SQL bypass the signals, so ``reconcile_rollups`` recounts every bucket
+from a single GROUP BY every night and upserts the results while holding a
+lock that makes concurrent increments wait.
+"""
+
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import User, UserRollup
+
+logger = logging.getLogger(__name__)
+
+DIMENSION_FIELDS = ("country", "state", "age", "gender", "date_joined")
+
+Bucket = Tuple
+
+
+def _signup_day(date_joined):
+    if date_joined is None:
+        return None
+    if timezone.is_aware(date_joined):
+        date_joined = timezone.localtime(date_joined)
+    return date_joined.date()
+
+
+def bucket_for(user) -> Optional[Bucket]:
+    """The user's (country, state, age, gender, signup_day) bucket."""
+    if any(field in user.get_deferred_fields() for field in DIMENSION_FIELDS):
+        return None
+    return (
+        user.country,
+        user.state,
+        int(user.age) if user.age is not None else None,
+        user.gender,
+        _signup_day(user.date_joined),
+    )
+
+
+def bucket_key(bucket: Bucket) -> str:
+    return hashlib.sha256(repr(bucket).encode()).hexdigest()
+
+
+def _adjust(bucket: Bucket, delta: int) -> None:
+    key = bucket_key(bucket)
+    if UserRollup.objects.filter(bucket_key=key).update(count=F("count") + delta):
+        return
+    country, state, age, gender, signup_day = bucket
+    try:
+        with transaction.atomic():
+            UserRollup.objects.create(
+                bucket_key=key,
+                country=country,
+                state=state,
+                age=age,
+                gender=gender,
+                signup_day=signup_day,
+                count=delta,
+            )
+    except IntegrityError:
+        # Created concurrently; fall back to the increment.
+        UserRollup.objects.filter(bucket_key=key).update(count=F("count") + delta)
+
+
+def remember_bucket(user) -> None:
+    user._rollup_bucket = bucket_for(user)
+
+
+def apply_user_change(user, created: bool, update_fields=None) -> None:
+    """Move ``user`` between buckets after a save."""
+    if update_fields is not None and not set(update_fields) & set(DIMENSION_FIELDS):
+        return
+    new = bucket_for(user)
+    if new is None:
+        return
+    old = None if created else getattr(user, "_rollup_bucket", None)
+    if not created and old is None:
+        # Loaded with deferred dimensions; the nightly reconcile corrects it.
+        logger.debug("Skipping rollup update for user %s without a known bucket", user.pk)
+        user._rollup_bucket = new
+        return
+    if old != new:
+        with transaction.atomic():
+            if old is not None:
+                _adjust(old, -1)
+            _adjust(new, 1)
+    user._rollup_bucket = new
+
+
+def apply_user_delete(user) -> None:
+    bucket = getattr(user, "_rollup_bucket", None) or bucket_for(user)
+    if bucket is not None:
+        _adjust(bucket, -1)
+
+
+def _lock_rollups() -> None:
+    """Block bucket increments until the current transaction ends.
+
+    SHARE ROW EXCLUSIVE conflicts with the ROW EXCLUSIVE lock every UPDATE
+    takes, so saves that already touched a bucket commit before the recount
+    reads ``User`` and later ones wait for the reconcile to commit.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {UserRollup._meta.db_table} IN SHARE ROW EXCLUSIVE MODE"
+            )
+
+
+def reconcile_rollups() -> Dict[str, int]:
+    """Recount every bucket from the ``User`` table; returns run counters."""
+    with transaction.atomic():
+        _lock_rollups()
+        grouped = (
+            User.objects.annotate(signup_day=TruncDate("date_joined"))
+            .values("country", "state", "age", "gender", "signup_day")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        rows = {}
+        for entry in grouped.iterator():
+            bucket = (
+                entry["country"],
+                entry["state"],
+                entry["age"],
+                entry["gender"],
+                entry["signup_day"],
+            )
+            key = bucket_key(bucket)
+            rows[key] = UserRollup(
+                bucket_key=key,
+                country=entry["country"],
+                state=entry["state"],
+                age=entry["age"],
+                gender=entry["gender"],
+                signup_day=entry["signup_day"],
+                count=entry["total"],
+            )
+        UserRollup.objects.bulk_create(
+            rows.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["bucket_key"],
+            update_fields=["count"],
+        )
+        stale = [
+            pk
+            for pk, key in UserRollup.objects.values_list("pk", "bucket_key").iterator()
+            if key not in rows
+        ]
+        for start in range(0, len(stale), 1000):
+            UserRollup.objects.filter(pk__in=stale[start : start + 1000]).delete()
+    result = {
+        "buckets": len(rows),
+        "users": sum(row.count for row in rows.values()),
+        "removed": len(stale),
+    }
+    logger.info("User rollups reconciled: %s", result)
+    return result
+
+
+def rollups():
+    """Non-empty buckets; filter on the dimension columns, sum ``count``."""
+    return UserRollup.objects.filter(count__gt=0)
+
+
+def user_total(queryset=None) -> int:
+    queryset = rollups() if queryset is None else queryset
+    return queryset.aggregate(total=Sum("count"))["total"] or 0
+
+
+def active_counts(fields: Sequence[str] = (), **filters) -> Dict[Tuple, int]:
+    """Online users matching ``filters``, counted per value of ``fields``."""
+    online = User.objects.filter(is_online=True, **filters)
+    if not fields:
+        return {(): online.count()}
+    grouped = online.values(*fields).annotate(active=Count("id")).order_by()
+    return {tuple(entry[field] for field in fields): entry["active"] for entry in grouped}
+
+
+def with_active(rows, fields: Sequence[str], **filters) -> List[dict]:
+    """Add an ``active`` count to each grouped rollup row from presence."""
+    counts = active_counts(fields, **filters)
+    rows = list(rows)
+    for row in rows:
+        row["active"] = counts.get(tuple(row[field] for field in fields), 0)
+    return rows
+
+
+# Aggregates mirroring the live Count("id", filter=...) breakdowns; "active"
+# comes from ``with_active`` since presence is not a bucket dimension.
+BREAKDOWN = {
+    "total": Sum("count"),
+    "male": Sum("count", filter=Q(gender="male"), default=0),
+    "female": Sum("count", filter=Q(gender="female"), default=0),
+}
@@ -2,10 +2,11 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Count, Q, F
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
-from users.models import User
+from users.analytics_rollup import BREAKDOWN, active_counts, rollups, with_active
+from users.analytics_snapshot import get_snapshot
 
 
 @api_view(["GET"])
@@ -14,19 +15,21 @@ def analytics_overview(request):
     """Get overall analytics overview"""
 
     # Total users
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_online=True).count()
+    totals = rollups().aggregate(total=BREAKDOWN["total"])
+    total_users = totals["total"] or 0
+    active_users = active_counts()[()]
 
     # Gender breakdown
     gender_stats = (
-        User.objects.values("gender").annotate(count=Count("id")).order_by("-count")
+        rollups().values("gender").annotate(count=Sum("count")).order_by("-count")
     )
 
     # Age statistics
     age_stats = (
-        User.objects.filter(age__isnull=False)
+        rollups()
+        .filter(age__isnull=False)
         .values("age")
-        .annotate(count=Count("id"))
+        .annotate(count=Sum("count"))
         .order_by("age")
     )
 
@@ -46,18 +49,14 @@ def analytics_by_country(request):
     """Get user statistics by country"""
 
     country_stats = (
-        User.objects.filter(country__isnull=False)
+        rollups()
+        .filter(country__isnull=False)
         .values("country")
-        .annotate(
-            total=Count("id"),
-            male=Count("id", filter=Q(gender="male")),
-            female=Count("id", filter=Q(gender="female")),
-            active=Count("id", filter=Q(is_online=True)),
-        )
+        .annotate(**BREAKDOWN)
         .order_by("-total")
     )
 
-    return Response(list(country_stats))
+    return Response(with_active(country_stats, ["country"], country__isnull=False))
 
 
 @api_view(["GET"])
@@ -67,22 +66,14 @@ def analytics_by_state(request):
 
     country = request.query_params.get("country", None)
 
-    query = User.objects.filter(state__isnull=False)
+    filters = {"state__isnull": False}
     if country:
-        query = query.filter(country=country)
-
-    state_stats = (
-        query.values("state", "country")
-        .annotate(
-            total=Count("id"),
-            male=Count("id", filter=Q(gender="male")),
-            female=Count("id", filter=Q(gender="female")),
-            active=Count("id", filter=Q(is_online=True)),
-        )
-        .order_by("-total")
-    )
+        filters["country"] = country
+    query = rollups().filter(**filters)
+
+    state_stats = query.values("state", "country").annotate(**BREAKDOWN).order_by("-total")
 
-    return Response(list(state_stats))
+    return Response(with_active(state_stats, ["state", "country"], **filters))
 
 
 @api_view(["GET"])
@@ -93,25 +84,16 @@ def analytics_by_age(request):
     gender = request.query_params.get("gender", None)
     country = request.query_params.get("country", None)
 
-    query = User.objects.filter(age__isnull=False)
-
+    filters = {"age__isnull": False}
     if gender and gender != "all":
-        query = query.filter(gender=gender)
+        filters["gender"] = gender
     if country:
-        query = query.filter(country=country)
+        filters["country"] = country
+    query = rollups().filter(**filters)
 
-    age_stats = (
-        query.values("age")
-        .annotate(
-            total=Count("id"),
-            male=Count("id", filter=Q(gender="male")),
-            female=Count("id", filter=Q(gender="female")),
-            active=Count("id", filter=Q(is_online=True)),
-        )
-        .order_by("age")
-    )
+    age_stats = query.values("age").annotate(**BREAKDOWN).order_by("age")
 
-    return Response(list(age_stats))
+    return Response(with_active(age_stats, ["age"], **filters))
 
 
 @api_view(["GET"])
@@ -123,22 +105,20 @@ def analytics_by_gender(request):
     age_min = request.query_params.get("age_min", None)
     age_max = request.query_params.get("age_max", None)
 
-    query = User.objects.all()
-
+    filters = {}
     if country:
-        query = query.filter(country=country)
+        filters["country"] = country
     if age_min:
-        query = query.filter(age__gte=int(age_min))
+        filters["age__gte"] = int(age_min)
     if age_max:
-        query = query.filter(age__lte=int(age_max))
+        filters["age__lte"] = int(age_max)
+    query = rollups().filter(**filters)
 
     gender_stats = (
-        query.values("gender")
-        .annotate(total=Count("id"), active=Count("id", filter=Q(is_online=True)))
-        .order_by("-total")
+        query.values("gender").annotate(total=BREAKDOWN["total"]).order_by("-total")
     )
 
-    return Response(list(gender_stats))
+    return Response(with_active(gender_stats, ["gender"], **filters))
 
 
 @api_view(["GET"])
@@ -154,52 +134,26 @@ def analytics_micro_segmentation(request):
     - age_min: minimum age
     - age_max: maximum age
     - active_only: 'true' for active users only
+    - refresh: 'true' to rebuild the snapshot before answering
     """
 
-    query = User.objects.all()
-
-    # Apply filters
     gender = request.query_params.get("gender", None)
     country = request.query_params.get("country", None)
     state = request.query_params.get("state", None)
     age_min = request.query_params.get("age_min", None)
     age_max = request.query_params.get("age_max", None)
     active_only = request.query_params.get("active_only", "false").lower() == "true"
-
-    if gender and gender != "all":
-        query = query.filter(gender=gender)
-    if country:
-        query = query.filter(country=country)
-    if state:
-        query = query.filter(state=state)
-    if age_min:
-        query = query.filter(age__gte=int(age_min))
-    if age_max:
-        query = query.filter(age__lte=int(age_max))
-    if active_only:
-        query = query.filter(is_online=True)
-
-    # Get counts and stats
-    total_count = query.count()
-    male_count = query.filter(gender="male").count()
-    female_count = query.filter(gender="female").count()
-    active_count = query.filter(is_online=True).count()
-
-    # Age average
-    age_data = query.filter(age__isnull=False)
-    avg_age = (
-        age_data.aggregate(avg=models.Avg("age"))["avg"] if age_data.exists() else None
-    )
-
-    # Get breakdown by gender and age
-    gender_breakdown = (
-        query.values("gender").annotate(count=Count("id")).order_by("-count")
-    )
-    age_breakdown = (
-        query.filter(age__isnull=False)
-        .values("age")
-        .annotate(count=Count("id"))
-        .order_by("age")
+    refresh = request.query_params.get("refresh", "false").lower() == "true"
+
+    # Slices are computed from the in-memory columnar snapshot, not Postgres
+    snapshot = get_snapshot(max_age=0 if refresh else None)
+    mask = snapshot.mask(
+        gender=gender if gender != "all" else None,
+        country=country,
+        state=state,
+        age_min=int(age_min) if age_min else None,
+        age_max=int(age_max) if age_max else None,
+        active_only=active_only,
     )
 
     return Response(
@@ -212,16 +166,14 @@ def analytics_micro_segmentation(request):
                 "age_max": age_max,
                 "active_only": active_only,
             },
-            "summary": {
-                "total": total_count,
-                "male": male_count,
-                "female": female_count,
-                "active": active_count,
-                "average_age": avg_age,
-            },
+            "summary": snapshot.summary(mask),
             "breakdown": {
-                "by_gender": list(gender_breakdown),
-                "by_age": list(age_breakdown),
+                "by_gender": snapshot.by_gender(mask),
+                "by_age": snapshot.by_age(mask),
+            },
+            "snapshot": {
+                "built_at": snapshot.built_at.isoformat(),
+                "age_seconds": round(snapshot.age_seconds, 1),
             },
         }
     )
@@ -235,15 +187,11 @@ def analytics_top_countries(request):
     limit = int(request.query_params.get("limit", 10))
 
     countries = (
-        User.objects.filter(country__isnull=False)
+        rollups()
+        .filter(country__isnull=False)
         .values("country")
-        .annotate(
-            total=Count("id"),
-            male=Count("id", filter=Q(gender="male")),
-            female=Count("id", filter=Q(gender="female")),
-            active=Count("id", filter=Q(is_online=True)),
-        )
+        .annotate(**BREAKDOWN)
         .order_by("-total")[:limit]
     )
 
-    return Response(list(countries))
+    return Response(with_active(countries, ["country"], country__isnull=False))
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # import signals to wire them
+        import users.signals  # noqa: F401
+        from users.geoip import check_database
+
+        check_database()
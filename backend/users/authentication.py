@@ -0,0 +1,38 @@
+"""
+JWT authentication that honours session revocation.
+
+``DenylistJWTAuthentication`` validates the access token exactly like
+simplejwt's ``JWTAuthentication`` and then rejects it if its JTI is on the
+revocation denylist (see ``users.token_denylist``). The denylist check is
+one Redis EXISTS, so revoked tokens stop working without a ``Session`` query
+on every request.
+"""
+
+from typing import Optional
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .token_denylist import is_denied
+
+
+class DenylistJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_denied(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(
+                {
+                    "detail": "Token has been revoked",
+                    "code": "token_revoked",
+                }
+            )
+        return validated_token
+
+
+def request_token_jti(request) -> Optional[str]:
+    """JTI of the access token that authenticated ``request``, if any."""
+    token = getattr(request, "auth", None)
+    if token is None or not hasattr(token, "get"):
+        return None
+    return token.get(api_settings.JTI_CLAIM)
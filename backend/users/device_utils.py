@@ -2,9 +2,12 @@
 Utility functions for device and location tracking.
 """
 
+import ipaddress
 import logging
 from typing import Optional, Tuple
 
+from .geoip import format_location, lookup_ip
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,40 +29,22 @@ def get_user_agent(request) -> Optional[str]:
 
 def get_location_from_ip(ip_address: Optional[str]) -> Optional[str]:
     """
-    Get approximate location from IP address.
-    
-    For now, returns a simple format. In production, you might want to use:
-    - GeoIP2 (MaxMind)
-    - ipapi.co API
-    - ip-api.com API
-    - Or another geolocation service
-    
-    Returns format: "City, Country" or None
+    Get approximate location from IP address via the local GeoIP database.
+
+    Never touches the network, so it is safe on the login path.
+    Returns format: "City, Country", "Local Network" or None
     """
     if not ip_address:
         return None
 
     # Skip private/local IPs
-    if ip_address.startswith(("127.", "192.168.", "10.", "172.")):
-        return "Local Network"
-
-    # For MVP, we'll return a placeholder
-    # In production, integrate with a geolocation service
     try:
-        # Example: You could use ipapi.co or similar
-        # import requests
-        # response = requests.get(f"https://ipapi.co/{ip_address}/json/", timeout=2)
-        # if response.status_code == 200:
-        #     data = response.json()
-        #     city = data.get("city", "")
-        #     country = data.get("country_name", "")
-        #     return f"{city}, {country}" if city else country
-        pass
-    except Exception as e:
-        logger.warning(f"Failed to get location for IP {ip_address}: {e}")
+        if ipaddress.ip_address(ip_address).is_private:
+            return "Local Network"
+    except ValueError:
+        return None
 
-    # Return None for now - can be enhanced later
-    return None
+    return format_location(lookup_ip(ip_address))
 
 
 def extract_device_info(user_agent: Optional[str]) -> dict:
@@ -4,15 +4,20 @@ Device and Session Management Views (Phase 2)
 
 import logging
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db.models import Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
 
+from .authentication import request_token_jti
 from .models import PasskeyCredential, Session, SessionHistory, SecurityEvent
+from .login_pipeline import pending_logins
+from .token_denylist import deny, revoke_sessions, session_token_expiry
 from .device_utils import get_client_ip, get_user_agent, get_location_from_ip, extract_device_info
 
 logger = logging.getLogger(__name__)
@@ -136,9 +141,7 @@ class DeviceDetailView(APIView):
                 user.save(update_fields=["has_passkey"])
 
             # Revoke all sessions for this device
-            Session.objects.filter(user=user, device_id=device.id, revoked_at__isnull=True).update(
-                revoked_at=timezone.now()
-            )
+            revoke_sessions(Session.objects.filter(user=user, device_id=device.id))
 
             # Log security event
             SecurityEvent.objects.create(
@@ -171,36 +174,24 @@ class SessionListView(APIView):
     def get(self, request):
         user = request.user
         
-        # Get current token JTI
-        current_token_jti = None
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        if auth_header.startswith("Bearer "):
-            current_token = auth_header.split(" ")[1]
-            try:
-                from rest_framework_simplejwt.tokens import UntypedToken
-                from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-                untyped_token = UntypedToken(current_token)
-                current_token_jti = untyped_token.get("jti")
-            except (InvalidToken, TokenError, KeyError):
-                pass  # If we can't decode, continue without matching
-
-        # Collapse older duplicate rows so the UI shows one active session per device/browser.
-        sessions = list(
-            Session.objects.filter(user=user, revoked_at__isnull=True).order_by("-last_activity")
+        # The authentication class already validated the token; reuse its JTI.
+        current_token_jti = request_token_jti(request)
+
+        # One active row per device key is enforced at write time, so this is a
+        # single range scan over the partial index on active sessions.
+        sessions = Session.objects.filter(user=user, revoked_at__isnull=True).order_by(
+            "-last_activity"
+        ).only(
+            "id",
+            "device_id",
+            "device_name",
+            "ip_address",
+            "location",
+            "user_agent",
+            "token_jti",
+            "created_at",
+            "last_activity",
         )
-        grouped_sessions = {}
-        for session in sessions:
-            session_key = str(session.device_id) if session.device_id else (
-                session.user_agent or session.device_name or str(session.id)
-            )
-            existing = grouped_sessions.get(session_key)
-            if existing is None:
-                grouped_sessions[session_key] = session
-                continue
-            if current_token_jti and session.token_jti == current_token_jti:
-                grouped_sessions[session_key] = session
-
-        deduped_sessions = list(grouped_sessions.values())
 
         return Response(
             {
@@ -214,9 +205,9 @@ class SessionListView(APIView):
                         "user_agent": session.user_agent,
                         "created_at": session.created_at.isoformat(),
                         "last_activity": session.last_activity.isoformat(),
-                        "is_current": current_token_jti and session.token_jti == current_token_jti,
+                        "is_current": bool(current_token_jti) and session.token_jti == current_token_jti,
                     }
-                    for session in deduped_sessions
+                    for session in sessions
                 ],
             },
             status=status.HTTP_200_OK,
@@ -231,57 +222,52 @@ class SessionRevokeAllView(APIView):
     def post(self, request):
         user = request.user
         
-        # Get current token JTI to identify the current session
-        current_token_jti = None
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        if auth_header.startswith("Bearer "):
-            try:
-                from rest_framework_simplejwt.tokens import UntypedToken
-                from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-                
-                token_str = auth_header.split(" ")[1]
-                untyped_token = UntypedToken(token_str)
-                current_token_jti = untyped_token.get("jti")
-            except (InvalidToken, TokenError, Exception) as e:
-                logger.warning(f"Failed to decode current access token for JTI: {e}")
-        
+        current_token_jti = request_token_jti(request)
+
         # Find the current session using token_jti
         current_session = None
         if current_token_jti:
-            try:
-                current_session = Session.objects.filter(
-                    user=user, 
-                    token_jti=current_token_jti,
-                    revoked_at__isnull=True
-                ).first()
-            except Exception as e:
-                logger.warning(f"Failed to find current session: {e}")
-        
-        # Revoke all sessions EXCEPT the current one
+            current_session = Session.objects.filter(
+                user=user,
+                token_jti=current_token_jti,
+                revoked_at__isnull=True,
+            ).first()
+
+        # Logins still queued for the batch worker have no Session row yet;
+        # the current one may be among them.
+        pending = pending_logins(user.id)
+        current_pending = pending.pop(current_token_jti, None) if current_token_jti else None
+
+        # Revoke all sessions EXCEPT the current one, denying their access tokens
+        # in one bulk denylist write so they stop authenticating immediately.
+        sessions = Session.objects.filter(user=user)
         if current_session:
-            revoked_count = Session.objects.filter(
-                user=user, 
-                revoked_at__isnull=True
-            ).exclude(id=current_session.id).update(revoked_at=timezone.now())
+            revoked_count = revoke_sessions(sessions.exclude(id=current_session.id))
         else:
-            # If we can't identify current session, revoke all (fallback)
-            revoked_count = Session.objects.filter(
-                user=user, 
-                revoked_at__isnull=True
-            ).update(revoked_at=timezone.now())
-            logger.warning(f"Could not identify current session for user {user.id}, revoked all sessions")
+            # The current session has no row yet (queued login) or is unknown;
+            # either way none of the existing rows is the caller's.
+            revoked_count = revoke_sessions(sessions)
+            if current_pending is None:
+                logger.warning(f"Could not identify current session for user {user.id}, revoked all sessions")
+        if pending:
+            deny(
+                (jti, session_token_expiry(parse_datetime(entry["occurred_at"])))
+                for jti, entry in pending.items()
+            )
+            revoked_count += len(pending)
 
         # Blacklist all outstanding JWT refresh tokens except the current one
         # Note: OutstandingToken tracks refresh tokens, not access tokens
         # When a refresh token is blacklisted, users won't be able to refresh their access tokens
-        # Access tokens will still work until they expire (100 days), but users can't get new ones
+        # Their access tokens were denied above by revoke_sessions
         outstanding_tokens = OutstandingToken.objects.filter(user=user)
-        blacklisted_count = 0
         
-        # Get the current refresh token JTI from the session
+        # Get the current refresh token JTI from the session (or its queued login)
         current_refresh_token_jti = None
         if current_session and current_session.refresh_token_jti:
             current_refresh_token_jti = current_session.refresh_token_jti
+        elif current_pending:
+            current_refresh_token_jti = current_pending["refresh_token_jti"]
         
         # If we don't have it in the session, try to find it using a time-based heuristic
         if not current_refresh_token_jti and current_session and current_session.created_at:
@@ -297,18 +283,16 @@ class SessionRevokeAllView(APIView):
             if recent_tokens.count() == 1:
                 current_refresh_token_jti = recent_tokens.first().jti
         
-        for token in outstanding_tokens:
-            # Skip the current refresh token if we identified it
-            if current_refresh_token_jti and str(token.jti) == str(current_refresh_token_jti):
-                continue  # Skip current refresh token
-            
-            # Blacklist this refresh token
-            # Users with blacklisted refresh tokens won't be able to get new access tokens
-            try:
-                BlacklistedToken.objects.get_or_create(token=token)
-                blacklisted_count += 1
-            except Exception as e:
-                logger.warning(f"Failed to blacklist token {token.jti}: {e}")
+        # Blacklist every other refresh token that is not blacklisted yet, in one insert.
+        # Users with blacklisted refresh tokens won't be able to get new access tokens
+        to_blacklist = outstanding_tokens.filter(blacklistedtoken__isnull=True)
+        if current_refresh_token_jti:
+            to_blacklist = to_blacklist.exclude(jti=current_refresh_token_jti)
+        blacklisted = BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=token_id) for token_id in to_blacklist.values_list("id", flat=True)],
+            ignore_conflicts=True,
+        )
+        blacklisted_count = len(blacklisted)
 
         # Log security event
         SecurityEvent.objects.create(
@@ -335,35 +319,49 @@ class SessionRevokeAllView(APIView):
         )
 
 
+class ActivityLogPagination(CursorPagination):
+    """Keyset pagination over the (user, -created_at) history index."""
+
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "activity": data,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class ActivityLogView(APIView):
     """Get activity log (session history) for the authenticated user."""
 
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        limit = int(request.query_params.get("limit", 50))
-        offset = int(request.query_params.get("offset", 0))
-
-        history = user.session_history.all().order_by("-created_at")[offset : offset + limit]
+        paginator = ActivityLogPagination()
+        history = paginator.paginate_queryset(
+            SessionHistory.objects.filter(user=request.user), request, view=self
+        )
 
-        return Response(
-            {
-                "activity": [
-                    {
-                        "id": str(entry.id),
-                        "device_id": str(entry.device_id) if entry.device_id else None,
-                        "device_name": entry.device_name,
-                        "ip_address": entry.ip_address,
-                        "location": entry.location,
-                        "user_agent": entry.user_agent,
-                        "authentication_method": entry.authentication_method,
-                        "created_at": entry.created_at.isoformat(),
-                        "ended_at": entry.ended_at.isoformat() if entry.ended_at else None,
-                    }
-                    for entry in history
-                ],
-                "count": user.session_history.count(),
-            },
-            status=status.HTTP_200_OK,
+        return paginator.get_paginated_response(
+            [
+                {
+                    "id": str(entry.id),
+                    "device_id": str(entry.device_id) if entry.device_id else None,
+                    "device_name": entry.device_name,
+                    "ip_address": entry.ip_address,
+                    "location": entry.location,
+                    "user_agent": entry.user_agent,
+                    "authentication_method": entry.authentication_method,
+                    "created_at": entry.created_at.isoformat(),
+                    "ended_at": entry.ended_at.isoformat() if entry.ended_at else None,
+                }
+                for entry in history
+            ]
         )
@@ -0,0 +1,115 @@
+"""
+Friends-of-friends suggestion candidates.
+
+``rebuild_friend_suggestions`` loads every ``Friends`` edge into a symmetric
+SciPy CSR adjacency matrix ``A`` and computes mutual-friend counts as
+``A @ A`` one block of rows at a time, so memory stays bounded by the block
+rather than the full product. For each user, existing friends and the user
+themself are dropped and the ``FRIEND_SUGGESTION_TOP_K`` candidates with the
+most mutual friends are written to ``FriendSuggestion``. Rows from earlier
+runs that were not refreshed are deleted at the end.
+
+The endpoint filters the stored candidates against the viewer's cached social
+graph (blocks, dismissals) and pending requests at read time, so the store
+only needs rebuilding on a schedule.
+"""
+
+import logging
+from typing import Dict, List
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import FriendSuggestion, Friends
+
+logger = logging.getLogger(__name__)
+
+
+def suggestion_top_k() -> int:
+    return getattr(settings, "FRIEND_SUGGESTION_TOP_K", 50)
+
+
+def _adjacency():
+    """Symmetric 0/1 CSR matrix of friendships and the row -> user id list."""
+    index: Dict = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    for user_id, friend_id in Friends.objects.values_list("user_id", "friend_id").iterator(
+        chunk_size=10000
+    ):
+        rows.append(index.setdefault(user_id, len(index)))
+        cols.append(index.setdefault(friend_id, len(index)))
+
+    size = len(index)
+    data = np.ones(len(rows), dtype=np.int32)
+    matrix = sparse.coo_matrix((data, (rows, cols)), shape=(size, size)).tocsr()
+    # Friendships are normally stored in both directions; tolerate one-sided rows.
+    matrix = ((matrix + matrix.T) > 0).astype(np.int32)
+    user_ids = [None] * size
+    for user_id, position in index.items():
+        user_ids[position] = user_id
+    return matrix, user_ids
+
+
+def _row(matrix, position: int):
+    start, stop = matrix.indptr[position], matrix.indptr[position + 1]
+    return matrix.indices[start:stop], matrix.data[start:stop]
+
+
+def _top_candidates(columns, values, friends, self_index: int, top_k: int, min_mutual: int):
+    """Best candidates in one row of ``A @ A`` as (indices, mutual counts)."""
+    keep = (values >= min_mutual) & (columns != self_index)
+    if friends.size:
+        keep &= ~np.isin(columns, friends, assume_unique=True)
+    columns, values = columns[keep], values[keep]
+    if columns.size > top_k:
+        best = np.argpartition(-values, top_k - 1)[:top_k]
+        columns, values = columns[best], values[best]
+    order = np.argsort(-values, kind="stable")
+    return columns[order], values[order]
+
+
+def rebuild_friend_suggestions(
+    top_k: int = None, min_mutual: int = 1, block_size: int = 2000
+) -> Dict[str, int]:
+    """Recompute every user's stored candidates; returns run counters."""
+    top_k = top_k or suggestion_top_k()
+    started = timezone.now()
+    matrix, user_ids = _adjacency()
+    stored = 0
+
+    for start in range(0, len(user_ids), block_size):
+        stop = min(start + block_size, len(user_ids))
+        block = matrix[start:stop]
+        mutual = (block @ matrix).tocsr()
+        rows = []
+        for offset in range(stop - start):
+            position = start + offset
+            columns, values = _top_candidates(
+                *_row(mutual, offset),
+                _row(matrix, position)[0],
+                position,
+                top_k,
+                min_mutual,
+            )
+            rows.extend(
+                FriendSuggestion(
+                    user_id=user_ids[position],
+                    candidate_id=user_ids[column],
+                    mutual_count=int(value),
+                    computed_at=started,
+                )
+                for column, value in zip(columns, values)
+            )
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(user_id__in=user_ids[start:stop]).delete()
+            FriendSuggestion.objects.bulk_create(rows, batch_size=1000)
+        stored += len(rows)
+
+    stale, _ = FriendSuggestion.objects.filter(computed_at__lt=started).delete()
+    result = {"users": len(user_ids), "suggestions": stored, "stale_removed": stale}
+    logger.info("Friend suggestions rebuilt: %s", result)
+    return result
@@ -0,0 +1,154 @@
+"""
+Local IP geolocation.
+
+Lookups read a MaxMind-format city database (``GEOIP_DATABASE_PATH``, e.g.
+GeoLite2-City.mmdb) opened once per process in memory-mapped mode, so no
+request ever waits on the network. Results are kept in an in-process LRU
+cache of ``GEOIP_CACHE_SIZE`` addresses; login bursts and repeated
+``update_user_location`` calls from the same address skip the tree walk
+entirely.
+
+When the database file is missing or ``maxminddb`` is not installed,
+lookups return ``None`` and a single warning is logged; callers treat that
+the same as an unknown address. Private, loopback and reserved addresses
+are never looked up.
+"""
+
+import ipaddress
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _is_public(ip_address: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    return address.is_global
+
+
+def _english_name(entry: Optional[dict]) -> Optional[str]:
+    return ((entry or {}).get("names") or {}).get("en")
+
+
+def _parse(record: Optional[dict]) -> Optional[dict]:
+    if not record:
+        return None
+    subdivisions = record.get("subdivisions") or [None]
+    location = {
+        "country": _english_name(record.get("country")),
+        "state": _english_name(subdivisions[0]),
+        "city": _english_name(record.get("city")),
+    }
+    return location if any(location.values()) else None
+
+
+class GeoIPService:
+    """Memory-mapped MMDB reader with an LRU of parsed results."""
+
+    def __init__(self, path: Optional[str] = None, cache_size: Optional[int] = None, reader=None):
+        self.path = path if path is not None else getattr(settings, "GEOIP_DATABASE_PATH", None)
+        self._reader = reader
+        self._opened = reader is not None
+        self._lock = threading.Lock()
+        size = cache_size if cache_size is not None else getattr(settings, "GEOIP_CACHE_SIZE", 4096)
+        self.lookup = lru_cache(maxsize=size)(self._lookup)
+
+    def _get_reader(self):
+        if self._opened:
+            return self._reader
+        with self._lock:
+            if not self._opened:
+                self._reader = self._open()
+                self._opened = True
+        return self._reader
+
+    def _open(self):
+        if not self.path:
+            logger.warning("GEOIP_DATABASE_PATH is not set; IP geolocation is disabled")
+            return None
+        try:
+            import maxminddb
+
+            return maxminddb.open_database(str(self.path), maxminddb.MODE_MMAP)
+        except ImportError:
+            logger.warning("maxminddb is not installed; IP geolocation is disabled")
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not open GeoIP database %s: %s", self.path, exc)
+        return None
+
+    @property
+    def available(self) -> bool:
+        return self._get_reader() is not None
+
+    def _lookup(self, ip_address: str) -> Optional[dict]:
+        if not _is_public(ip_address):
+            return None
+        reader = self._get_reader()
+        if reader is None:
+            return None
+        try:
+            return _parse(reader.get(ip_address))
+        except ValueError as exc:
+            logger.debug("GeoIP lookup failed for %s: %s", ip_address, exc)
+            return None
+
+    def cache_info(self):
+        return self.lookup.cache_info()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = None
+            self._opened = False
+            self.lookup.cache_clear()
+
+
+_service: Optional[GeoIPService] = None
+_service_lock = threading.Lock()
+
+
+def check_database() -> None:
+    """Log an error at startup when the configured database file is missing."""
+    path = getattr(settings, "GEOIP_DATABASE_PATH", None)
+    if not path or not os.path.isfile(path):
+        logger.error(
+            "GeoIP database not found at %s; session locations will be empty. "
+            "Set MAXMIND_LICENSE_KEY (docker-entrypoint.sh downloads it) or "
+            "provision the file and point GEOIP_DATABASE_PATH at it.",
+            path,
+        )
+
+
+def get_geoip() -> GeoIPService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = GeoIPService()
+    return _service
+
+
+def lookup_ip(ip_address: Optional[str]) -> Optional[dict]:
+    """``{"country", "state", "city"}`` for ``ip_address``, or ``None``."""
+    if not ip_address:
+        return None
+    location = get_geoip().lookup(ip_address)
+    # Copy so callers cannot mutate the cached result.
+    return dict(location) if location else None
+
+
+def format_location(location: Optional[dict]) -> Optional[str]:
+    """Session-style location string: "City, Country" or just the country."""
+    if not location:
+        return None
+    parts = [location.get("city"), location.get("country")]
+    return ", ".join(part for part in parts if part) or None
@@ -9,6 +9,8 @@ from rest_framework.response import Response
 from rest_framework import status
 import logging
 
+from .geoip import lookup_ip
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,50 +30,10 @@ def get_location_from_ip(ip_address):
     """
     Get country, state, city from IP address.
 
-    Tries multiple methods:
-    1. Django's built-in GeoIP2 (requires MaxMind database)
-    2. Falls back to simple lookup via ip-api.com (free)
-    3. Returns None if all fail
+    Reads the local memory-mapped GeoIP database (see ``users.geoip``); no
+    network calls are made. Returns None when the address is unknown.
     """
-    # Try method 1: Django GeoIP2
-    try:
-        from django.contrib.gis.geoip2 import GeoIP2
-
-        g = GeoIP2()
-        location_data = g.city(ip_address)
-
-        return {
-            "country": location_data.get("country_name"),
-            "state": location_data.get("region"),  # State/Province
-            "city": location_data.get("city"),
-        }
-    except Exception as e:
-        logger.debug(f"GeoIP2 lookup failed for {ip_address}: {str(e)}")
-
-    # Try method 2: ip-api.com (free, public API)
-    try:
-        import requests
-
-        response = requests.get(
-            f"http://ip-api.com/json/{ip_address}",
-            timeout=2,
-            params={"fields": "country,regionName,city,status,message"},
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success":
-                return {
-                    "country": data.get("country"),
-                    "state": data.get("regionName"),
-                    "city": data.get("city"),
-                }
-
-        logger.debug(f"ip-api lookup failed: {data.get('message')}")
-    except Exception as e:
-        logger.debug(f"ip-api lookup failed for {ip_address}: {str(e)}")
-
-    return None
+    return lookup_ip(ip_address)
 
 
 @api_view(["POST"])
@@ -0,0 +1,354 @@
+"""
+Deferred login side-effects.
+
+A login only mints tokens. Everything else is described by a small event:
+who logged in, from where, the JTIs read straight from the freshly minted
+tokens, and the authentication method. The rest happens off the request
+path:
+
+- geolocation;
+- device naming;
+- reusing or creating the device's ``Session`` (one active row per device
+  key, enforced by a unique partial index);
+- the ``SessionHistory`` row;
+- the ``SecurityEvent`` row.
+
+Events are appended to a Redis list (``LOGIN_EVENTS_KEY``), and the first
+event in a window schedules ``main.tasks.process_login_events`` after
+``LOGIN_EVENTS_BATCH_DELAY`` seconds. The task drains the list in batches
+of ``LOGIN_EVENTS_BATCH_SIZE``, so concurrent logins share one session
+lookup, one bulk update and three bulk inserts.
+
+Each batch is moved atomically to a processing list before it is applied,
+and removed only after its transaction commits. A crashed worker's batch
+is picked up again by the next drain, so delivery is at least once. A
+batch that fails to apply is retried one event at a time; events that
+still fail go to ``DEAD_LETTER_KEY`` for inspection instead of blocking
+every later drain.
+
+A database outage is not an event failure: the batch stays claimed and
+the task retries it later.
+
+Until its ``Session`` row exists, a queued login is also recorded in a
+per-user hash (``login:pending:<user id>``, access JTI -> refresh JTI and
+time), written in the same pipeline as the event. Revoking all sessions
+reads that hash (``pending_logins``) so tokens minted moments earlier are
+denied too, and a queued login whose token was denied in the meantime is
+written as an already-revoked session.
+
+When ``LOGIN_EVENTS_ASYNC`` is off or Redis is unreachable, the event is
+applied inline through the same code path. After a Redis error, logins
+skip the queue for ``REDIS_RETRY_AFTER`` seconds rather than each waiting
+out the connect timeout.
+"""
+
+import json
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, transaction
+from django.utils import timezone
+
+from rest_framework_simplejwt.settings import api_settings
+
+from .device_utils import build_device_name, get_location_from_ip
+from .models import SecurityEvent, Session, SessionHistory
+from .token_denylist import denied_jtis
+
+logger = logging.getLogger(__name__)
+
+LOGIN_EVENTS_KEY = "login:events"
+PROCESSING_KEY = "login:events:processing"
+SCHEDULED_KEY = "login:events:scheduled"
+DRAIN_LOCK_KEY = "login:events:drain"
+DEAD_LETTER_KEY = "login:events:dead"
+PENDING_KEY_PREFIX = "login:pending:"
+REDIS_RETRY_AFTER = 30
+
+# Move up to ARGV[1] events from the queue to the processing list in one step.
+_CLAIM_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+_client = None
+# time.monotonic() before which Redis is assumed down.
+_unavailable_until = 0.0
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+
+        _client = redis.Redis.from_url(
+            settings.CELERY_REDIS_URL, socket_connect_timeout=1, socket_timeout=2
+        )
+    return _client
+
+
+def _pending_key(user_id) -> str:
+    return f"{PENDING_KEY_PREFIX}{user_id}"
+
+
+def build_login_event(
+    *,
+    user,
+    ip_address: Optional[str],
+    user_agent: Optional[str],
+    authentication_method: str,
+    description: str,
+    token_jti: Optional[str],
+    refresh_token_jti: Optional[str],
+    metadata: Optional[dict] = None,
+    device_id=None,
+    device_name: Optional[str] = None,
+) -> dict:
+    return {
+        "event_id": uuid.uuid4().hex,
+        "user_id": str(user.pk),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "device_id": str(device_id) if device_id else None,
+        "device_name": device_name,
+        "authentication_method": authentication_method,
+        "description": description,
+        "metadata": metadata or {},
+        "token_jti": token_jti,
+        "refresh_token_jti": refresh_token_jti,
+        "occurred_at": timezone.now().isoformat(),
+    }
+
+
+def enqueue_login_event(event: dict) -> None:
+    """Queue ``event`` for the batch worker, or apply it inline as a fallback."""
+    global _unavailable_until
+    if getattr(settings, "LOGIN_EVENTS_ASYNC", True) and time.monotonic() >= _unavailable_until:
+        import redis
+
+        delay = getattr(settings, "LOGIN_EVENTS_BATCH_DELAY", 1.0)
+        try:
+            pipe = _redis().pipeline()
+            pipe.rpush(LOGIN_EVENTS_KEY, json.dumps(event))
+            pipe.set(SCHEDULED_KEY, 1, nx=True, px=max(int(delay * 1000), 1))
+            if event["token_jti"]:
+                key = _pending_key(event["user_id"])
+                pipe.hset(
+                    key,
+                    event["token_jti"],
+                    json.dumps(
+                        {
+                            "refresh_token_jti": event["refresh_token_jti"],
+                            "occurred_at": event["occurred_at"],
+                        }
+                    ),
+                )
+                pipe.expire(key, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+            first_in_window = pipe.execute()[1]
+        except redis.RedisError as exc:
+            _unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+            logger.warning("Login event queue unavailable, applying inline: %s", exc)
+        else:
+            if first_in_window:
+                from main.tasks import process_login_events
+
+                process_login_events.apply_async(countdown=delay)
+            return
+    apply_login_events([event])
+
+
+def pending_logins(user_id) -> Dict[str, dict]:
+    """Queued logins of ``user_id`` without a ``Session`` row yet, by access JTI.
+
+    Each value holds ``refresh_token_jti`` and ``occurred_at``.
+    """
+    import redis
+
+    try:
+        raw = _redis().hgetall(_pending_key(user_id))
+    except redis.RedisError as exc:
+        logger.warning("Could not read pending logins for %s: %s", user_id, exc)
+        return {}
+    return {jti.decode(): json.loads(value) for jti, value in raw.items()}
+
+
+def _forget_pending(client, events: List[dict]) -> None:
+    pipe = client.pipeline(transaction=False)
+    for event in events:
+        if event.get("token_jti"):
+            pipe.hdel(_pending_key(event["user_id"]), event["token_jti"])
+    pipe.execute()
+
+
+def drain_login_events(batch_size: Optional[int] = None) -> Optional[int]:
+    """Apply queued events batch by batch; returns how many were applied.
+
+    Returns ``None`` without doing anything when another worker is draining.
+    """
+    batch_size = batch_size or getattr(settings, "LOGIN_EVENTS_BATCH_SIZE", 500)
+    client = _redis()
+    lock = client.lock(DRAIN_LOCK_KEY, timeout=300, blocking=False)
+    if not lock.acquire():
+        return None
+    try:
+        return _drain(client, batch_size)
+    finally:
+        lock.release()
+
+
+def _drain(client, batch_size: int) -> int:
+    applied = 0
+    # A previous worker may have died between claiming and applying a batch.
+    pending = client.lrange(PROCESSING_KEY, 0, -1)
+    claim = client.register_script(_CLAIM_SCRIPT)
+    while True:
+        if not pending:
+            pending = claim(keys=[LOGIN_EVENTS_KEY, PROCESSING_KEY], args=[batch_size])
+        if not pending:
+            return applied
+        try:
+            events = [json.loads(raw) for raw in pending]
+            apply_login_events(events)
+            _forget_pending(client, events)
+            applied += len(pending)
+        except (OperationalError, InterfaceError):
+            # The database is down, not the events: keep the batch claimed.
+            raise
+        except Exception:
+            logger.exception("Login batch of %d failed, applying one by one", len(pending))
+            applied += _apply_one_by_one(client, pending)
+        client.delete(PROCESSING_KEY)
+        pending = None
+
+
+def _apply_one_by_one(client, pending) -> int:
+    """Apply each raw event alone; dead-letter the ones that still fail."""
+    applied = 0
+    for raw in pending:
+        try:
+            event = json.loads(raw)
+            apply_login_events([event])
+            _forget_pending(client, [event])
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception:
+            logger.exception("Moving login event to %s", DEAD_LETTER_KEY)
+            client.rpush(DEAD_LETTER_KEY, raw)
+        else:
+            applied += 1
+    return applied
+
+
+def apply_login_events(events: List[dict]) -> None:
+    """Write sessions, history and security events for a batch of logins."""
+    if not events:
+        return
+    try:
+        _apply(events)
+    except IntegrityError:
+        # A concurrent inline login claimed the same device key; the retry
+        # sees its session and reuses it.
+        logger.info("Login batch raced on a device key, retrying")
+        _apply(events)
+
+
+def _apply(events: List[dict]) -> None:
+    user_ids = {event["user_id"] for event in events}
+    # The unique partial index guarantees one active session per device key.
+    active: Dict[tuple, Session] = {
+        (str(session.user_id), session.device_key): session
+        for session in Session.objects.filter(user_id__in=user_ids, revoked_at__isnull=True)
+    }
+
+    now = timezone.now()
+    to_update: Dict[uuid.UUID, Session] = {}
+    to_create: Dict[uuid.UUID, Session] = {}
+    history = []
+    security_events = []
+
+    for event in events:
+        ip_address = event["ip_address"]
+        user_agent = event["user_agent"]
+        location = get_location_from_ip(ip_address)
+        device_name = event["device_name"] or build_device_name(
+            user_agent, fallback=user_agent or "Unknown Device"
+        )
+        device_key = Session.device_key_for(event["device_id"], user_agent, device_name)
+        session = active.get((event["user_id"], device_key))
+
+        if session is None:
+            session = Session(id=uuid.uuid4(), user_id=event["user_id"], device_key=device_key)
+            to_create[session.pk] = session
+            active[(event["user_id"], device_key)] = session
+        elif session.pk not in to_create:
+            to_update[session.pk] = session
+
+        session.device_id = event["device_id"]
+        session.device_name = device_name
+        session.ip_address = ip_address
+        session.location = location
+        session.user_agent = user_agent
+        session.token_jti = event["token_jti"]
+        session.refresh_token_jti = event["refresh_token_jti"]
+        session.last_activity = now
+
+        history.append(
+            SessionHistory(
+                user_id=event["user_id"],
+                device_id=event["device_id"],
+                device_name=device_name,
+                ip_address=ip_address,
+                location=location,
+                user_agent=user_agent,
+                authentication_method=event["authentication_method"],
+            )
+        )
+        security_events.append(
+            SecurityEvent(
+                user_id=event["user_id"],
+                event_type="login",
+                description=event["description"],
+                ip_address=ip_address,
+                user_agent=user_agent,
+                metadata={
+                    "session_id": str(session.pk),
+                    "login_event_id": event["event_id"],
+                    "occurred_at": event["occurred_at"],
+                    **event["metadata"],
+                },
+            )
+        )
+
+    # Tokens revoked while their login was queued get an already-revoked session.
+    denied = denied_jtis(session.token_jti for session in [*to_update.values(), *to_create.values()])
+    for session in [*to_update.values(), *to_create.values()]:
+        if session.token_jti in denied:
+            session.revoked_at = now
+
+    with transaction.atomic():
+        if to_update:
+            Session.objects.bulk_update(
+                list(to_update.values()),
+                [
+                    "device_id",
+                    "device_name",
+                    "ip_address",
+                    "location",
+                    "user_agent",
+                    "token_jti",
+                    "refresh_token_jti",
+                    "last_activity",
+                    "revoked_at",
+                ],
+            )
+        if to_create:
+            Session.objects.bulk_create(list(to_create.values()))
+        SessionHistory.objects.bulk_create(history)
+        SecurityEvent.objects.bulk_create(security_events)
@@ -0,0 +1,40 @@
+"""
+Recompute stored friends-of-friends suggestion candidates.
+Runs nightly via Celery beat; use this command for manual runs or after
+bulk friendship imports.
+
+Usage:
+  python manage.py rebuild_friend_suggestions
+  python manage.py rebuild_friend_suggestions --top-k 100 --min-mutual 2
+"""
+
+from django.core.management.base import BaseCommand
+
+from users.friend_suggestions import rebuild_friend_suggestions
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user top-K friends-of-friends candidate store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=None)
+        parser.add_argument("--min-mutual", type=int, default=1)
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=2000,
+            help="Adjacency rows multiplied per batch; bounds peak memory.",
+        )
+
+    def handle(self, *args, **options):
+        result = rebuild_friend_suggestions(
+            top_k=options["top_k"],
+            min_mutual=options["min_mutual"],
+            block_size=options["block_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {result['suggestions']} suggestion(s) for {result['users']} user(s); "
+                f"removed {result['stale_removed']} stale row(s)."
+            )
+        )
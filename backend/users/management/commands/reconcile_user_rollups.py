@@ -0,0 +1,25 @@
+"""
+Rebuild the analytics rollup buckets from the User table.
+Runs nightly via Celery beat; use this command after bulk imports or raw
+updates that bypass model signals.
+
+Usage:
+  python manage.py reconcile_user_rollups
+"""
+
+from django.core.management.base import BaseCommand
+
+from users.analytics_rollup import reconcile_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute user analytics rollups (country/state/age/gender/signup day)."
+
+    def handle(self, *args, **options):
+        result = reconcile_rollups()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled {result['buckets']} bucket(s) covering {result['users']} user(s); "
+                f"removed {result['removed']} stale bucket(s)."
+            )
+        )
@@ -0,0 +1,69 @@
+"""
+Re-resolve Session and SessionHistory locations from their stored IPs.
+Uses the local GeoIP database only; run after installing or updating the
+MMDB file to backfill rows recorded while it was missing or stale.
+
+Usage:
+  python manage.py regeocode_sessions
+  python manage.py regeocode_sessions --only-missing --batch-size 5000
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.device_utils import get_location_from_ip
+from users.geoip import get_geoip
+from users.models import Session, SessionHistory
+
+
+class Command(BaseCommand):
+    help = "Bulk re-geocode session and login-history locations from IP addresses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only-missing",
+            action="store_true",
+            help="Only fill rows whose location is empty.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many rows would change without writing them.",
+        )
+
+    def handle(self, *args, **options):
+        if not get_geoip().available:
+            raise CommandError("GeoIP database is unavailable; check GEOIP_DATABASE_PATH")
+
+        for model in (Session, SessionHistory):
+            changed = self._regeocode(model, **options)
+            verb = "Would update" if options["dry_run"] else "Updated"
+            self.stdout.write(
+                self.style.SUCCESS(f"{model.__name__}: {verb} {changed} row(s).")
+            )
+        info = get_geoip().cache_info()
+        self.stdout.write(f"GeoIP cache: {info.hits} hit(s), {info.misses} miss(es)")
+
+    def _regeocode(self, model, only_missing, batch_size, dry_run, **options):
+        rows = model.objects.filter(ip_address__isnull=False)
+        if only_missing:
+            rows = rows.filter(location__isnull=True) | rows.filter(location="")
+
+        changed = 0
+        pending = []
+        for pk, ip_address, current in rows.values_list(
+            "pk", "ip_address", "location"
+        ).iterator(chunk_size=batch_size):
+            location = get_location_from_ip(ip_address)
+            if location and location != current:
+                pending.append(model(pk=pk, location=location))
+            if len(pending) >= batch_size:
+                changed += self._flush(model, pending, dry_run)
+                pending = []
+        changed += self._flush(model, pending, dry_run)
+        return changed
+
+    def _flush(self, model, rows, dry_run):
+        if rows and not dry_run:
+            model.objects.bulk_update(rows, ["location"])
+        return len(rows)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_social_account'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='securityevent',
+            index=models.Index(fields=['created_at'], name='users_secur_created_b703c6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionhistory',
+            index=models.Index(fields=['created_at'], name='users_sessi_created_bbf4f5_idx'),
+        ),
+    ]
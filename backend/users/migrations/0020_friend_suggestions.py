@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_retention_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutual_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='friendsuggestion',
+            name='candidate',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='friendsuggestion',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_suggestions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='friendsuggestion',
+            index=models.Index(fields=['user', '-mutual_count'], name='users_frien_user_id_cb8708_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendsuggestion',
+            unique_together={('user', 'candidate')},
+        ),
+    ]
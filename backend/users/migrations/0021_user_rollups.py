@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:51
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+DIMENSIONS = ('country', 'state', 'age', 'gender', 'signup_day', 'is_online')
+
+
+def backfill_rollups(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    UserRollup = apps.get_model('users', 'UserRollup')
+
+    grouped = (
+        User.objects.annotate(signup_day=TruncDate('date_joined'))
+        .values(*DIMENSIONS)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    rows = []
+    for entry in grouped.iterator():
+        bucket = tuple(entry[name] for name in DIMENSIONS)
+        rows.append(
+            UserRollup(
+                bucket_key=hashlib.sha256(repr(bucket).encode()).hexdigest(),
+                count=entry['total'],
+                **{name: entry[name] for name in DIMENSIONS},
+            )
+        )
+    UserRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_friend_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_key', models.CharField(max_length=64, unique=True)),
+                ('country', models.CharField(blank=True, max_length=100, null=True)),
+                ('state', models.CharField(blank=True, max_length=100, null=True)),
+                ('age', models.IntegerField(blank=True, null=True)),
+                ('gender', models.CharField(blank=True, max_length=50, null=True)),
+                ('signup_day', models.DateField(blank=True, null=True)),
+                ('is_online', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userrollup',
+            index=models.Index(fields=['country', 'state'], name='users_userr_country_5302b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userrollup',
+            index=models.Index(fields=['signup_day'], name='users_userr_signup__fee596_idx'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
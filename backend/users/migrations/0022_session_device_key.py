@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:05
+
+import hashlib
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def device_key(session):
+    if session.device_id:
+        return f'device:{session.device_id}'
+    if session.user_agent:
+        return 'ua:' + hashlib.sha256(session.user_agent.encode()).hexdigest()
+    if session.device_name:
+        return 'name:' + hashlib.sha256(session.device_name.encode()).hexdigest()
+    return f'session:{session.pk}'
+
+
+def backfill_device_keys(apps, schema_editor):
+    Session = apps.get_model('users', 'Session')
+
+    seen = set()
+    duplicates = []
+    batch = []
+    sessions = Session.objects.order_by('user_id', '-last_activity').only(
+        'id', 'user_id', 'device_id', 'user_agent', 'device_name', 'revoked_at'
+    )
+    for session in sessions.iterator(chunk_size=2000):
+        session.device_key = device_key(session)
+        if session.revoked_at is None:
+            # Keep the most recent active session per device; older ones were
+            # already hidden from the session list.
+            if (session.user_id, session.device_key) in seen:
+                duplicates.append(session.pk)
+            seen.add((session.user_id, session.device_key))
+        batch.append(session)
+        if len(batch) >= 2000:
+            Session.objects.bulk_update(batch, ['device_key'])
+            batch = []
+    if batch:
+        Session.objects.bulk_update(batch, ['device_key'])
+    for start in range(0, len(duplicates), 2000):
+        Session.objects.filter(pk__in=duplicates[start:start + 2000]).update(revoked_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_user_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='device_key',
+            field=models.CharField(blank=True, default='', help_text='Identity of the device/browser; at most one active session per key', max_length=80, verbose_name='Device Key'),
+        ),
+        migrations.RunPython(backfill_device_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('revoked_at__isnull', True)), fields=['user', '-last_activity'], name='session_active_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(condition=models.Q(('revoked_at__isnull', True)), fields=('user', 'device_key'), name='unique_active_session_per_device'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_session_device_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_image_blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:33
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+DIMENSIONS = ('country', 'state', 'age', 'gender', 'signup_day')
+
+
+def rebuild_rollups(apps, schema_editor):
+    # Dropping is_online merges buckets and changes every bucket key.
+    User = apps.get_model('users', 'User')
+    UserRollup = apps.get_model('users', 'UserRollup')
+
+    UserRollup.objects.all().delete()
+    grouped = (
+        User.objects.annotate(signup_day=TruncDate('date_joined'))
+        .values(*DIMENSIONS)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    rows = []
+    for entry in grouped.iterator():
+        bucket = tuple(entry[name] for name in DIMENSIONS)
+        rows.append(
+            UserRollup(
+                bucket_key=hashlib.sha256(repr(bucket).encode()).hexdigest(),
+                count=entry['total'],
+                **{name: entry[name] for name in DIMENSIONS},
+            )
+        )
+    UserRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userrollup',
+            name='is_online',
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_online', True)), fields=['country', 'state'], name='users_user_online_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from typing import Iterable
+import hashlib
+from typing import Iterable, Optional
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
@@ -58,6 +59,9 @@ class User(AbstractUser):
     )
     phone_number = models.CharField(max_length=13, null=True)
     profile_image_url = models.URLField(_("Display Picture"), null=True, blank=True)
+    # Renditions of profile_image_url; see main.image_derivatives.
+    profile_image_variants = models.JSONField(default=dict, blank=True)
+    profile_image_blurhash = models.CharField(max_length=64, blank=True, default="")
     bio = models.TextField(_("Bio"), null=True, blank=True)
     gender = models.CharField(_("Gender"), max_length=50, default="Not specified")
 
@@ -102,6 +106,16 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Online users are a small slice; analytics groups them live.
+            models.Index(
+                fields=["country", "state"],
+                condition=models.Q(is_online=True),
+                name="users_user_online_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.email
 
@@ -261,6 +275,47 @@ class DismissedSuggestion(models.Model):
         return f"{self.user} dismissed {self.dismissed_user}"
 
 
+class FriendSuggestion(models.Model):
+    """Precomputed friends-of-friends candidate, rebuilt by the nightly batch."""
+
+    user = models.ForeignKey(
+        "users.User", on_delete=models.CASCADE, related_name="friend_suggestions"
+    )
+    candidate = models.ForeignKey(
+        "users.User", on_delete=models.CASCADE, related_name="suggested_to"
+    )
+    mutual_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = (("user", "candidate"),)
+        indexes = [models.Index(fields=["user", "-mutual_count"])]
+
+    def __str__(self) -> str:
+        return f"{self.candidate} suggested to {self.user} ({self.mutual_count} mutual)"
+
+
+class UserRollup(models.Model):
+    """User counts per (country, state, age, gender, signup day) bucket."""
+
+    bucket_key = models.CharField(max_length=64, unique=True)
+    country = models.CharField(max_length=100, null=True, blank=True)
+    state = models.CharField(max_length=100, null=True, blank=True)
+    age = models.IntegerField(null=True, blank=True)
+    gender = models.CharField(max_length=50, null=True, blank=True)
+    signup_day = models.DateField(null=True, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["country", "state"]),
+            models.Index(fields=["signup_day"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.bucket_key}: {self.count}"
+
+
 class FriendshipHistory(models.Model):
     """Track additions and removals of friends to show friend changes history"""
 
@@ -470,6 +525,13 @@ class Session(models.Model):
         blank=True,
         help_text="When this session was revoked",
     )
+    device_key = models.CharField(
+        _("Device Key"),
+        max_length=80,
+        blank=True,
+        default="",
+        help_text="Identity of the device/browser; at most one active session per key",
+    )
 
     class Meta:
         verbose_name = _("Session")
@@ -478,12 +540,41 @@ class Session(models.Model):
         indexes = [
             models.Index(fields=["user", "-last_activity"]),
             models.Index(fields=["device_id"]),
+            # Serves the "current sessions" listing with a single index range scan.
+            models.Index(
+                fields=["user", "-last_activity"],
+                condition=models.Q(revoked_at__isnull=True),
+                name="session_active_user_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "device_key"],
+                condition=models.Q(revoked_at__isnull=True),
+                name="unique_active_session_per_device",
+            ),
         ]
 
     def __str__(self) -> str:
         device = self.device_name or "Unknown Device"
         return f"Session for {self.user.email} on {device}"
 
+    @staticmethod
+    def device_key_for(device_id=None, user_agent: Optional[str] = None, device_name: Optional[str] = None) -> str:
+        """Passkey device id, else user agent, else device name."""
+        if device_id:
+            return f"device:{device_id}"
+        if user_agent:
+            return "ua:" + hashlib.sha256(user_agent.encode()).hexdigest()
+        if device_name:
+            return "name:" + hashlib.sha256(device_name.encode()).hexdigest()
+        return ""
+
+    def save(self, *args, **kwargs):
+        if not self.device_key:
+            self.device_key = self.device_key_for(self.device_id, self.user_agent, self.device_name) or f"session:{self.pk}"
+        super().save(*args, **kwargs)
+
 
 class SessionHistory(models.Model):
     """Historical record of login sessions for activity log."""
@@ -554,6 +645,7 @@ class SessionHistory(models.Model):
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["user", "-created_at"]),
+            models.Index(fields=["created_at"]),
         ]
 
     def __str__(self) -> str:
@@ -629,6 +721,7 @@ class SecurityEvent(models.Model):
         indexes = [
             models.Index(fields=["user", "-created_at"]),
             models.Index(fields=["event_type", "-created_at"]),
+            models.Index(fields=["created_at"]),
         ]
 
     def __str__(self) -> str:
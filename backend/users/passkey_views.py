@@ -617,16 +617,12 @@ class PasskeyAuthenticateCompleteView(APIView):
             except (InvalidToken, TokenError, KeyError):
                 pass  # If we can't get refresh token jti, continue without it
 
-            # Keep one active session row per passkey device.
-            session = (
-                Session.objects.filter(
-                    user=user,
-                    device_id=passkey_credential.id,
-                    revoked_at__isnull=True,
-                )
-                .order_by("-last_activity")
-                .first()
-            )
+            # Keep one active session row per passkey device (enforced by a unique partial index).
+            session = Session.objects.filter(
+                user=user,
+                device_key=Session.device_key_for(passkey_credential.id),
+                revoked_at__isnull=True,
+            ).first()
             if session:
                 session.device_name = passkey_credential.device_name
                 session.ip_address = ip_address
@@ -634,7 +630,6 @@ class PasskeyAuthenticateCompleteView(APIView):
                 session.user_agent = user_agent
                 session.token_jti = token_jti
                 session.refresh_token_jti = refresh_token_jti
-                session.revoked_at = None
                 session.save(
                     update_fields=[
                         "device_name",
@@ -643,15 +638,9 @@ class PasskeyAuthenticateCompleteView(APIView):
                         "user_agent",
                         "token_jti",
                         "refresh_token_jti",
-                        "revoked_at",
                         "last_activity",
                     ]
                 )
-                Session.objects.filter(
-                    user=user,
-                    device_id=passkey_credential.id,
-                    revoked_at__isnull=True,
-                ).exclude(id=session.id).update(revoked_at=timezone.now())
             else:
                 session = Session.objects.create(
                     user=user,
@@ -1,5 +1,5 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import BlockedUsers, Friends, User
+from .social_graph import graph_for
 
 
 class IsBlocked(BasePermission):
@@ -25,15 +25,8 @@ class IsBlocked(BasePermission):
         if target_user is None:
             return False
 
-        # Check if the user has blocked the target user
-        if BlockedUsers.objects.filter(user=user, blocked_user=target_user).exists():
-            return False
-
-        # Check if the target user has blocked the user
-        if BlockedUsers.objects.filter(user=target_user, blocked_user=user).exists():
-            return False
-
-        return True
+        # Check if either user has blocked the other
+        return target_user.id not in graph_for(request).block_exclusions()
 class IsFriend(BasePermission):
     """
     Custom permission to only allow actions if the user is friends with the target user.
@@ -58,4 +51,4 @@ class IsFriend(BasePermission):
         if target is None:
             return False
 
-        return Friends.objects.filter(user=user, friend=target).exists()
+        return graph_for(request).is_friend(target.id)
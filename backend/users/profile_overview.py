@@ -0,0 +1,188 @@
+"""
+Building blocks for the profile overview endpoint.
+
+``resolve_profile`` loads the target (by slug or id) together with every
+viewer/target relationship edge — blocks in both directions, the friendship
+row and pending requests in both directions — as annotations on a single
+query.
+
+The profile header (public fields, privacy flags, post/friend counters and
+recent photo URLs) depends only on the target and on the viewer's
+relationship class, so it is cached per ``(target, class)`` pair for
+``PROFILE_HEADER_CACHE_TTL`` seconds. Signals on posts, media, friendships,
+profile and settings saves call ``invalidate_profile``; popular profiles are
+then served from a handful of cache entries however many people view them.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from main.models import Post, PostMedia
+
+from .models import BlockedUsers, FriendRequest, Friends, User
+from .social_graph import SocialGraph
+
+SELF = "self"
+FRIEND = "friend"
+OTHER = "other"
+BLOCKING_SUFFIX = ":blocking"
+RELATIONSHIP_CLASSES = (
+    SELF,
+    FRIEND,
+    OTHER,
+    FRIEND + BLOCKING_SUFFIX,
+    OTHER + BLOCKING_SUFFIX,
+)
+
+RECENT_PHOTO_POSTS = 30
+RECENT_PHOTOS = 12
+
+
+def _header_key(user_id, relationship_class: str) -> str:
+    return f"profile:header:{user_id}:{relationship_class}"
+
+
+def resolve_profile(viewer, lookup):
+    """Return the target user annotated with its relationship to ``viewer``.
+
+    Annotations: ``viewer_block_id``, ``blocked_by_target``,
+    ``friend_entry_id``, ``incoming_request_id`` and ``outgoing_request_id``.
+    A slug match wins over an id match. Returns ``None`` when not found.
+    """
+    match = Q(slug=lookup)
+    try:
+        match |= Q(id=uuid.UUID(str(lookup)))
+    except ValueError:
+        pass
+
+    pending = FriendRequest.objects.filter(status="pending")
+    candidates = list(
+        User.objects.filter(match)
+        .select_related("user_settings")
+        .annotate(
+            viewer_block_id=Subquery(
+                BlockedUsers.objects.filter(
+                    user=viewer, blocked_user=OuterRef("pk")
+                ).values("id")[:1]
+            ),
+            blocked_by_target=Exists(
+                BlockedUsers.objects.filter(user=OuterRef("pk"), blocked_user=viewer)
+            ),
+            friend_entry_id=Subquery(
+                Friends.objects.filter(user=viewer, friend=OuterRef("pk")).values("id")[:1]
+            ),
+            incoming_request_id=Subquery(
+                pending.filter(from_user=OuterRef("pk"), to_user=viewer).values("id")[:1]
+            ),
+            outgoing_request_id=Subquery(
+                pending.filter(from_user=viewer, to_user=OuterRef("pk")).values("id")[:1]
+            ),
+        )[:2]
+    )
+    for target in candidates:
+        if target.slug == lookup:
+            return target
+    return candidates[0] if candidates else None
+
+
+def relationship_class(is_self: bool, is_friend: bool, viewer_has_blocked: bool) -> str:
+    if is_self:
+        return SELF
+    base = FRIEND if is_friend else OTHER
+    return base + BLOCKING_SUFFIX if viewer_has_blocked else base
+
+
+def visible_posts(target, relationship: str):
+    """The target's personal posts visible to viewers of ``relationship``."""
+    # Only count personal posts (author_type="user"), exclude page posts
+    posts = Post.objects.filter(author=target, deleted_at__isnull=True, author_type="user")
+    if relationship != SELF:
+        levels = ["public", "friends"] if relationship.startswith(FRIEND) else ["public"]
+        posts = posts.filter(visibility__in=levels)
+    return posts
+
+
+def _build_header(target, relationship: str) -> dict:
+    is_self = relationship == SELF
+    is_friend = relationship.startswith(FRIEND)
+    viewer_has_blocked = relationship.endswith(BLOCKING_SUFFIX)
+
+    user_settings = getattr(target, "user_settings", None)
+    profile_privacy = getattr(user_settings, "profile_privacy", "public")
+    friends_publicity = getattr(user_settings, "friends_publicity", "public")
+
+    can_view_posts = True
+    if not is_self:
+        if profile_privacy == "only_me":
+            can_view_posts = False
+        elif profile_privacy == "private" and not is_friend:
+            can_view_posts = False
+    if viewer_has_blocked:
+        # viewer chose to block; still allow viewing profile metadata but hide posts
+        can_view_posts = False
+
+    can_view_friend_count = True
+    if not is_self:
+        if friends_publicity == "only_me":
+            can_view_friend_count = False
+        elif friends_publicity == "private" and not is_friend:
+            can_view_friend_count = False
+
+    post_count = None
+    photos = []
+    if can_view_posts:
+        posts = visible_posts(target, relationship)
+        post_count = posts.count()
+        recent_ids = posts.order_by("-created_at").values("id")[:RECENT_PHOTO_POSTS]
+        photos = list(
+            PostMedia.objects.filter(post_id__in=Subquery(recent_ids))
+            .order_by("-id")
+            .values_list("url", flat=True)[:RECENT_PHOTOS]
+        )
+
+    friend_count = len(SocialGraph(target.id).friends) if can_view_friend_count else None
+
+    return {
+        "user": {
+            "id": str(target.id),
+            "slug": target.slug,
+            "username": target.username,
+            "first_name": target.first_name,
+            "last_name": target.last_name,
+            "profile_image_url": target.profile_image_url,
+            "bio": target.bio,
+            "date_joined": (
+                target.date_joined.isoformat() if target.date_joined else None
+            ),
+        },
+        "stats": {
+            "post_count": post_count,
+            "friend_count": friend_count,
+            "photos": photos,
+        },
+        "can_view_posts": can_view_posts,
+        "can_view_friend_count": can_view_friend_count,
+        "privacy": {
+            "profile_privacy": profile_privacy,
+            "friends_publicity": friends_publicity,
+        },
+    }
+
+
+def profile_header(target, relationship: str) -> dict:
+    """Cached header for ``target`` as seen by viewers of ``relationship``."""
+    key = _header_key(target.id, relationship)
+    header = cache.get(key)
+    if header is None:
+        header = _build_header(target, relationship)
+        cache.set(key, header, timeout=getattr(settings, "PROFILE_HEADER_CACHE_TTL", 300))
+    return header
+
+
+def invalidate_profile(user_id) -> None:
+    keys = [_header_key(user_id, relationship) for relationship in RELATIONSHIP_CLASSES]
+    transaction.on_commit(lambda: cache.delete_many(keys))
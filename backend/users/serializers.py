@@ -103,6 +103,8 @@ class UserSerializer(serializers.ModelSerializer):
             "username",
             "phone_number",
             "profile_image_url",
+            "profile_image_variants",
+            "profile_image_blurhash",
             "bio",
             "gender",
             "date_joined",
@@ -113,6 +115,8 @@ class UserSerializer(serializers.ModelSerializer):
             "id",
             "slug",
             "email",
+            "profile_image_variants",
+            "profile_image_blurhash",
             "date_joined",
             "is_online",
             "last_seen",
@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import analytics_rollup, social_graph
+from .models import BlockedUsers, DismissedSuggestion, Friends, User, UserSettings
+from .profile_overview import invalidate_profile
+
+
+@receiver(post_save, sender=Friends)
+@receiver(post_delete, sender=Friends)
+def friends_changed(sender, instance, **kwargs):
+    social_graph.invalidate(instance.user_id, social_graph.FRIENDS)
+    social_graph.invalidate(instance.friend_id, social_graph.FRIENDS)
+    invalidate_profile(instance.user_id)
+    invalidate_profile(instance.friend_id)
+
+
+@receiver(post_save, sender=BlockedUsers)
+@receiver(post_delete, sender=BlockedUsers)
+def blocks_changed(sender, instance, **kwargs):
+    social_graph.invalidate(instance.user_id, social_graph.BLOCKED)
+    social_graph.invalidate(instance.blocked_user_id, social_graph.BLOCKED_BY)
+
+
+@receiver(post_save, sender=DismissedSuggestion)
+@receiver(post_delete, sender=DismissedSuggestion)
+def dismissed_suggestions_changed(sender, instance, **kwargs):
+    social_graph.invalidate(instance.user_id, social_graph.DISMISSED)
+
+
+@receiver(post_save, sender=User)
+def profile_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    invalidate_profile(instance.pk)
+
+
+@receiver(post_save, sender=UserSettings)
+@receiver(post_delete, sender=UserSettings)
+def profile_settings_changed(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver(post_init, sender=User)
+def remember_rollup_bucket(sender, instance, **kwargs):
+    analytics_rollup.remember_bucket(instance)
+
+
+@receiver(post_save, sender=User)
+def update_rollups(sender, instance, created, update_fields=None, **kwargs):
+    analytics_rollup.apply_user_change(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_rollups(sender, instance, **kwargs):
+    analytics_rollup.apply_user_delete(instance)
@@ -0,0 +1,155 @@
+"""
+Cached adjacency sets for the social graph.
+
+Each user's friend, blocked, blocked-by and dismissed-suggestion sets are
+stored in the shared cache as packed UUID arrays (16 bytes per id) and
+unpacked into frozensets, so membership checks are O(1) and callers can
+intersect sets (mutual friends, visibility) without touching the database.
+Entries are invalidated by the ``Friends``/``BlockedUsers``/
+``DismissedSuggestion`` signals in ``users.signals`` and otherwise live for
+``SOCIAL_GRAPH_CACHE_TTL`` seconds.
+"""
+
+import uuid
+from typing import Dict, FrozenSet, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BlockedUsers, DismissedSuggestion, Friends
+
+FRIENDS = "friends"
+BLOCKED = "blocked"
+BLOCKED_BY = "blocked_by"
+DISMISSED = "dismissed"
+RELATIONS = (FRIENDS, BLOCKED, BLOCKED_BY, DISMISSED)
+
+EMPTY: FrozenSet[uuid.UUID] = frozenset()
+
+
+def _cache_key(relation: str, user_id) -> str:
+    return f"graph:{relation}:{user_id}"
+
+
+def pack_ids(ids: Iterable[uuid.UUID]) -> bytes:
+    return b"".join(sorted(user_id.bytes for user_id in ids))
+
+
+def unpack_ids(blob: bytes) -> FrozenSet[uuid.UUID]:
+    return frozenset(uuid.UUID(bytes=blob[i : i + 16]) for i in range(0, len(blob), 16))
+
+
+def _load(relation: str, user_id) -> FrozenSet[uuid.UUID]:
+    if relation == FRIENDS:
+        # Friendships are stored as two rows; read both directions defensively.
+        forward = Friends.objects.filter(user_id=user_id).values_list("friend_id", flat=True)
+        reverse = Friends.objects.filter(friend_id=user_id).values_list("user_id", flat=True)
+        return frozenset(forward.union(reverse))
+    if relation == BLOCKED:
+        rows = BlockedUsers.objects.filter(user_id=user_id).values_list(
+            "blocked_user_id", flat=True
+        )
+    elif relation == BLOCKED_BY:
+        rows = BlockedUsers.objects.filter(blocked_user_id=user_id).values_list(
+            "user_id", flat=True
+        )
+    elif relation == DISMISSED:
+        rows = DismissedSuggestion.objects.filter(user_id=user_id).values_list(
+            "dismissed_user_id", flat=True
+        )
+    else:
+        raise ValueError(f"Unknown social graph relation: {relation}")
+    return frozenset(rows)
+
+
+def get_relations(user_id, relations: Iterable[str] = RELATIONS) -> Dict[str, FrozenSet[uuid.UUID]]:
+    """Fetch several of a user's sets in one cache round trip."""
+    relations = list(relations)
+    keys = {_cache_key(relation, user_id): relation for relation in relations}
+    cached = cache.get_many(list(keys))
+    result = {keys[key]: unpack_ids(blob) for key, blob in cached.items()}
+
+    missing = {}
+    for key, relation in keys.items():
+        if relation not in result:
+            result[relation] = _load(relation, user_id)
+            missing[key] = pack_ids(result[relation])
+    if missing:
+        cache.set_many(missing, timeout=getattr(settings, "SOCIAL_GRAPH_CACHE_TTL", 3600))
+    return result
+
+
+def invalidate(user_id, *relations: str) -> None:
+    keys = [_cache_key(relation, user_id) for relation in relations or RELATIONS]
+    # Clear after commit so a concurrent reader cannot re-cache pre-commit rows.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class SocialGraph:
+    """One user's view of the graph; sets are loaded lazily and memoized."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._sets: Dict[str, FrozenSet[uuid.UUID]] = {}
+
+    def prefetch(self, *relations: str) -> "SocialGraph":
+        wanted = [relation for relation in relations or RELATIONS if relation not in self._sets]
+        if wanted:
+            self._sets.update(get_relations(self.user_id, wanted))
+        return self
+
+    def _get(self, relation: str) -> FrozenSet[uuid.UUID]:
+        if relation not in self._sets:
+            self.prefetch(relation)
+        return self._sets[relation]
+
+    @property
+    def friends(self) -> FrozenSet[uuid.UUID]:
+        return self._get(FRIENDS)
+
+    @property
+    def blocked(self) -> FrozenSet[uuid.UUID]:
+        return self._get(BLOCKED)
+
+    @property
+    def blocked_by(self) -> FrozenSet[uuid.UUID]:
+        return self._get(BLOCKED_BY)
+
+    @property
+    def dismissed(self) -> FrozenSet[uuid.UUID]:
+        return self._get(DISMISSED)
+
+    def is_friend(self, other_id) -> bool:
+        return _as_uuid(other_id) in self.friends
+
+    def has_blocked(self, other_id) -> bool:
+        return _as_uuid(other_id) in self.blocked
+
+    def is_blocked_by(self, other_id) -> bool:
+        return _as_uuid(other_id) in self.blocked_by
+
+    def block_exclusions(self) -> FrozenSet[uuid.UUID]:
+        """Users hidden from each other in either direction."""
+        return self.blocked | self.blocked_by
+
+    def mutual_friends(self, other_id) -> FrozenSet[uuid.UUID]:
+        return self.friends & SocialGraph(other_id).friends
+
+
+def _as_uuid(value) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def graph_for(request) -> SocialGraph:
+    """Graph for ``request.user``, memoized on the request.
+
+    The memo lives on the request rather than the user instance, which can
+    outlive a request (e.g. a test client's forced user) and would otherwise
+    keep serving sets from before a later change.
+    """
+    graph = getattr(request, "_social_graph", None)
+    if graph is None or graph.user_id != request.user.id:
+        graph = SocialGraph(request.user.id)
+        request._social_graph = graph
+    return graph
@@ -1,4 +1,6 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 
 from users.models import Session, User, UserSettings
@@ -25,6 +27,7 @@ class LoginCaseSensitivityTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("access_token", response.data)
 
+    @override_settings(LOGIN_EVENTS_ASYNC=False)
     def test_same_device_login_reuses_active_session(self):
         user_agent = (
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -43,3 +46,665 @@ class LoginCaseSensitivityTests(TestCase):
         sessions = Session.objects.filter(user=self.user, revoked_at__isnull=True)
         self.assertEqual(sessions.count(), 1)
         self.assertEqual(sessions.first().device_name, "Chrome on macOS")
+
+
+class SocialGraphCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.alice = User.objects.create_user(
+            email="alice@example.com", password="pw", username="alice"
+        )
+        self.bob = User.objects.create_user(
+            email="bob@example.com", password="pw", username="bob"
+        )
+
+    def test_sets_are_cached_and_invalidated_on_change(self):
+        from users.models import BlockedUsers, Friends
+        from users.social_graph import SocialGraph
+
+        self.assertFalse(SocialGraph(self.alice.id).is_friend(self.bob.id))
+        with self.assertNumQueries(0):
+            self.assertEqual(SocialGraph(self.alice.id).friends, frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friends.objects.create(user=self.alice, friend=self.bob)
+            Friends.objects.create(user=self.bob, friend=self.alice)
+        self.assertTrue(SocialGraph(self.alice.id).is_friend(self.bob.id))
+        self.assertTrue(SocialGraph(self.bob.id).is_friend(str(self.alice.id)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block = BlockedUsers.objects.create(user=self.bob, blocked_user=self.alice)
+        self.assertTrue(SocialGraph(self.alice.id).is_blocked_by(self.bob.id))
+        self.assertIn(self.alice.id, SocialGraph(self.bob.id).block_exclusions())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block.delete()
+        self.assertFalse(SocialGraph(self.alice.id).is_blocked_by(self.bob.id))
+
+
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(
+                email=f"{name}@example.com", password="pw", username=name
+            )
+            for name in ("alice", "bob", "carol", "dave", "erin")
+        }
+
+    def befriend(self, a, b):
+        from users.models import Friends
+
+        Friends.objects.create(user=self.users[a], friend=self.users[b])
+        Friends.objects.create(user=self.users[b], friend=self.users[a])
+
+    def test_rebuild_ranks_by_mutual_friends_and_endpoint_filters(self):
+        from users.friend_suggestions import rebuild_friend_suggestions
+        from users.models import BlockedUsers, FriendSuggestion
+
+        # alice-bob, alice-carol; dave knows bob and carol, erin knows bob only.
+        self.befriend("alice", "bob")
+        self.befriend("alice", "carol")
+        self.befriend("dave", "bob")
+        self.befriend("dave", "carol")
+        self.befriend("erin", "bob")
+
+        result = rebuild_friend_suggestions(top_k=10)
+        self.assertEqual(result["users"], 5)
+        alice = self.users["alice"]
+        stored = list(
+            FriendSuggestion.objects.filter(user=alice)
+            .order_by("-mutual_count")
+            .values_list("candidate__username", "mutual_count")
+        )
+        self.assertEqual(stored, [("dave", 2), ("erin", 1)])
+
+        client = APIClient()
+        client.force_authenticate(alice)
+        response = client.get("/api/auth/friends/suggestions/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(u["username"], u["mutual_friends_count"]) for u in response.data["results"]],
+            [("dave", 2), ("erin", 1)],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlockedUsers.objects.create(user=self.users["dave"], blocked_user=alice)
+        # The graph is memoized per user instance, i.e. per request.
+        client.force_authenticate(User.objects.get(pk=alice.pk))
+        response = client.get("/api/auth/friends/suggestions/")
+        self.assertEqual(
+            [u["username"] for u in response.data["results"]], ["erin"]
+        )
+
+
+class ProfileOverviewTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            email="viewer@example.com", password="pw", username="viewer"
+        )
+        self.target = User.objects.create_user(
+            email="target@example.com", password="pw", username="target"
+        )
+        self.client = APIClient()
+
+    def get_overview(self):
+        # A fresh user instance per request, as in production.
+        self.client.force_authenticate(User.objects.get(pk=self.viewer.pk))
+        return self.client.get(f"/api/auth/user/{self.target.slug}/overview/")
+
+    def test_relationship_and_cached_header(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from main.models import Post
+        from users.models import FriendRequest
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request = FriendRequest.objects.create(
+                from_user=self.target, to_user=self.viewer
+            )
+            Post.objects.create(author=self.target, content="hello", visibility="public")
+            Post.objects.create(author=self.target, content="close", visibility="friends")
+
+        response = self.get_overview()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["relationship"]["status"], "incoming_request")
+        self.assertEqual(response.data["relationship"]["incoming_request_id"], request.id)
+        self.assertEqual(response.data["stats"]["post_count"], 1)
+        self.assertEqual(len(response.data["recent_posts"]), 1)
+
+        with CaptureQueriesContext(connection) as warm:
+            self.get_overview()
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.target, content="again", visibility="public")
+        with CaptureQueriesContext(connection) as cold:
+            response = self.get_overview()
+        self.assertEqual(response.data["stats"]["post_count"], 2)
+        self.assertLess(len(warm), len(cold))
+
+
+class AnalyticsRollupTests(TestCase):
+    def snapshot(self):
+        from users.models import UserRollup
+
+        return sorted(
+            UserRollup.objects.filter(count__gt=0).values_list("bucket_key", "count")
+        )
+
+    def test_incremental_buckets_match_reconcile_and_feed_endpoints(self):
+        from users.analytics_rollup import reconcile_rollups
+
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="pw", username="admin"
+        )
+        ada = User.objects.create_user(
+            email="ada@example.com", password="pw", username="ada",
+            country="Kenya", state="Nairobi", age=30, gender="female",
+        )
+        User.objects.create_user(
+            email="bo@example.com", password="pw", username="bo",
+            country="Kenya", state="Mombasa", age=40, gender="male",
+        )
+        ada.country, ada.state = "Ghana", "Accra"
+        ada.save()
+        bo = User.objects.get(username="bo")
+        bo.is_online = True
+        bo.save(update_fields=["is_online"])
+        User.objects.get(username="admin").delete()
+
+        incremental = self.snapshot()
+        reconcile_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+        admin = User.objects.create_superuser(
+            email="root@example.com", password="pw", username="root"
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        countries = client.get("/api/auth/admin/analytics/by-country/").data
+        self.assertEqual(
+            [(c["country"], c["total"], c["active"]) for c in countries],
+            [("Ghana", 1, 0), ("Kenya", 1, 1)],
+        )
+        segment = client.get(
+            "/api/auth/admin/analytics/micro-segmentation/",
+            {"country": "Kenya", "refresh": "true"},
+        ).data
+        summary = segment["summary"]
+        self.assertEqual((summary["total"], summary["male"]), (1, 1))
+        self.assertEqual(summary["average_age"], 40)
+        self.assertEqual(segment["breakdown"]["by_age"], [{"age": 40, "count": 1}])
+        self.assertLess(segment["snapshot"]["age_seconds"], 60)
+
+        # Unknown dictionary values match nothing rather than erroring.
+        empty = client.get(
+            "/api/auth/admin/analytics/micro-segmentation/", {"country": "Atlantis"}
+        ).data
+        self.assertEqual(empty["summary"]["total"], 0)
+        self.assertEqual(empty["breakdown"]["by_gender"], [])
+
+    def test_presence_changes_skip_rollups_and_reconcile_upserts(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from users.analytics_rollup import reconcile_rollups
+        from users.models import UserRollup
+
+        ada = User.objects.create_user(
+            email="ada@example.com", password="pw", username="ada",
+            country="Kenya", state="Nairobi", age=30, gender="female",
+        )
+        User.objects.create_user(
+            email="bo@example.com", password="pw", username="bo",
+            country="Kenya", state="Nairobi", age=30, gender="female",
+        )
+        ada.is_online = True
+        with CaptureQueriesContext(connection) as queries:
+            ada.save(update_fields=["is_online"])
+        self.assertFalse(
+            [q["sql"] for q in queries.captured_queries if UserRollup._meta.db_table in q["sql"]]
+        )
+
+        # A raw update bypasses the signals; reconcile corrects the bucket in place.
+        kept = UserRollup.objects.get()
+        User.objects.filter(username="bo").update(country="Ghana")
+        result = reconcile_rollups()
+        self.assertEqual((result["buckets"], result["users"], result["removed"]), (2, 2, 0))
+        self.assertEqual(UserRollup.objects.get(pk=kept.pk).count, 1)
+
+        admin = User.objects.create_superuser(
+            email="root@example.com", password="pw", username="root"
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        countries = client.get("/api/auth/admin/analytics/by-country/").data
+        self.assertEqual(
+            sorted((c["country"], c["total"], c["active"]) for c in countries),
+            [("Ghana", 1, 0), ("Kenya", 1, 1)],
+        )
+        overview = client.get("/api/auth/admin/analytics/overview/").data
+        self.assertEqual((overview["total_users"], overview["active_users"]), (3, 1))
+        segment = client.get(
+            "/api/auth/admin/analytics/micro-segmentation/",
+            {"active_only": "true", "refresh": "true"},
+        ).data
+        self.assertEqual((segment["summary"]["total"], segment["summary"]["active"]), (1, 1))
+
+
+class GeoIPTests(TestCase):
+    class FakeReader:
+        def __init__(self):
+            self.calls = 0
+
+        def get(self, ip_address):
+            self.calls += 1
+            if ip_address != "81.2.69.142":
+                return None
+            return {
+                "country": {"names": {"en": "United Kingdom"}},
+                "subdivisions": [{"names": {"en": "England"}}],
+                "city": {"names": {"en": "London"}},
+            }
+
+        def close(self):
+            pass
+
+    def setUp(self):
+        from users import geoip
+
+        self.reader = self.FakeReader()
+        self.previous = geoip._service
+        geoip._service = geoip.GeoIPService(reader=self.reader, cache_size=16)
+
+    def tearDown(self):
+        from users import geoip
+
+        geoip._service = self.previous
+
+    def test_lookups_are_local_cached_and_skip_private_addresses(self):
+        from users.device_utils import get_location_from_ip
+        from users.geoip import lookup_ip
+
+        self.assertEqual(
+            lookup_ip("81.2.69.142"),
+            {"country": "United Kingdom", "state": "England", "city": "London"},
+        )
+        self.assertEqual(get_location_from_ip("81.2.69.142"), "London, United Kingdom")
+        self.assertEqual(self.reader.calls, 1)
+        self.assertIsNone(lookup_ip("8.8.8.8"))
+        self.assertIsNone(lookup_ip("not-an-ip"))
+        self.assertEqual(get_location_from_ip("10.0.0.1"), "Local Network")
+        self.assertEqual(get_location_from_ip("172.16.4.2"), "Local Network")
+        # Outside 172.16.0.0/12: a public address, looked up like any other.
+        self.assertIsNone(get_location_from_ip("172.217.0.46"))
+        self.assertEqual(self.reader.calls, 3)
+
+    def test_regeocode_command_updates_sessions(self):
+        from django.core.management import call_command
+
+        from users.models import Session
+
+        user = User.objects.create_user(
+            email="geo@example.com", password="pw", username="geo"
+        )
+        session = Session.objects.create(
+            user=user, ip_address="81.2.69.142", token_jti="jti-geo"
+        )
+        call_command("regeocode_sessions", "--only-missing", stdout=StringIO())
+        session.refresh_from_db()
+        self.assertEqual(session.location, "London, United Kingdom")
+
+
+class LoginPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="pipe@example.com", password="pw", username="pipe"
+        )
+
+    def event(self, jti, user_agent="Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0"):
+        from users.login_pipeline import build_login_event
+
+        return build_login_event(
+            user=self.user,
+            ip_address="10.0.0.5",
+            user_agent=user_agent,
+            authentication_method="password",
+            description="Logged in",
+            token_jti=jti,
+            refresh_token_jti=f"r-{jti}",
+        )
+
+    def test_batch_reuses_device_session_and_bulk_inserts(self):
+        from users.login_pipeline import apply_login_events
+        from users.models import SecurityEvent, Session, SessionHistory
+
+        events = [self.event("a"), self.event("b"), self.event("c", user_agent="curl/8")]
+        with self.assertNumQueries(6):
+            # lookup, savepoint, one insert each for sessions/history/events, release
+            apply_login_events(events)
+
+        sessions = Session.objects.filter(user=self.user, revoked_at__isnull=True)
+        self.assertEqual(
+            sorted(sessions.values_list("token_jti", "refresh_token_jti")),
+            [("b", "r-b"), ("c", "r-c")],
+        )
+        self.assertEqual(SessionHistory.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(SecurityEvent.objects.filter(user=self.user).count(), 3)
+
+        apply_login_events([self.event("d")])
+        self.assertEqual(
+            sorted(
+                Session.objects.filter(user=self.user, revoked_at__isnull=True)
+                .values_list("token_jti", flat=True)
+            ),
+            ["c", "d"],
+        )
+
+    def test_login_uses_token_payload_jtis(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from users.models import Session
+
+        self.user.set_password("Securepassword123!")
+        self.user.save()
+        with self.settings(LOGIN_EVENTS_ASYNC=False):
+            response = APIClient().post(
+                "/api/auth/login/",
+                {"username": "pipe@example.com", "password": "Securepassword123!"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        jti = AccessToken(response.data["access_token"])["jti"]
+        self.assertTrue(Session.objects.filter(user=self.user, token_jti=jti).exists())
+
+    def use_fake_redis(self):
+        from unittest import mock
+
+        import fakeredis  # requirements-dev.txt
+
+        from users import login_pipeline
+
+        client = fakeredis.FakeRedis()
+        for patcher in (
+            mock.patch.object(login_pipeline, "_redis", return_value=client),
+            # An earlier test may have hit the real, unreachable Redis.
+            mock.patch.object(login_pipeline, "_unavailable_until", 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return client
+
+    def test_enqueue_schedules_one_drain_per_window(self):
+        from unittest import mock
+
+        from users.login_pipeline import LOGIN_EVENTS_KEY, enqueue_login_event
+        from users.models import Session
+
+        client = self.use_fake_redis()
+        with mock.patch("main.tasks.process_login_events.apply_async") as apply_async:
+            enqueue_login_event(self.event("a"))
+            enqueue_login_event(self.event("b"))
+        apply_async.assert_called_once()
+        self.assertEqual(client.llen(LOGIN_EVENTS_KEY), 2)
+        self.assertFalse(Session.objects.filter(user=self.user).exists())
+
+    def test_drain_claims_batches_and_resumes_a_claimed_batch(self):
+        import json
+
+        from users.login_pipeline import LOGIN_EVENTS_KEY, PROCESSING_KEY, drain_login_events
+        from users.models import SessionHistory
+
+        client = self.use_fake_redis()
+        # Left behind by a worker that died after claiming it.
+        client.rpush(PROCESSING_KEY, json.dumps(self.event("a")))
+        for jti in ("b", "c", "d"):
+            client.rpush(LOGIN_EVENTS_KEY, json.dumps(self.event(jti)))
+
+        self.assertEqual(drain_login_events(batch_size=2), 4)
+        self.assertEqual(SessionHistory.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(client.llen(LOGIN_EVENTS_KEY), 0)
+        self.assertEqual(client.llen(PROCESSING_KEY), 0)
+
+    def test_failing_event_is_dead_lettered_and_the_rest_applied(self):
+        import json
+
+        from users.login_pipeline import (
+            DEAD_LETTER_KEY,
+            LOGIN_EVENTS_KEY,
+            PROCESSING_KEY,
+            drain_login_events,
+        )
+        from users.models import SessionHistory
+
+        client = self.use_fake_redis()
+        broken = json.dumps({"event_id": "broken", "user_id": str(self.user.pk)})
+        client.rpush(LOGIN_EVENTS_KEY, json.dumps(self.event("a")), broken, json.dumps(self.event("b")))
+
+        self.assertEqual(drain_login_events(), 2)
+        self.assertEqual(SessionHistory.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(client.lrange(DEAD_LETTER_KEY, 0, -1), [broken.encode()])
+        self.assertEqual(client.llen(PROCESSING_KEY), 0)
+
+    def test_database_outage_keeps_the_batch_claimed(self):
+        import json
+        from unittest import mock
+
+        from django.db import OperationalError
+
+        from users import login_pipeline
+
+        client = self.use_fake_redis()
+        client.rpush(login_pipeline.LOGIN_EVENTS_KEY, json.dumps(self.event("a")))
+        with mock.patch.object(login_pipeline, "_apply", side_effect=OperationalError("down")):
+            with self.assertRaises(OperationalError):
+                login_pipeline.drain_login_events()
+        self.assertEqual(client.llen(login_pipeline.PROCESSING_KEY), 1)
+        self.assertEqual(client.llen(login_pipeline.DEAD_LETTER_KEY), 0)
+
+        self.assertEqual(login_pipeline.drain_login_events(), 1)
+        self.assertEqual(client.llen(login_pipeline.PROCESSING_KEY), 0)
+
+    def test_unreachable_queue_applies_inline_and_backs_off(self):
+        from unittest import mock
+
+        import redis
+
+        from users import login_pipeline
+        from users.models import Session
+
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+        with mock.patch.object(login_pipeline, "_redis", return_value=client), mock.patch.object(
+            login_pipeline, "_unavailable_until", 0.0
+        ):
+            login_pipeline.enqueue_login_event(self.event("a"))
+            login_pipeline.enqueue_login_event(self.event("b"))
+        client.pipeline.assert_called_once()
+        self.assertEqual(Session.objects.get(user=self.user).token_jti, "b")
+
+
+class TokenDenylistTests(TestCase):
+    def setUp(self):
+        from unittest import mock
+
+        import fakeredis  # requirements-dev.txt
+
+        from users import token_denylist
+
+        # One Redis server; each process would hold its own client to it.
+        self.redis_server = fakeredis.FakeServer()
+        for patcher in (
+            mock.patch.object(token_denylist, "_client", fakeredis.FakeRedis(server=self.redis_server)),
+            mock.patch.object(token_denylist, "_unavailable_until", 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            email="deny@example.com", password="Securepassword123!", username="deny"
+        )
+
+    def login(self, user_agent):
+        with self.settings(LOGIN_EVENTS_ASYNC=False):
+            response = APIClient().post(
+                "/api/auth/login/",
+                {"username": "deny@example.com", "password": "Securepassword123!"},
+                format="json",
+                HTTP_USER_AGENT=user_agent,
+            )
+        self.assertEqual(response.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access_token']}")
+        return client
+
+    def test_revoke_all_denies_other_access_tokens(self):
+        from users.models import Session
+
+        current = self.login("Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0")
+        other = self.login("Mozilla/5.0 (Macintosh) Safari/17.0")
+        self.assertEqual(other.get("/api/auth/sessions/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = current.post("/api/auth/sessions/revoke-all/")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(other.get("/api/auth/sessions/").status_code, 401)
+        listing = current.get("/api/auth/sessions/")
+        self.assertEqual(listing.status_code, 200)
+        self.assertEqual(len(listing.data["sessions"]), 1)
+        self.assertTrue(listing.data["sessions"][0]["is_current"])
+        self.assertEqual(Session.objects.filter(user=self.user, revoked_at__isnull=True).count(), 1)
+
+    def test_revoke_all_covers_logins_still_queued(self):
+        from unittest import mock
+
+        import fakeredis
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        from users import login_pipeline
+        from users.models import Session
+
+        for patcher in (
+            mock.patch.object(login_pipeline, "_redis", return_value=fakeredis.FakeRedis(server=self.redis_server)),
+            mock.patch.object(login_pipeline, "_unavailable_until", 0.0),
+            mock.patch("main.tasks.process_login_events.apply_async"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        def queued_login(user_agent):
+            response = APIClient().post(
+                "/api/auth/login/",
+                {"username": "deny@example.com", "password": "Securepassword123!"},
+                format="json",
+                HTTP_USER_AGENT=user_agent,
+            )
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access_token']}")
+            return client
+
+        other = queued_login("Mozilla/5.0 (Macintosh) Safari/17.0")
+        current = queued_login("Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0")
+        self.assertFalse(Session.objects.filter(user=self.user).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = current.post("/api/auth/sessions/revoke-all/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(other.get("/api/auth/sessions/").status_code, 401)
+        self.assertEqual(current.get("/api/auth/sessions/").status_code, 200)
+        # Only the other login's refresh token is blacklisted, not the caller's.
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.user).count(), 1)
+
+        login_pipeline.drain_login_events()
+        self.assertEqual(Session.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Session.objects.filter(user=self.user, revoked_at__isnull=True).count(), 1)
+
+    def test_deny_skips_expired_entries(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from users.token_denylist import deny, is_denied
+
+        now = timezone.now()
+        written = deny(
+            [
+                ("a", now + timedelta(days=3)),
+                ("b", now + timedelta(days=3, seconds=10)),
+                ("gone", now - timedelta(seconds=1)),
+                (None, now + timedelta(days=1)),
+            ]
+        )
+        self.assertEqual(written, 2)
+        self.assertTrue(is_denied("a"))
+        self.assertTrue(is_denied("b"))
+        self.assertFalse(is_denied("gone"))
+        self.assertFalse(is_denied(None))
+
+    def test_entries_are_shared_between_processes(self):
+        from datetime import timedelta
+        from unittest import mock
+
+        import fakeredis
+        from django.utils import timezone
+
+        from users import token_denylist
+
+        token_denylist.deny([("shared", timezone.now() + timedelta(hours=1))])
+        # A different client, as in another web or ASGI worker.
+        with mock.patch.object(token_denylist, "_client", fakeredis.FakeRedis(server=self.redis_server)):
+            self.assertTrue(token_denylist.is_denied("shared"))
+            self.assertFalse(token_denylist.is_denied("other"))
+
+
+class SessionListingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="listing@example.com", password="pw", username="listing"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_activity_log_is_keyset_paginated(self):
+        from users.models import SessionHistory
+
+        for index in range(3):
+            SessionHistory.objects.create(user=self.user, device_name=f"device {index}")
+
+        first = self.client.get("/api/auth/activity/?limit=2")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.data["activity"]), 2)
+        self.assertIsNotNone(first.data["next"])
+
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(second.data["activity"]), 1)
+        self.assertIsNone(second.data["next"])
+        seen = {entry["id"] for entry in first.data["activity"] + second.data["activity"]}
+        self.assertEqual(len(seen), 3)
+
+    def test_one_active_session_per_device_key(self):
+        from django.db import IntegrityError, connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+
+        agent = "Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0"
+        Session.objects.create(user=self.user, user_agent=agent)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Session.objects.create(user=self.user, user_agent=agent)
+
+        Session.objects.filter(user=self.user).update(revoked_at=timezone.now())
+        Session.objects.create(user=self.user, user_agent=agent)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/auth/sessions/")
+        self.assertEqual(len(response.data["sessions"]), 1)
+        session_reads = [
+            query for query in queries if query["sql"].startswith("SELECT") and '"users_session"' in query["sql"]
+        ]
+        self.assertEqual(len(session_reads), 1)
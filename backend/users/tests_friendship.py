@@ -119,8 +119,9 @@ class FriendshipFlowTests(TestCase):
         resp = self.client.get(f'/api/auth/user/{self.user2.id}/')
         self.assertEqual(resp.status_code, 403)
 
-        # create friendship and try again
-        Friends.objects.create(user=self.user2, friend=self.user1)
-        Friends.objects.create(user=self.user1, friend=self.user2)
+        # create friendship and try again (cached graph sets clear on commit)
+        with self.captureOnCommitCallbacks(execute=True):
+            Friends.objects.create(user=self.user2, friend=self.user1)
+            Friends.objects.create(user=self.user1, friend=self.user2)
         resp2 = self.client.get(f'/api/auth/user/{self.user2.id}/')
         self.assertEqual(resp2.status_code, 200)
@@ -0,0 +1,161 @@
+"""
+Access-token revocation denylist.
+
+Access tokens live for ``ACCESS_TOKEN_LIFETIME`` (100 days), so revoking a
+``Session`` row alone does not stop its token from authenticating. When a
+session is revoked, its access-token JTI is written to Redis
+(``CELERY_REDIS_URL``, the same instance as the login queue and view
+counters) under ``jwt:denied:<jti>`` with a TTL equal to the token's
+remaining lifetime. Every web, ASGI and worker process reads the same
+keys. Once the token would have expired anyway, the entry disappears on
+its own.
+
+``users.authentication.DenylistJWTAuthentication`` checks one key per
+request, so the check is a single O(1) ``EXISTS`` instead of a
+``Session`` lookup. Bulk revocations write all their entries in one
+pipeline (TTLs rounded up to the minute).
+
+A session's token was minted at or before its ``last_activity``. The
+remaining lifetime is therefore bounded by
+``last_activity + ACCESS_TOKEN_LIFETIME``, and that bound is used when
+the token itself is not at hand.
+
+If Redis is unreachable, checks fail open and are logged, and Redis is
+not retried for ``REDIS_RETRY_AFTER`` seconds so requests do not each
+wait out the connect timeout. The ``Session`` rows and the refresh-token
+blacklist stay authoritative.
+"""
+
+import logging
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+TTL_GRANULARITY = 60
+REDIS_RETRY_AFTER = 30
+
+_client = None
+# time.monotonic() before which Redis is assumed down.
+_unavailable_until = 0.0
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+
+        _client = redis.Redis.from_url(
+            settings.CELERY_REDIS_URL, socket_connect_timeout=1, socket_timeout=2
+        )
+    return _client
+
+
+def _available() -> bool:
+    return time.monotonic() >= _unavailable_until
+
+
+def _mark_unavailable(exc, message: str, *args) -> None:
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning(message + ": %s", *args, exc)
+
+
+def _key(jti: str) -> str:
+    return f"jwt:denied:{jti}"
+
+
+def session_token_expiry(last_activity: Optional[datetime]) -> datetime:
+    """Upper bound for the expiry of a session's current access token."""
+    issued_by = last_activity or timezone.now()
+    return issued_by + api_settings.ACCESS_TOKEN_LIFETIME
+
+
+def deny(entries: Iterable[Tuple[str, datetime]]) -> int:
+    """Deny each ``(jti, expires_at)`` until it expires; returns entries written."""
+    import redis
+
+    now = timezone.now()
+    keys = {}
+    for jti, expires_at in entries:
+        if not jti:
+            continue
+        remaining = (expires_at - now).total_seconds()
+        if remaining <= 0:
+            continue
+        keys[_key(jti)] = int(math.ceil(remaining / TTL_GRANULARITY)) * TTL_GRANULARITY
+    if not keys:
+        return 0
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for key, ttl in keys.items():
+            pipe.set(key, 1, ex=ttl)
+        pipe.execute()
+    except redis.RedisError as exc:
+        _mark_unavailable(exc, "Could not write %s token denylist entries", len(keys))
+        return 0
+    return len(keys)
+
+
+def deny_token(token) -> int:
+    """Deny a validated access token for the rest of its lifetime."""
+    jti = token.get(api_settings.JTI_CLAIM)
+    exp = token.get("exp")
+    if not jti or not exp:
+        return 0
+    return deny([(jti, datetime.fromtimestamp(exp, tz=dt_timezone.utc))])
+
+
+def is_denied(jti: Optional[str]) -> bool:
+    import redis
+
+    if not jti or not _available():
+        return False
+    try:
+        return bool(_redis().exists(_key(jti)))
+    except redis.RedisError as exc:
+        _mark_unavailable(exc, "Token denylist unavailable, allowing %s", jti)
+        return False
+
+
+def denied_jtis(jtis: Iterable[Optional[str]]) -> set:
+    """The subset of ``jtis`` on the denylist, in one round trip."""
+    import redis
+
+    jtis = [jti for jti in dict.fromkeys(jtis) if jti]
+    if not jtis or not _available():
+        return set()
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for jti in jtis:
+            pipe.exists(_key(jti))
+        return {jti for jti, found in zip(jtis, pipe.execute()) if found}
+    except redis.RedisError as exc:
+        _mark_unavailable(exc, "Token denylist unavailable for %s tokens", len(jtis))
+        return set()
+
+
+def revoke_sessions(sessions, now: Optional[datetime] = None) -> int:
+    """Revoke the active sessions in ``sessions`` and deny their access tokens.
+
+    The denylist is written after the surrounding transaction commits.
+    Returns the number of sessions revoked.
+    """
+    now = now or timezone.now()
+    active = sessions.filter(revoked_at__isnull=True)
+    entries = [
+        (jti, session_token_expiry(last_activity))
+        for jti, last_activity in active.values_list("token_jti", "last_activity")
+        if jti
+    ]
+    revoked = active.update(revoked_at=now)
+    if entries:
+        transaction.on_commit(lambda: deny(entries))
+    return revoked
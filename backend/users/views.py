@@ -1,8 +1,6 @@
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, action
@@ -11,8 +9,8 @@ from rest_framework.pagination import PageNumberPagination
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Q
-from django.db.models import Count
-from django.db.models.functions import TruncDate, TruncMonth
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import timedelta
 import jwt
@@ -23,6 +21,7 @@ from .models import (
     BlockedUsers,
     DismissedSuggestion,
     FriendRequest,
+    FriendSuggestion,
     Friends,
     User,
     UserSettings,
@@ -42,10 +41,17 @@ from .serializers import (
     FriendshipHistorySerializer,
     UserStatusSerializer,
 )
+from .analytics_rollup import rollups, user_total
 from .emails import send_welcome_email, send_password_changed_email
+from .profile_overview import (
+    profile_header,
+    relationship_class,
+    resolve_profile,
+    visible_posts,
+)
+from .social_graph import graph_for
 from rest_framework.parsers import MultiPartParser, FormParser
 from main.s3 import upload_fileobj_to_s3
-from main.models import Post, PostMedia
 from main.serializers import PostSerializer
 from main.slug_utils import SlugOrIdLookupMixin
 from main.moderation.pipeline import precheck_text_or_raise, record_text_classification
@@ -61,105 +67,27 @@ def _create_login_session_and_tokens(
     device_id=None,
     device_name: str | None = None,
 ):
-    from .device_utils import (
-        build_device_name,
-        get_client_ip,
-        get_user_agent,
-        get_location_from_ip,
-    )
-    from .models import Session, SessionHistory, SecurityEvent
-
-    ip_address = get_client_ip(request)
-    user_agent = get_user_agent(request)
-    location = get_location_from_ip(ip_address)
-    resolved_device_name = device_name or build_device_name(
-        user_agent, fallback=user_agent or "Unknown Device"
-    )
+    from .device_utils import get_client_ip, get_user_agent
+    from .login_pipeline import build_login_event, enqueue_login_event
 
     refresh_token = RefreshToken.for_user(user)
     access_token = refresh_token.access_token
 
-    token_jti = None
-    refresh_token_jti = None
-    try:
-        untyped_token = UntypedToken(str(access_token))
-        token_jti = untyped_token.get("jti")
-    except (InvalidToken, TokenError, KeyError):
-        pass
-
-    try:
-        untyped_refresh_token = UntypedToken(str(refresh_token))
-        refresh_token_jti = untyped_refresh_token.get("jti")
-    except (InvalidToken, TokenError, KeyError):
-        pass
-
-    lookup = {
-        "user": user,
-        "revoked_at__isnull": True,
-    }
-    if device_id:
-        lookup["device_id"] = device_id
-    elif user_agent:
-        lookup["user_agent"] = user_agent
-    else:
-        lookup["device_name"] = resolved_device_name
-
-    session = Session.objects.filter(**lookup).order_by("-last_activity").first()
-    if session:
-        session.device_id = device_id
-        session.device_name = resolved_device_name
-        session.ip_address = ip_address
-        session.location = location
-        session.user_agent = user_agent
-        session.token_jti = token_jti
-        session.refresh_token_jti = refresh_token_jti
-        session.revoked_at = None
-        session.save(
-            update_fields=[
-                "device_id",
-                "device_name",
-                "ip_address",
-                "location",
-                "user_agent",
-                "token_jti",
-                "refresh_token_jti",
-                "revoked_at",
-                "last_activity",
-            ]
-        )
-        Session.objects.filter(**lookup).exclude(id=session.id).update(revoked_at=timezone.now())
-    else:
-        session = Session.objects.create(
+    # Session, history, security-event and geolocation writes are batched
+    # off the request path; the JTIs come straight from the token payloads.
+    enqueue_login_event(
+        build_login_event(
             user=user,
+            ip_address=get_client_ip(request),
+            user_agent=get_user_agent(request),
+            authentication_method=authentication_method,
+            description=login_description,
+            token_jti=access_token.get("jti"),
+            refresh_token_jti=refresh_token.get("jti"),
+            metadata=metadata,
             device_id=device_id,
-            device_name=resolved_device_name,
-            ip_address=ip_address,
-            location=location,
-            user_agent=user_agent,
-            token_jti=token_jti,
-            refresh_token_jti=refresh_token_jti,
+            device_name=device_name,
         )
-
-    SessionHistory.objects.create(
-        user=user,
-        device_id=device_id,
-        device_name=resolved_device_name,
-        ip_address=ip_address,
-        location=location,
-        user_agent=user_agent,
-        authentication_method=authentication_method,
-    )
-
-    event_metadata = {"session_id": str(session.id)}
-    if metadata:
-        event_metadata.update(metadata)
-    SecurityEvent.objects.create(
-        user=user,
-        event_type="login",
-        description=login_description,
-        ip_address=ip_address,
-        user_agent=user_agent,
-        metadata=event_metadata,
     )
 
     return {
@@ -647,22 +575,18 @@ def LogoutView(request):
 
         from .models import SecurityEvent, Session
         from .device_utils import get_client_ip, get_user_agent
-
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        current_token_jti = None
-        if auth_header.startswith("Bearer "):
-            try:
-                untyped_token = UntypedToken(auth_header.split(" ")[1])
-                current_token_jti = untyped_token.get("jti")
-            except (InvalidToken, TokenError, KeyError):
-                pass
-
-        if current_token_jti:
-            Session.objects.filter(
-                user=request.user,
-                token_jti=current_token_jti,
-                revoked_at__isnull=True,
-            ).update(revoked_at=timezone.now())
+        from .token_denylist import deny_token
+
+        if request.auth is not None:
+            current_token_jti = request.auth.get("jti")
+            if current_token_jti:
+                Session.objects.filter(
+                    user=request.user,
+                    token_jti=current_token_jti,
+                    revoked_at__isnull=True,
+                ).update(revoked_at=timezone.now())
+            # The access token is known here, so deny it for its exact remaining lifetime.
+            deny_token(request.auth)
 
         SecurityEvent.objects.create(
             user=request.user,
@@ -759,14 +683,7 @@ class UserView(SlugOrIdLookupMixin, ModelViewSet):
             return Response(serializer.data)
 
         # deny if blocked either way
-        if (
-            BlockedUsers.objects.filter(
-                user=instance, blocked_user=request.user
-            ).exists()
-            or BlockedUsers.objects.filter(
-                user=request.user, blocked_user=instance
-            ).exists()
-        ):
+        if instance.id in graph_for(request).block_exclusions():
             return Response(
                 {"detail": "Access denied."}, status=status.HTTP_403_FORBIDDEN
             )
@@ -784,7 +701,7 @@ class UserView(SlugOrIdLookupMixin, ModelViewSet):
             )
         if privacy == "private":
             # only friends may view
-            if not Friends.objects.filter(user=instance, friend=request.user).exists():
+            if not graph_for(request).is_friend(instance.id):
                 return Response(
                     {"detail": "Access denied."}, status=status.HTTP_403_FORBIDDEN
                 )
@@ -798,124 +715,51 @@ class UserOverviewView(APIView):
 
     def get(self, request, user_id=None, user_ref=None):
         viewer = request.user
-        lookup = user_ref or user_id
-        try:
-            target = User.objects.select_related("user_settings").get(slug=lookup)
-        except User.DoesNotExist:
-            try:
-                target = User.objects.select_related("user_settings").get(id=lookup)
-            except User.DoesNotExist:
-                return Response(
-                    {"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND
-                )
+        target = resolve_profile(viewer, user_ref or user_id)
+        if target is None:
+            return Response(
+                {"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND
+            )
 
-        is_self = viewer == target
+        is_self = viewer.pk == target.pk
+        blocked_by_target = not is_self and target.blocked_by_target
+        if blocked_by_target:
+            return Response(
+                {"detail": "Access denied."}, status=status.HTTP_403_FORBIDDEN
+            )
 
-        blocked_by_target = False
-        if not is_self:
-            blocked_by_target = BlockedUsers.objects.filter(
-                user=target, blocked_user=viewer
-            ).exists()
-            if blocked_by_target:
-                return Response(
-                    {"detail": "Access denied."}, status=status.HTTP_403_FORBIDDEN
-                )
+        viewer_block_id = target.viewer_block_id
+        viewer_has_blocked = viewer_block_id is not None
+        friend_entry_id = None if is_self else target.friend_entry_id
+        is_friend = friend_entry_id is not None
+        incoming_request_id = None if is_self else target.incoming_request_id
+        outgoing_request_id = None if is_self else target.outgoing_request_id
 
-        viewer_block_record = BlockedUsers.objects.filter(
-            user=viewer, blocked_user=target
-        ).first()
-        viewer_has_blocked = viewer_block_record is not None
-
-        is_friend = False
-        friend_record = None
-        if not is_self:
-            friend_record = Friends.objects.filter(user=viewer, friend=target).first()
-            is_friend = friend_record is not None
-
-        incoming_request = None
-        outgoing_request = None
-        if not is_self:
-            incoming_request = FriendRequest.objects.filter(
-                from_user=target, to_user=viewer, status="pending"
-            ).first()
-            outgoing_request = FriendRequest.objects.filter(
-                from_user=viewer, to_user=target, status="pending"
-            ).first()
-
-        settings = getattr(target, "user_settings", None)
-        profile_privacy = (
-            getattr(settings, "profile_privacy", "public") if settings else "public"
-        )
-        friends_publicity = (
-            getattr(settings, "friends_publicity", "public") if settings else "public"
-        )
+        relationship_key = relationship_class(is_self, is_friend, viewer_has_blocked)
+        header = profile_header(target, relationship_key)
 
-        can_view_posts = True
-        if not is_self:
-            if profile_privacy == "only_me":
-                can_view_posts = False
-            elif profile_privacy == "private" and not is_friend:
-                can_view_posts = False
-        if viewer_has_blocked and not is_self:
-            # viewer chose to block; still allow viewing profile metadata but hide posts
-            can_view_posts = False
-
-        # Only count personal posts (author_type="user"), exclude page posts
-        allowed_posts_qs = Post.objects.filter(
-            author=target, deleted_at__isnull=True, author_type="user"
-        )
-        if not is_self:
-            visibility_levels = ["public"]
-            if is_friend:
-                visibility_levels.append("friends")
-            allowed_posts_qs = allowed_posts_qs.filter(visibility__in=visibility_levels)
-        if not can_view_posts:
-            allowed_posts_qs = Post.objects.none()
-
-        post_count = allowed_posts_qs.count() if can_view_posts else None
         recent_posts_data = []
-        photos = []
-        if can_view_posts:
-            recent_posts_list = list(allowed_posts_qs.order_by("-created_at")[:6])
+        if header["can_view_posts"]:
+            recent_posts_list = list(
+                visible_posts(target, relationship_key)
+                .select_related("author", "page")
+                .prefetch_related(
+                    "comments__author",
+                    "comments__media",
+                    "media",
+                    "reactions__user",
+                )
+                .order_by("-created_at")[:6]
+            )
             if recent_posts_list:
                 recent_posts_data = PostSerializer(
                     recent_posts_list, many=True, context={"request": request}
                 ).data
-            post_ids_for_photos = list(
-                allowed_posts_qs.order_by("-created_at").values_list("id", flat=True)[
-                    :30
-                ]
-            )
-            if post_ids_for_photos:
-                photos = list(
-                    PostMedia.objects.filter(post_id__in=post_ids_for_photos)
-                    .order_by("-id")
-                    .values_list("url", flat=True)[:12]
-                )
-
-        can_view_friend_count = True
-        if not is_self:
-            if friends_publicity == "only_me":
-                can_view_friend_count = False
-            elif friends_publicity == "private" and not is_friend:
-                can_view_friend_count = False
-        friend_count = (
-            Friends.objects.filter(user=target).count()
-            if can_view_friend_count
-            else None
-        )
-
-        incoming_request_id = incoming_request.id if incoming_request else None
-        outgoing_request_id = outgoing_request.id if outgoing_request else None
-        friend_entry_id = friend_record.id if friend_record else None
-        viewer_block_id = viewer_block_record.id if viewer_block_record else None
 
         if is_self:
             relationship_status = "self"
         elif viewer_has_blocked:
             relationship_status = "viewer_blocked"
-        elif blocked_by_target:
-            relationship_status = "blocked_by_target"
         elif is_friend:
             relationship_status = "friend"
         elif incoming_request_id:
@@ -947,37 +791,15 @@ class UserOverviewView(APIView):
             ),
         }
 
-        user_data = {
-            "id": str(target.id),
-            "slug": target.slug,
-            "username": target.username,
-            "first_name": target.first_name,
-            "last_name": target.last_name,
-            "profile_image_url": target.profile_image_url,
-            "bio": target.bio,
-            "date_joined": (
-                target.date_joined.isoformat() if target.date_joined else None
-            ),
-        }
-
-        stats = {
-            "post_count": post_count if can_view_posts else None,
-            "friend_count": friend_count if can_view_friend_count else None,
-            "photos": photos if can_view_posts else [],
-        }
-
         return Response(
             {
-                "user": user_data,
-                "stats": stats,
+                "user": header["user"],
+                "stats": header["stats"],
                 "relationship": relationship,
-                "recent_posts": recent_posts_data if can_view_posts else [],
-                "can_view_posts": can_view_posts,
-                "can_view_friend_count": can_view_friend_count,
-                "privacy": {
-                    "profile_privacy": profile_privacy,
-                    "friends_publicity": friends_publicity,
-                },
+                "recent_posts": recent_posts_data,
+                "can_view_posts": header["can_view_posts"],
+                "can_view_friend_count": header["can_view_friend_count"],
+                "privacy": header["privacy"],
             }
         )
 
@@ -1097,45 +919,44 @@ class FriendsViewset(ModelViewSet):
     def suggestions(self, request):
         user = request.user
 
-        friend_ids = Friends.objects.filter(user=user).values_list(
-            "friend_id", flat=True
-        )
-        reverse_friend_ids = Friends.objects.filter(friend=user).values_list(
-            "user_id", flat=True
-        )
-        sent_requests = FriendRequest.objects.filter(from_user=user).values_list(
-            "to_user_id", flat=True
-        )
-        incoming_requests = FriendRequest.objects.filter(to_user=user).values_list(
-            "from_user_id", flat=True
-        )
-        blocked_ids = BlockedUsers.objects.filter(user=user).values_list(
-            "blocked_user_id", flat=True
-        )
-        blocked_me_ids = BlockedUsers.objects.filter(blocked_user=user).values_list(
-            "user_id", flat=True
-        )
-        dismissed_ids = DismissedSuggestion.objects.filter(user=user).values_list(
-            "dismissed_user_id", flat=True
-        )
+        graph = graph_for(request).prefetch()
+        request_pairs = FriendRequest.objects.filter(
+            Q(from_user=user) | Q(to_user=user)
+        ).values_list("from_user_id", "to_user_id")
+        requested_ids = {uid for pair in request_pairs for uid in pair}
 
         exclude_ids = (
-            set(friend_ids)
-            | set(reverse_friend_ids)
-            | set(sent_requests)
-            | set(incoming_requests)
-            | set(blocked_ids)
-            | set(blocked_me_ids)
-            | set(dismissed_ids)
+            graph.friends
+            | graph.blocked
+            | graph.blocked_by
+            | graph.dismissed
+            | requested_ids
             | {user.id}
         )
 
-        qs = User.objects.exclude(id__in=exclude_ids).order_by("-date_joined")
+        # Candidates come from the nightly friends-of-friends store; exclusions
+        # are applied here so blocks, dismissals and requests take effect at once.
+        top_k = settings.FRIEND_SUGGESTION_TOP_K
+        stored = (
+            FriendSuggestion.objects.filter(user=user)
+            .exclude(candidate_id__in=exclude_ids)
+            .select_related("candidate")
+            .order_by("-mutual_count", "-candidate__date_joined")[:top_k]
+        )
+        mutual_counts = {s.candidate_id: s.mutual_count for s in stored}
+        candidates = [s.candidate for s in stored]
+        if not candidates:
+            # No friends-of-friends yet (new or isolated users): newest members.
+            candidates = list(
+                User.objects.exclude(id__in=exclude_ids).order_by("-date_joined")[:top_k]
+            )
 
         paginator = DefaultPageNumberPagination()
-        page = paginator.paginate_queryset(qs, request)
-        serializer = UserSerializer(page, many=True, context={"request": request})
-        return paginator.get_paginated_response(serializer.data)
+        page = paginator.paginate_queryset(candidates, request)
+        data = UserSerializer(page, many=True, context={"request": request}).data
+        for item, candidate in zip(data, page):
+            item["mutual_friends_count"] = mutual_counts.get(candidate.id, 0)
+        return paginator.get_paginated_response(data)
 
 
 class FriendRequestViewset(ModelViewSet):
@@ -1401,10 +1222,13 @@ class UserMetricsView(APIView):
         last_30_days = now - timedelta(days=30)
         last_12_months = now - timedelta(days=365)
 
-        total_users = User.objects.count()
-        new_last_24_hours = User.objects.filter(date_joined__gte=last_24_hours).count()
-        new_last_7_days = User.objects.filter(date_joined__gte=last_7_days).count()
-        new_last_30_days = User.objects.filter(date_joined__gte=last_30_days).count()
+        total_users = user_total()
+        # Rolling windows need signup times, so count them live in one scan.
+        new_users = User.objects.filter(date_joined__gte=last_30_days).aggregate(
+            last_24_hours=Count("id", filter=Q(date_joined__gte=last_24_hours)),
+            last_7_days=Count("id", filter=Q(date_joined__gte=last_7_days)),
+            last_30_days=Count("id"),
+        )
 
         # Count users who have created at least one post (shows engagement)
         from main.models import Post
@@ -1414,10 +1238,10 @@ class UserMetricsView(APIView):
         ).values('author').distinct().count()
 
         signups_per_day_qs = (
-            User.objects.filter(date_joined__gte=now - timedelta(days=14))
-            .annotate(day=TruncDate("date_joined"))
-            .values("day")
-            .annotate(count=Count("id"))
+            rollups()
+            .filter(signup_day__gte=(now - timedelta(days=14)).date())
+            .values(day=F("signup_day"))
+            .annotate(count=Sum("count"))
             .order_by("day")
         )
         signups_per_day = [
@@ -1426,15 +1250,16 @@ class UserMetricsView(APIView):
         ]
 
         signups_per_month_qs = (
-            User.objects.filter(date_joined__gte=last_12_months)
-            .annotate(month=TruncMonth("date_joined"))
+            rollups()
+            .filter(signup_day__gte=last_12_months.date())
+            .annotate(month=TruncMonth("signup_day"))
             .values("month")
-            .annotate(count=Count("id"))
+            .annotate(count=Sum("count"))
             .order_by("month")
         )
         signups_per_month = [
             {
-                "month": entry["month"].date().replace(day=1).isoformat(),
+                "month": entry["month"].replace(day=1).isoformat(),
                 "count": entry["count"],
             }
             for entry in signups_per_month_qs
@@ -1444,11 +1269,7 @@ class UserMetricsView(APIView):
             {
                 "generated_at": now.isoformat(),
                 "totals": {"users": total_users},
-                "new_users": {
-                    "last_24_hours": new_last_24_hours,
-                    "last_7_days": new_last_7_days,
-                    "last_30_days": new_last_30_days,
-                },
+                "new_users": new_users,
                 "users_with_posts": users_with_posts,
                 "signups_per_day": signups_per_day,
                 "signups_per_month": signups_per_month,
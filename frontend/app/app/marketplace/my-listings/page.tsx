@@ -66,11 +66,11 @@ export default function MyListingsPage() {
         setListings(listingsResponse.results || listingsResponse);
 
         // Load sold items
-        const soldResponse = await apiGet<SoldItem[]>(
+        const soldResponse = await apiGet<PaginatedResponse<SoldItem>>(
           `/marketplace/listings/sold_items/`,
           { token: accessToken }
         );
-        setSoldItems(Array.isArray(soldResponse) ? soldResponse : []);
+        setSoldItems(soldResponse.results || []);
 
         // Load cancelled listings
         const cancelledResponse = await apiGet<PaginatedResponse<CancelledListing>>(
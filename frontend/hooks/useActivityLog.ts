@@ -1,7 +1,7 @@
 "use client";
 
 import { useState, useEffect, useCallback } from "react";
-import { apiGet } from "@/lib/api";
+import { apiGet, apiGetUrl } from "@/lib/api";
 import { useAuth } from "@/lib/auth-context";
 
 export type ActivityEntry = {
@@ -16,44 +16,64 @@ export type ActivityEntry = {
   ended_at: string | null;
 };
 
-export function useActivityLog() {
+type ActivityPage = {
+  activity: ActivityEntry[];
+  next: string | null;
+  previous: string | null;
+};
+
+export function useActivityLog(limit = 50) {
   const { accessToken } = useAuth();
   const [activity, setActivity] = useState<ActivityEntry[]>([]);
+  const [next, setNext] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
-  const [count, setCount] = useState(0);
 
+  // The endpoint is cursor-paginated: follow `next` rather than offsets.
   const fetchActivity = useCallback(
-    async (limit = 50, offset = 0) => {
+    async (url?: string) => {
       if (!accessToken) return;
 
+      const append = Boolean(url);
       try {
-        setLoading(true);
+        if (append) setLoadingMore(true);
+        else setLoading(true);
         setError(null);
-        const data = await apiGet<{ activity: ActivityEntry[]; count: number }>(
-          `/auth/activity/?limit=${limit}&offset=${offset}`,
-          { token: accessToken }
-        );
-        setActivity(data.activity || []);
-        setCount(data.count || 0);
+        const data = url
+          ? await apiGetUrl<ActivityPage>(url, { token: accessToken })
+          : await apiGet<ActivityPage>(`/auth/activity/?limit=${limit}`, {
+              token: accessToken,
+            });
+        const page = data.activity || [];
+        setActivity((prev) => (append ? [...prev, ...page] : page));
+        setNext(data.next ?? null);
       } catch (err: any) {
         setError(err?.message || "Failed to load activity log");
       } finally {
         setLoading(false);
+        setLoadingMore(false);
       }
     },
-    [accessToken]
+    [accessToken, limit]
   );
 
   useEffect(() => {
     fetchActivity();
   }, [fetchActivity]);
 
+  const loadMore = useCallback(async () => {
+    if (!next) return;
+    await fetchActivity(next);
+  }, [next, fetchActivity]);
+
   return {
     activity,
-    count,
+    next,
     loading,
+    loadingMore,
     error,
+    loadMore,
     refetch: () => fetchActivity(),
   };
 }